@@ -1,5 +1,7 @@
+import json
+from dataclasses import dataclass
 from functools import lru_cache
-from typing import Optional, Tuple
+from typing import List, Optional, Tuple
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -19,21 +21,170 @@ class Settings(BaseSettings):
     # Runtime switches
     use_mock_llm: bool = True
     mock_similarity_threshold: float = 0.85
+    # Mock model scoring engine: "sequence" (SequenceMatcher semantics) or "trigram"
+    mock_scoring_engine: str = "sequence"
+    # Score lists of at least mock_scoring_parallel_min_candidates in this many processes, with the
+    # candidates in shared memory (see app/services/parallel_scoring.py). 0 = score in-process.
+    mock_scoring_workers: int = 0
+    mock_scoring_parallel_min_candidates: int = 20000
+
+    # Max number of inputs from one /match/batch request matched at the same time
+    batch_max_concurrency: int = 8
+    # Max number of async model calls in flight at once, across all requests in this process
+    max_inflight_llm_calls: int = 256
+
+    # Hedged model calls (see app/services/hedging.py): a call that hasn't answered within the
+    # HEDGE_QUANTILE of the model's recent latencies (or HEDGE_DELAY_SECONDS if > 0) is sent again,
+    # once HEDGE_MIN_SAMPLES latencies have been seen
+    hedge_enabled: bool = False
+    hedge_quantile: float = 0.95
+    hedge_delay_seconds: float = 0.0
+    hedge_min_samples: int = 20
+    # Past this many seconds waiting for the model, including time queued for a free model slot
+    # (max_inflight_llm_calls), answer with the local fuzzy match instead, flagged as degraded
+    # (0 = wait for the model)
+    match_deadline_seconds: float = 0.0
+
+    # Warm-up at startup (see app/services/warmup.py); GET /ready is 503 until it has finished
+    warmup_enabled: bool = True
+    # Include a tiny call per model client and a synthetic match (one small request each with Azure)
+    warmup_model_calls: bool = True
+
+    # Only the top-K candidates from the BM25 shortlist are sent to the model (0 = send all)
+    shortlist_top_k: int = 50
+
+    # Candidate lists estimated at more than this many prompt tokens are matched in chunks, as a
+    # tournament: all chunks at once, then a final round over the chunk winners (0 = never chunk)
+    chunk_max_tokens: int = 32000
+
+    # Candidate sets served from prebuilt, memory-mapped index files: "name=path,name2=path2"
+    # (build them with `python -m app.services.candidate_index_file build`)
+    candidate_index_files: str = ""
+
+    # Deterministic pre-match tier: exact-after-normalisation and acronym matches skip the model
+    prematch_enabled: bool = True
+    # Comma-separated legal suffixes ignored by the pre-match normalisation
+    prematch_legal_suffixes: str = "ltd,limited,plc,llp,llc,inc,alb,cic"
+
+    # Concurrent identical requests share one in-flight model call
+    singleflight_enabled: bool = True
+
+    # Result cache in front of the model (see app/services/match_cache.py)
+    match_cache_enabled: bool = True
+    match_cache_max_entries: int = 10000
+    match_cache_ttl_seconds: float = 86400.0
+    # Optional SQLite file shared by all workers; empty = in-memory only
+    match_cache_sqlite_path: str = ""
+
+    # Bulk matching jobs (POST /jobs): progress is kept in this SQLite file so jobs can resume
+    jobs_db_path: str = "jobs.sqlite3"
+    # Rows read, matched and saved per step of a bulk job
+    job_chunk_size: int = 100
+    # A running job that hasn't saved a chunk of results for this long is taken to have died with
+    # its worker, and may be resumed by another request
+    job_stale_seconds: float = 300.0
+
+    # Prompt evaluation (python -m app.services.evaluation): raw model responses are recorded in
+    # this SQLite file and replayed on later runs
+    eval_replay_db_path: str = "eval_replay.sqlite3"
 
     # Optional: prompt file path (e.g prompts/buyer_match_v4.txt)
     prompt_path: str = ""
+    # Directory of prompt templates (buyer_match_v*.txt) clients may select via prompt_path
+    prompt_dir: str = "prompts"
+    # How often a cached prompt file is checked for changes on disk
+    prompt_reload_interval_seconds: float = 1.0
+    # Put candidates in the prompt in sorted order rather than request order, so requests with the
+    # same candidates send the same prompt prefix (which providers can serve from their prompt cache)
+    prompt_sort_candidates: bool = True
+    # Candidate lists estimated at up to this many tokens are sent whole rather than shortlisted, so
+    # every input shares the same prompt prefix for the provider to cache (Azure caches 1024+ token
+    # prefixes). Longer lists are shortlisted per input. 0 = shortlist whenever shortlist_top_k applies
+    prompt_cache_max_tokens: int = 4096
+
+    # Packed matching for /match/batch and bulk jobs: up to pack_size inputs are resolved in one
+    # model call using packed_prompt_path. 1 = one call per input (packing off).
+    pack_size: int = 1
+    packed_prompt_path: str = "prompts/buyer_match_packed_v1.txt"
 
     azure_openai_endpoint: str = ""
     azure_openai_key: str = ""
     azure_openai_deployment_name: str = ""
     azure_openai_api_version: str = ""
 
+    # Client-side limits for the Azure deployment (see app/services/rate_limit.py)
+    azure_rate_limit_enabled: bool = True
+    # Deployment quota; 0 = no limit
+    azure_requests_per_minute: int = 0
+    azure_tokens_per_minute: int = 0
+    # AIMD concurrency: starts at initial, grows while calls succeed under the latency target,
+    # halves on a 429 or a slower call (at most once per round trip)
+    azure_initial_concurrency: int = 8
+    azure_min_concurrency: int = 1
+    azure_max_concurrency: int = 64
+    azure_latency_target_seconds: float = 10.0
+    # Retries after a 429, waiting for the server's Retry-After
+    azure_max_retries: int = 2
+
+    # Several deployments to balance across (see app/services/deployment_pool.py), as a JSON list
+    # of {"endpoint", "deployment"} objects with optional "name", "key" and "api_version" (which
+    # default to AZURE_OPENAI_KEY and AZURE_OPENAI_API_VERSION). Empty = the single deployment above.
+    azure_deployments: str = ""
+    # A call that fails on one deployment is retried on up to this many others
+    azure_failover_retries: int = 2
+    # A deployment is taken out of rotation after this many consecutive failures, for the cooldown
+    azure_circuit_failure_threshold: int = 5
+    azure_circuit_cooldown_seconds: float = 30.0
+
 
 @lru_cache(maxsize=1)
 def get_settings() -> Settings:
     return Settings()
 
 
+@dataclass(frozen=True)
+class AzureDeployment:
+    name: str
+    endpoint: str
+    deployment: str
+    key: str
+    api_version: str
+
+
+def parse_azure_deployments(settings: Optional[Settings] = None) -> List[AzureDeployment]:
+    """The deployments in AZURE_DEPLOYMENTS. Raises ValueError if it isn't a valid list."""
+    s = settings or get_settings()
+    if not s.azure_deployments.strip():
+        return []
+    try:
+        items = json.loads(s.azure_deployments)
+    except ValueError as e:
+        raise ValueError(f"AZURE_DEPLOYMENTS is not valid JSON: {e}") from None
+    if not isinstance(items, list) or not items:
+        raise ValueError("AZURE_DEPLOYMENTS must be a non-empty JSON list")
+
+    deployments = []
+    for i, item in enumerate(items):
+        if not isinstance(item, dict) or not item.get("endpoint") or not item.get("deployment"):
+            raise ValueError(f"AZURE_DEPLOYMENTS[{i}] needs an endpoint and a deployment")
+        key = item.get("key") or s.azure_openai_key
+        api_version = item.get("api_version") or s.azure_openai_api_version
+        if not key or not api_version:
+            raise ValueError(f"AZURE_DEPLOYMENTS[{i}] has no key or api_version (and no default is set)")
+        deployments.append(
+            AzureDeployment(
+                name=item.get("name") or f"{item['deployment']}@{item['endpoint']}",
+                endpoint=item["endpoint"],
+                deployment=item["deployment"],
+                key=key,
+                api_version=api_version,
+            )
+        )
+    if len({d.name for d in deployments}) != len(deployments):
+        raise ValueError("AZURE_DEPLOYMENTS names must be unique")
+    return deployments
+
+
 def missing_azure_vars(settings: Optional[Settings] = None) -> Tuple[str, ...]:
     s = settings or get_settings()
     missing = []
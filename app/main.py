@@ -1,80 +1,443 @@
+import asyncio
+from contextlib import asynccontextmanager
+from dataclasses import asdict
 from typing import List, Optional
 
 from fastapi import FastAPI, HTTPException, Query
-from pydantic import BaseModel, Field
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, ConfigDict, Field, model_validator
 
-from app.services.langchain_matcher import match_string_with_langchain
-from app.services.model_factory import get_chat_model
+from app.config import get_settings
+from app.services.bulk_jobs import (
+    JobAlreadyRunningError,
+    JobNotFoundError,
+    JobNotIngestedError,
+    claim_job,
+    get_job_store,
+    ingest,
+    iter_csv_inputs,
+    iter_ndjson_inputs,
+    stream_results,
+)
+from app.services.candidate_sets import CandidateSetNotFoundError, get_candidate_set_registry
+from app.services.hedging import get_hedger
+from app.services.langchain_matcher import MatchTrace, _normalize_output, amatch_string_with_langchain
+from app.services.match_cache import get_match_cache
+from app.services.metrics import get_metrics
+from app.services.model_factory import azure_pool_stats, azure_rate_limit_stats, get_chat_model
+from app.services.packed_matcher import amatch_many_with_langchain
+from app.services.prompt_registry import UnknownPromptError, get_prompt_registry
+from app.services.singleflight import get_singleflight
+from app.services.warmup import get_warmup_state, run_warmup
+from app.services.wire_format import MSGPACK_RESPONSE, encode_response, openapi_body, parse_body
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm up in the background: /health answers at once, /ready once warm-up has finished
+    warmup = asyncio.create_task(run_warmup()) if get_settings().warmup_enabled else None
+    yield
+    if warmup is not None and not warmup.done():
+        warmup.cancel()
 
 
 app = FastAPI(
     title="CCS AI Name Matcher",
     version="0.3.0",
     description="Microservice for matching an input string to the best candidate using LLM prompting (mock now, Azure later).",
+    lifespan=lifespan,
 )
 
 @app.get("/health")
 def health():
     return {"status": "ok"}
-from fastapi.responses import PlainTextResponse
+
+
+@app.get("/ready")
+def ready():
+    """200 once startup warm-up has finished (see app/services/warmup.py), 503 until then."""
+    if not get_settings().warmup_enabled:
+        return {"status": "ready", "warmup": None}
+    state = get_warmup_state()
+    warmup = state.to_dict()
+    if state.ready:
+        return {"status": "ready", "warmup": warmup}
+    return JSONResponse({"status": "not_ready", "warmup": warmup}, status_code=503)
+
+
+@app.get("/stats")
+def stats():
+    cache = get_match_cache()
+    hedger = get_hedger()
+    return {
+        "cache": cache.stats() if cache is not None else None,
+        "singleflight": get_singleflight().stats(),
+        "azure_rate_limit": azure_rate_limit_stats(),
+        "azure_pool": azure_pool_stats(),
+        "hedging": hedger.stats() if hedger is not None else None,
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Per-stage latency summaries and match counters in Prometheus text format."""
+    return PlainTextResponse(get_metrics().render(), media_type="text/plain; version=0.0.4")
+
 from fastapi.requests import Request
 
 @app.exception_handler(Exception)
 async def debug_exception_handler(request: Request, exc: Exception):
     return PlainTextResponse(str(exc), status_code=500)
 
-class MatchRequest(BaseModel):
+class _CandidateSource(BaseModel):
+    # Candidate names are nearly all distinct: interning them while parsing a JSON body only
+    # churns pydantic-core's string cache, and makes model_validate_json slower than json.loads
+    model_config = ConfigDict(cache_strings="keys")
+
+    candidates: Optional[List[str]] = Field(None, min_items=1, description="Candidate strings to match against.")
+    candidate_set: Optional[str] = Field(
+        None,
+        description="Name of a candidate list registered with PUT /candidate-sets/{name}, instead of `candidates`.",
+    )
+
+    @model_validator(mode="after")
+    def _exactly_one_candidate_source(self):
+        if (self.candidates is None) == (self.candidate_set is None):
+            raise ValueError("Provide exactly one of `candidates` or `candidate_set`")
+        return self
+
+class MatchRequest(_CandidateSource):
     input_string: str = Field(..., min_length=1, description="The string to match.")
-    candidates: List[str] = Field(..., min_items=1, description="Candidate strings to match against.")
     prompt_path: Optional[str] = Field(
         None,
         description="Optional prompt file path. Overrides PROMPT_PATH in env if provided.",
     )
 
+class ShortlistEntry(BaseModel):
+    candidate: str
+    score: float
+
 class MatchResponse(BaseModel):
     input_string: str
     match: Optional[str]
     raw: str
+    shortlist: Optional[List[ShortlistEntry]] = Field(
+        None,
+        description="Candidates sent to the model and their retrieval scores, if the list was shortlisted.",
+    )
+    cache: Optional[str] = Field(None, description='"hit" or "miss" if the result cache was consulted.')
+    tier: Optional[str] = Field(
+        None,
+        description=(
+            'Which tier answered: "normalized" or "acronym" (deterministic pre-match), "cache", "model", '
+            'or "fallback" (local fuzzy match after the model missed the deadline).'
+        ),
+    )
+    chunks: Optional[int] = Field(
+        None,
+        description="Number of chunks the candidate list was split into, if it was too long for one prompt.",
+    )
+    degraded: bool = Field(
+        False,
+        description="True if the model missed MATCH_DEADLINE_SECONDS and this is the local fuzzy match instead.",
+    )
+    prompt_tokens: Optional[int] = Field(
+        None, description="Prompt tokens of the model call(s) made for this match, if the model reported them."
+    )
+    cached_prompt_tokens: Optional[int] = Field(
+        None, description="How many of prompt_tokens the provider served from its prompt cache."
+    )
+
+class BatchMatchRequest(_CandidateSource):
+    input_strings: List[str] = Field(..., min_items=1, description="The strings to match.")
+    prompt_path: Optional[str] = Field(
+        None,
+        description="Optional prompt file path. Overrides PROMPT_PATH in env if provided.",
+    )
+
+class BatchMatchResponse(BaseModel):
+    results: List[MatchResponse]
+
+class JobStatusResponse(BaseModel):
+    job_id: str
+    status: str
+    total_rows: int
+    done_rows: int
+    failed_rows: int
+    candidate_set: Optional[str]
+    prompt_path: Optional[str]
+    created_at: float
+    updated_at: float
+
+class CandidateSetRequest(BaseModel):
+    candidates: List[str] = Field(..., min_items=1, description="Candidate strings to register.")
+
+class CandidateSetInfo(BaseModel):
+    name: str
+    size: int = Field(..., description="Number of distinct candidates.")
+    fingerprint: str
+
+def _check_prompt_path(prompt_path: Optional[str]) -> None:
+    """Reject unregistered prompt paths before doing any work."""
+    if not prompt_path:
+        return
+    try:
+        get_prompt_registry().get(prompt_path)
+    except UnknownPromptError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _resolve_candidates(candidates: Optional[List[str]], candidate_set: Optional[str]):
+    """Returns (candidates or CandidateSet, model) for a request."""
+    if candidate_set is not None:
+        try:
+            cset = get_candidate_set_registry().get(candidate_set)
+        except CandidateSetNotFoundError:
+            raise HTTPException(status_code=404, detail=f"Unknown candidate set: {candidate_set}")
+        return cset, cset.model
+    return candidates, get_chat_model(candidates=candidates)
+
+
+def _check_candidate_set(candidate_set: Optional[str]) -> None:
+    """404 for an unknown candidate set, without building its model."""
+    if candidate_set is not None:
+        try:
+            get_candidate_set_registry().get(candidate_set)
+        except CandidateSetNotFoundError:
+            raise HTTPException(status_code=404, detail=f"Unknown candidate set: {candidate_set}")
+
+
+async def _aresolve_candidates(candidates: Optional[List[str]], candidate_set: Optional[str]):
+    """_resolve_candidates for async handlers: building a model (e.g. the mock's scorer) blocks, so it runs in a thread."""
+    return await asyncio.to_thread(_resolve_candidates, candidates, candidate_set)
+
+
+def _build_response(input_string: str, raw: str, trace: MatchTrace) -> MatchResponse:
+    shortlist = None
+    if trace.shortlist is not None:
+        shortlist = [ShortlistEntry(candidate=c, score=score) for c, score in trace.shortlist]
+    return MatchResponse(
+        input_string=input_string,
+        match=_normalize_output(raw),
+        raw=(raw or ""),
+        shortlist=shortlist,
+        cache=trace.cache,
+        tier=trace.tier,
+        chunks=trace.chunks,
+        degraded=trace.degraded,
+        prompt_tokens=trace.prompt_tokens,
+        cached_prompt_tokens=trace.cached_prompt_tokens,
+    )
+
 
-def _normalize_output(raw: str) -> Optional[str]:
-    s = (raw or "").strip()
-    s = s.strip('"').strip("'").strip()
-    if s.lower() in {"none", "null", "n/a", "na", ""}:
-        return None
-    return s
+def _server_timing(trace: MatchTrace) -> str:
+    # Server-Timing durations are in milliseconds
+    return ", ".join(f"{stage};dur={seconds * 1000:.3f}" for stage, seconds in trace.timings.items())
 
 
-@app.get("/match", response_model=MatchResponse)
-def match_get(
+@app.get("/match", response_model=MatchResponse, responses=MSGPACK_RESPONSE)
+async def match_get(
+    request: Request,
     input_string: str = Query(..., min_length=1),
-    candidates: List[str] = Query(..., description="Repeat this param for each candidate."),
+    candidates: Optional[List[str]] = Query(None, description="Repeat this param for each candidate."),
+    candidate_set: Optional[str] = Query(None, description="Name of a registered candidate set, instead of candidates."),
     prompt_path: Optional[str] = Query(None),
 ):
+    if (not candidates) == (candidate_set is None):
+        raise HTTPException(status_code=422, detail="Provide exactly one of `candidates` or `candidate_set`")
+    _check_prompt_path(prompt_path)
+    candidates, model = await _aresolve_candidates(candidates, candidate_set)
     try:
-        model = get_chat_model(candidates=candidates)
-        raw = match_string_with_langchain(
+        trace = MatchTrace()
+        raw = await amatch_string_with_langchain(
             input_string=input_string,
             list_of_strings=candidates,
             model=model,
             prompt_path=prompt_path,
+            trace=trace,
+        )
+        return encode_response(
+            request, _build_response(input_string, raw, trace), headers={"Server-Timing": _server_timing(trace)}
         )
-        match = _normalize_output(raw)
-        return MatchResponse(input_string=input_string, match=match, raw=(raw or ""))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/match", response_model=MatchResponse)
-def match_post(req: MatchRequest):
+@app.post("/match", response_model=MatchResponse, responses=MSGPACK_RESPONSE, openapi_extra=openapi_body(MatchRequest))
+async def match_post(request: Request):
+    """Accepts and returns JSON or MessagePack (see app/services/wire_format.py)."""
+    req = await parse_body(request, MatchRequest)
+    _check_prompt_path(req.prompt_path)
+    candidates, model = await _aresolve_candidates(req.candidates, req.candidate_set)
     try:
-        model = get_chat_model(candidates=req.candidates)
-        raw = match_string_with_langchain(
+        trace = MatchTrace()
+        raw = await amatch_string_with_langchain(
             input_string=req.input_string,
-            list_of_strings=req.candidates,
+            list_of_strings=candidates,
             model=model,
             prompt_path=req.prompt_path,
+            trace=trace,
+        )
+        return encode_response(
+            request, _build_response(req.input_string, raw, trace), headers={"Server-Timing": _server_timing(trace)}
         )
-        match = _normalize_output(raw)
-        return MatchResponse(input_string=req.input_string, match=match, raw=(raw or ""))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post(
+    "/match/batch",
+    response_model=BatchMatchResponse,
+    responses=MSGPACK_RESPONSE,
+    openapi_extra=openapi_body(BatchMatchRequest),
+)
+async def match_batch(request: Request):
+    """Accepts and returns JSON or MessagePack (see app/services/wire_format.py)."""
+    req = await parse_body(request, BatchMatchRequest)
+    if any(not s for s in req.input_strings):
+        raise HTTPException(status_code=422, detail="input_strings must not contain empty strings")
+    _check_prompt_path(req.prompt_path)
+    # One model for the whole batch: the candidate list is shared by every input.
+    candidates, model = await _aresolve_candidates(req.candidates, req.candidate_set)
+
+    try:
+        if get_settings().pack_size > 1:
+            traces = [MatchTrace() for _ in req.input_strings]
+            raws = await amatch_many_with_langchain(
+                input_strings=req.input_strings,
+                list_of_strings=candidates,
+                model=model,
+                prompt_path=req.prompt_path,
+                traces=traces,
+            )
+            results = [_build_response(s, raw, trace) for s, raw, trace in zip(req.input_strings, raws, traces)]
+            return encode_response(request, BatchMatchResponse(results=results))
+
+        batch_slots = asyncio.Semaphore(max(1, get_settings().batch_max_concurrency))
+
+        async def _match_one(input_string: str) -> MatchResponse:
+            async with batch_slots:
+                trace = MatchTrace()
+                raw = await amatch_string_with_langchain(
+                    input_string=input_string,
+                    list_of_strings=candidates,
+                    model=model,
+                    prompt_path=req.prompt_path,
+                    trace=trace,
+                )
+                return _build_response(input_string, raw, trace)
+
+        # gather() returns results in input order regardless of completion order
+        results = await asyncio.gather(*(_match_one(s) for s in req.input_strings))
+        return encode_response(request, BatchMatchResponse(results=list(results)))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def _candidate_set_info(cset) -> CandidateSetInfo:
+    return CandidateSetInfo(name=cset.name, size=len(cset), fingerprint=cset.fingerprint)
+
+
+@app.put("/candidate-sets/{name}", response_model=CandidateSetInfo)
+def put_candidate_set(name: str, req: CandidateSetRequest):
+    return _candidate_set_info(get_candidate_set_registry().put(name, req.candidates))
+
+
+@app.get("/candidate-sets", response_model=List[str])
+def list_candidate_sets():
+    return get_candidate_set_registry().names()
+
+
+@app.get("/candidate-sets/{name}", response_model=CandidateSetInfo)
+def get_candidate_set(name: str):
+    try:
+        return _candidate_set_info(get_candidate_set_registry().get(name))
+    except CandidateSetNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Unknown candidate set: {name}")
+
+
+@app.delete("/candidate-sets/{name}", status_code=204)
+def delete_candidate_set(name: str):
+    try:
+        get_candidate_set_registry().delete(name)
+    except CandidateSetNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Unknown candidate set: {name}")
+
+
+_NDJSON = "application/x-ndjson"
+
+
+@app.post("/jobs")
+async def create_job(
+    request: Request,
+    candidates: Optional[List[str]] = Query(None, description="Repeat this param for each candidate."),
+    candidate_set: Optional[str] = Query(None, description="Name of a registered candidate set, instead of candidates."),
+    prompt_path: Optional[str] = Query(None),
+    input_format: Optional[str] = Query(None, description='"csv" or "ndjson". Defaults from Content-Type.'),
+    column: str = Query("input_string", description="CSV column / NDJSON field holding the input names."),
+):
+    """
+    Upload a CSV or NDJSON file of input names as the request body and stream NDJSON results.
+
+    The job ID is returned in the X-Job-Id header; if the stream is interrupted, continue with
+    GET /jobs/{job_id}/results.
+    """
+    if (not candidates) == (candidate_set is None):
+        raise HTTPException(status_code=422, detail="Provide exactly one of `candidates` or `candidate_set`")
+    _check_prompt_path(prompt_path)
+    _check_candidate_set(candidate_set)
+
+    content_type = request.headers.get("content-type", "")
+    fmt = input_format or ("ndjson" if "json" in content_type else "csv")
+    if fmt == "csv":
+        inputs = iter_csv_inputs(request.stream(), column=column)
+    elif fmt == "ndjson":
+        inputs = iter_ndjson_inputs(request.stream(), column=column)
+    else:
+        raise HTTPException(status_code=422, detail=f"Unsupported input_format: {fmt}")
+
+    settings = get_settings()
+    store = get_job_store()
+    job_id = await asyncio.to_thread(store.create_job, candidates, candidate_set, prompt_path)
+    try:
+        # Any failure marks the job "failed"; only parse errors are the client's fault
+        await ingest(store, job_id, inputs, settings.job_chunk_size)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=422, detail=f"Could not parse upload: {e}")
+    await asyncio.to_thread(claim_job, store, job_id)
+
+    return StreamingResponse(
+        stream_results(store, job_id, settings.job_chunk_size, claimed=True),
+        media_type=_NDJSON,
+        headers={"X-Job-Id": job_id},
+    )
+
+
+@app.get("/jobs/{job_id}", response_model=JobStatusResponse)
+def get_job(job_id: str):
+    try:
+        return JobStatusResponse(**asdict(get_job_store().status(job_id)))
+    except JobNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+
+
+@app.get("/jobs/{job_id}/results")
+def get_job_results(job_id: str):
+    """Stream all results of a job, matching any rows that haven't been matched yet."""
+    store = get_job_store()
+    try:
+        _, candidate_set, _ = store.job_source(job_id)
+    except JobNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    _check_candidate_set(candidate_set)
+    try:
+        # Claimed before the response starts, so a request that loses the race gets a clean 409
+        claim_job(store, job_id)
+    except (JobNotIngestedError, JobAlreadyRunningError) as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    return StreamingResponse(
+        stream_results(store, job_id, get_settings().job_chunk_size, claimed=True),
+        media_type=_NDJSON,
+        headers={"X-Job-Id": job_id},
+    )
@@ -0,0 +1,104 @@
+"""
+Azure OpenAI backend (USE_MOCK_LLM=false): AzureChatOpenAI behind the client-side rate limiter
+(rate_limit.py), or a DeploymentPool over several deployments (deployment_pool.py).
+
+This is the only module that imports langchain_openai (and with it the openai SDK), so it is only
+loaded, through model_factory's backend registry, by processes that actually call Azure.
+"""
+
+from __future__ import annotations
+
+from functools import lru_cache
+from typing import Optional, Sequence
+
+from langchain_openai import AzureChatOpenAI
+
+from app.config import AzureDeployment, get_settings, missing_azure_vars, parse_azure_deployments
+from app.services.deployment_pool import DeploymentPool
+from app.services.rate_limit import AdaptiveConcurrency, RateLimitedChatModel
+
+
+def _build_azure_client(deployment: AzureDeployment, max_retries: int):
+    settings = get_settings()
+    if not settings.azure_rate_limit_enabled:
+        return AzureChatOpenAI(
+            azure_endpoint=deployment.endpoint,
+            openai_api_key=deployment.key,
+            azure_deployment=deployment.deployment,
+            openai_api_version=deployment.api_version,
+            temperature=1.0,
+        )
+
+    # Retries are done by RateLimitedChatModel, which honours Retry-After and backs off concurrency
+    model = AzureChatOpenAI(
+        azure_endpoint=deployment.endpoint,
+        openai_api_key=deployment.key,
+        azure_deployment=deployment.deployment,
+        openai_api_version=deployment.api_version,
+        temperature=1.0,
+        max_retries=0,
+    )
+    return RateLimitedChatModel(
+        model,
+        requests_per_minute=settings.azure_requests_per_minute,
+        tokens_per_minute=settings.azure_tokens_per_minute,
+        concurrency=AdaptiveConcurrency(
+            initial=settings.azure_initial_concurrency,
+            minimum=settings.azure_min_concurrency,
+            maximum=settings.azure_max_concurrency,
+            latency_target_seconds=settings.azure_latency_target_seconds,
+        ),
+        max_retries=max_retries,
+    )
+
+
+@lru_cache(maxsize=1)
+def get_azure_model():
+    settings = get_settings()
+    deployments = parse_azure_deployments(settings)
+    if deployments:
+        # Limits apply per deployment; a 429 fails over to another deployment instead of waiting,
+        # unless there is no other one
+        retries = settings.azure_max_retries if len(deployments) == 1 else 0
+        return DeploymentPool(
+            [(d.name, _build_azure_client(d, retries)) for d in deployments],
+            failover_retries=settings.azure_failover_retries,
+            failure_threshold=settings.azure_circuit_failure_threshold,
+            cooldown_seconds=settings.azure_circuit_cooldown_seconds,
+        )
+
+    missing = missing_azure_vars(settings)
+    if missing:
+        raise RuntimeError("Missing required env vars: " + ", ".join(missing))
+    deployment = AzureDeployment(
+        name=settings.azure_openai_deployment_name,
+        endpoint=settings.azure_openai_endpoint,
+        deployment=settings.azure_openai_deployment_name,
+        key=settings.azure_openai_key,
+        api_version=settings.azure_openai_api_version,
+    )
+    return _build_azure_client(deployment, settings.azure_max_retries)
+
+
+def build_chat_model(candidates: Optional[Sequence[str]] = None):
+    """The process-wide Azure model; the candidates are only ever sent in the prompt."""
+    return get_azure_model()
+
+
+def rate_limit_stats() -> Optional[dict]:
+    """Limiter stats for the Azure model, or None if it hasn't been built or isn't rate limited."""
+    if get_azure_model.cache_info().currsize == 0:
+        return None
+    model = get_azure_model()
+    if isinstance(model, DeploymentPool):
+        # Per deployment, in pool_stats()
+        return None
+    return model.stats() if isinstance(model, RateLimitedChatModel) else None
+
+
+def pool_stats() -> Optional[dict]:
+    """Per-deployment stats for the Azure deployment pool, or None if there isn't one (yet)."""
+    if get_azure_model.cache_info().currsize == 0:
+        return None
+    model = get_azure_model()
+    return model.stats() if isinstance(model, DeploymentPool) else None
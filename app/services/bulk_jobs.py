@@ -0,0 +1,392 @@
+"""
+Bulk matching jobs: a CSV/NDJSON file of input names in, NDJSON results out.
+
+An upload is first streamed into a local SQLite file (JOBS_DB_PATH) in chunks, then matched
+chunk by chunk, writing each chunk's results back before streaming them to the client. Memory
+use stays constant however long the file is, and a job that stops part way (crash, timeout,
+client disconnect) can be resumed by ID: rows that already have a result are replayed from
+SQLite instead of being sent to the model again.
+
+A run is claimed in SQLite (the job's status becomes "running"), so only one request, on any
+worker process, runs a job at a time. A claim whose run stops saving results for
+JOB_STALE_SECONDS (its worker died) can be taken over.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import codecs
+import csv
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import AsyncIterator, List, Optional, Tuple
+
+from app.config import get_settings
+from app.services.candidate_sets import get_candidate_set_registry
+from app.services.langchain_matcher import _normalize_output
+from app.services.packed_matcher import amatch_many_with_langchain
+
+logger = logging.getLogger(__name__)
+
+
+class JobNotFoundError(KeyError):
+    pass
+
+
+class JobAlreadyRunningError(RuntimeError):
+    pass
+
+
+class JobNotIngestedError(RuntimeError):
+    """The job's upload is still being stored, or was cut off, so its rows are not all there."""
+
+
+@dataclass
+class JobStatus:
+    job_id: str
+    # "ingesting", "failed" (upload cut off or unparseable; never matched), "ready", "running",
+    # "completed" or "incomplete" (stopped part way through matching; resumable)
+    status: str
+    total_rows: int
+    done_rows: int
+    failed_rows: int
+    candidate_set: Optional[str]
+    prompt_path: Optional[str]
+    created_at: float
+    updated_at: float
+
+
+# ---------------------------------------------------------------------------
+# Input parsing
+# ---------------------------------------------------------------------------
+
+async def _iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Decode a byte stream into lines without holding more than one chunk in memory."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending.rstrip("\r")
+
+
+async def iter_csv_inputs(chunks: AsyncIterator[bytes], column: str = "input_string") -> AsyncIterator[str]:
+    """
+    Input names from a CSV stream.
+
+    If the first row has a `column` header, that column is used; otherwise the file has no
+    header and the first column is used. Quoted fields may span lines.
+    """
+    column_idx: Optional[int] = None
+    first = True
+    record = ""
+    async for line in _iter_lines(chunks):
+        record = f"{record}\n{line}" if record else line
+        if record.count('"') % 2:
+            # Inside a quoted field that continues on the next line
+            continue
+        row, record = next(csv.reader([record]), []), ""
+
+        if first:
+            first = False
+            if column in row:
+                column_idx = row.index(column)
+                continue
+            column_idx = 0
+
+        if len(row) > column_idx and row[column_idx].strip():
+            yield row[column_idx].strip()
+
+
+async def iter_ndjson_inputs(chunks: AsyncIterator[bytes], column: str = "input_string") -> AsyncIterator[str]:
+    """Input names from an NDJSON stream: one JSON string, or object with `column`, per line."""
+    async for line in _iter_lines(chunks):
+        if not line.strip():
+            continue
+        value = json.loads(line)
+        if isinstance(value, dict):
+            value = value.get(column)
+        if isinstance(value, str) and value.strip():
+            yield value.strip()
+
+
+# ---------------------------------------------------------------------------
+# Persistence
+# ---------------------------------------------------------------------------
+
+class JobStore:
+    """SQLite-backed job and row state. Safe to share between threads."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = sqlite3.connect(path, timeout=30.0, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    candidate_set TEXT,
+                    candidates TEXT,
+                    prompt_path TEXT,
+                    total_rows INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS job_rows (
+                    job_id TEXT NOT NULL,
+                    row_no INTEGER NOT NULL,
+                    input_string TEXT NOT NULL,
+                    done INTEGER NOT NULL DEFAULT 0,
+                    raw TEXT,
+                    error TEXT,
+                    PRIMARY KEY (job_id, row_no)
+                );
+                """
+            )
+
+    def create_job(
+        self, candidates: Optional[List[str]], candidate_set: Optional[str], prompt_path: Optional[str]
+    ) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (job_id, status, candidate_set, candidates, prompt_path, created_at, updated_at)"
+                " VALUES (?, 'ingesting', ?, ?, ?, ?, ?)",
+                (job_id, candidate_set, json.dumps(candidates) if candidates else None, prompt_path, now, now),
+            )
+        return job_id
+
+    def add_rows(self, job_id: str, first_row_no: int, inputs: List[str]) -> None:
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "INSERT INTO job_rows (job_id, row_no, input_string) VALUES (?, ?, ?)",
+                [(job_id, first_row_no + i, s) for i, s in enumerate(inputs)],
+            )
+            self._conn.execute(
+                "UPDATE jobs SET total_rows = ?, updated_at = ? WHERE job_id = ?",
+                (first_row_no + len(inputs), time.time(), job_id),
+            )
+            self._conn.execute("COMMIT")
+
+    def claim(self, job_id: str, stale_before: float) -> bool:
+        """
+        Marks a matchable job "running". False if it isn't matchable: unknown, not fully
+        ingested, or running and updated since `stale_before`.
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = 'running', updated_at = ? WHERE job_id = ?"
+                " AND (status IN ('ready', 'completed', 'incomplete') OR (status = 'running' AND updated_at < ?))",
+                (time.time(), job_id, stale_before),
+            )
+        return cursor.rowcount == 1
+
+    def set_status(self, job_id: str, status: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, updated_at = ? WHERE job_id = ?", (status, time.time(), job_id)
+            )
+
+    def job_source(self, job_id: str) -> Tuple[Optional[List[str]], Optional[str], Optional[str]]:
+        """(candidates, candidate_set, prompt_path) the job was created with."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT candidates, candidate_set, prompt_path FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            raise JobNotFoundError(job_id)
+        return (json.loads(row[0]) if row[0] else None), row[1], row[2]
+
+    def status(self, job_id: str) -> JobStatus:
+        with self._lock:
+            job = self._conn.execute(
+                "SELECT status, total_rows, candidate_set, prompt_path, created_at, updated_at"
+                " FROM jobs WHERE job_id = ?",
+                (job_id,),
+            ).fetchone()
+            if job is None:
+                raise JobNotFoundError(job_id)
+            done, failed = self._conn.execute(
+                "SELECT COALESCE(SUM(done), 0), COALESCE(SUM(error IS NOT NULL AND done = 0), 0)"
+                " FROM job_rows WHERE job_id = ?",
+                (job_id,),
+            ).fetchone()
+        status, total, candidate_set, prompt_path, created_at, updated_at = job
+        return JobStatus(job_id, status, total, done, failed, candidate_set, prompt_path, created_at, updated_at)
+
+    def rows(self, job_id: str, done: bool, after_row_no: int, limit: int) -> List[Tuple[int, str, Optional[str]]]:
+        """Up to `limit` (row_no, input_string, raw) rows after `after_row_no`, in row order."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT row_no, input_string, raw FROM job_rows"
+                " WHERE job_id = ? AND done = ? AND row_no > ? ORDER BY row_no LIMIT ?",
+                (job_id, int(done), after_row_no, limit),
+            ).fetchall()
+
+    def save_results(self, job_id: str, results: List[Tuple[int, Optional[str], Optional[str]]]) -> None:
+        """Store (row_no, raw, error) results. Rows with an error stay pending for the next resume."""
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "UPDATE job_rows SET raw = ?, error = ?, done = ? WHERE job_id = ? AND row_no = ?",
+                [(raw, error, int(error is None), job_id, row_no) for row_no, raw, error in results],
+            )
+            self._conn.execute("UPDATE jobs SET updated_at = ? WHERE job_id = ?", (time.time(), job_id))
+            self._conn.execute("COMMIT")
+
+
+@lru_cache(maxsize=1)
+def get_job_store() -> JobStore:
+    return JobStore(get_settings().jobs_db_path)
+
+
+# ---------------------------------------------------------------------------
+# Running jobs
+# ---------------------------------------------------------------------------
+
+def _result_line(row_no: int, input_string: str, raw: Optional[str], error: Optional[str] = None) -> bytes:
+    line = {"row": row_no, "input_string": input_string, "match": _normalize_output(raw or ""), "raw": raw or ""}
+    if error is not None:
+        line["error"] = error
+    return (json.dumps(line, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+async def ingest(store: JobStore, job_id: str, inputs: AsyncIterator[str], chunk_size: int) -> int:
+    """
+    Persist input rows in chunks. Returns the number of rows.
+
+    If the upload fails for any reason (parse error, client disconnect, cancellation) the job is
+    marked "failed": its rows are only part of the file, so it must never be matched or reported
+    as completed.
+    """
+    chunk: List[str] = []
+    n = 0
+    try:
+        async for input_string in inputs:
+            chunk.append(input_string)
+            if len(chunk) >= chunk_size:
+                await asyncio.to_thread(store.add_rows, job_id, n, chunk)
+                n += len(chunk)
+                chunk = []
+        if chunk:
+            await asyncio.to_thread(store.add_rows, job_id, n, chunk)
+            n += len(chunk)
+    except BaseException:
+        # Synchronous on purpose: the task may already be cancelled, so nothing can be awaited
+        store.set_status(job_id, "failed")
+        raise
+    await asyncio.to_thread(store.set_status, job_id, "ready")
+    return n
+
+
+def check_job_ingested(store: JobStore, job_id: str) -> None:
+    """Raises JobNotIngestedError unless every row of the job's upload has been stored."""
+    status = store.status(job_id).status
+    if status == "ingesting":
+        raise JobNotIngestedError(f"Job {job_id} is still being uploaded")
+    if status == "failed":
+        raise JobNotIngestedError(f"Job {job_id} upload did not complete; submit the file again")
+
+
+def claim_job(store: JobStore, job_id: str) -> None:
+    """
+    Claims a run of the job for the caller. Raises JobNotFoundError, JobNotIngestedError, or
+    JobAlreadyRunningError if another request (on any worker) is running it.
+    """
+    if store.claim(job_id, time.time() - get_settings().job_stale_seconds):
+        return
+    check_job_ingested(store, job_id)
+    raise JobAlreadyRunningError(f"Job {job_id} is already running")
+
+
+def _job_candidates(store: JobStore, job_id: str):
+    """Returns (candidates or CandidateSet, model, prompt_path) for a job."""
+    candidates, candidate_set, prompt_path = store.job_source(job_id)
+    if candidate_set is not None:
+        cset = get_candidate_set_registry().get(candidate_set)
+        return cset, cset.model, prompt_path
+
+    from app.services.model_factory import get_chat_model
+
+    return candidates, get_chat_model(candidates=candidates), prompt_path
+
+
+async def stream_results(
+    store: JobStore, job_id: str, chunk_size: int, claimed: bool = False
+) -> AsyncIterator[bytes]:
+    """
+    NDJSON results for every row of a job.
+
+    Rows matched by an earlier run are replayed from the store; the remaining rows are matched
+    a chunk at a time, and each chunk is saved before its lines are yielded. Unless the caller
+    has already `claimed` the run (see claim_job, which the API does before it starts a
+    response), it is claimed here, raising claim_job's errors.
+    """
+    if not claimed:
+        await asyncio.to_thread(claim_job, store, job_id)
+
+    try:
+        candidates, model, prompt_path = await asyncio.to_thread(_job_candidates, store, job_id)
+
+        after = -1
+        while True:
+            rows = await asyncio.to_thread(store.rows, job_id, True, after, chunk_size)
+            if not rows:
+                break
+            for row_no, input_string, raw in rows:
+                yield _result_line(row_no, input_string, raw)
+            after = rows[-1][0]
+
+        async def _match_chunk(inputs: List[str]) -> List[Tuple[Optional[str], Optional[str]]]:
+            # Packs up to Settings.pack_size inputs per model call; failures are reported per row
+            raws = await amatch_many_with_langchain(
+                input_strings=inputs,
+                list_of_strings=candidates,
+                model=model,
+                prompt_path=prompt_path,
+                return_exceptions=True,
+            )
+            outcomes = []
+            for input_string, raw in zip(inputs, raws):
+                if isinstance(raw, BaseException):
+                    logger.warning("Job %s: match failed for %s: %s", job_id, input_string, raw)
+                    outcomes.append((None, str(raw)))
+                else:
+                    outcomes.append((raw, None))
+            return outcomes
+
+        after = -1
+        while True:
+            rows = await asyncio.to_thread(store.rows, job_id, False, after, chunk_size)
+            if not rows:
+                break
+            outcomes = await _match_chunk([input_string for _, input_string, _ in rows])
+            results = [(row_no, raw, error) for (row_no, _, _), (raw, error) in zip(rows, outcomes)]
+            await asyncio.to_thread(store.save_results, job_id, results)
+            for (row_no, input_string, _), (raw, error) in zip(rows, outcomes):
+                yield _result_line(row_no, input_string, raw, error)
+            after = rows[-1][0]
+
+        status = await asyncio.to_thread(store.status, job_id)
+        await asyncio.to_thread(
+            store.set_status, job_id, "completed" if status.done_rows == status.total_rows else "incomplete"
+        )
+    except BaseException:
+        # Includes client disconnects (GeneratorExit / CancelledError): the job can be resumed
+        store.set_status(job_id, "incomplete")
+        raise
@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import math
+import re
+from collections import defaultdict
+from functools import lru_cache
+from heapq import nlargest
+from typing import Dict, List, Sequence, Tuple
+
+_WORD_RE = re.compile(r"[^\W_]+")
+
+# Words that usually don't contribute a letter to an organisation's acronym (DWP, MoJ, ...)
+_ACRONYM_STOPWORDS = frozenset({"a", "an", "and", "at", "for", "in", "of", "on", "the", "to"})
+
+
+def _words(text: str) -> List[str]:
+    return _WORD_RE.findall(text.casefold())
+
+
+def _acronyms(words: List[str]) -> List[str]:
+    if len(words) < 2:
+        return []
+    full = "".join(w[0] for w in words)
+    short = "".join(w[0] for w in words if w not in _ACRONYM_STOPWORDS)
+    return sorted({a for a in (full, short) if len(a) >= 2})
+
+
+def _terms(text: str, ngram: int) -> List[str]:
+    """
+    Index terms for a name: whole words, padded character n-grams and acronyms.
+
+    Character n-grams make the index tolerant to typos ("Home Ofice"), word terms reward
+    full-word overlap and acronym terms let "DWP" find "Department for Work and Pensions".
+    """
+    words = _words(text)
+    terms = ["w:" + w for w in words]
+
+    padded = " " + " ".join(words) + " "
+    terms.extend("c:" + padded[i:i + ngram] for i in range(len(padded) - ngram + 1))
+
+    terms.extend("a:" + a for a in _acronyms(words))
+    return terms
+
+
+class CandidateIndex:
+    """
+    BM25 inverted index over candidate names.
+
+    Built once per candidate list and used to shortlist the most plausible candidates for an
+    input before anything is sent to the model.
+    """
+
+    def __init__(self, candidates: Sequence[str], ngram: int = 3, k1: float = 1.2, b: float = 0.75):
+        self.candidates: List[str] = list(candidates)
+        self.ngram = ngram
+        self.k1 = k1
+        self.b = b
+
+        postings: Dict[str, Dict[int, int]] = defaultdict(dict)
+        doc_lengths: List[int] = []
+        for doc_id, candidate in enumerate(self.candidates):
+            terms = _terms(str(candidate), ngram)
+            doc_lengths.append(len(terms))
+            for term in terms:
+                tf = postings[term]
+                tf[doc_id] = tf.get(doc_id, 0) + 1
+
+        n_docs = len(self.candidates)
+        avg_len = (sum(doc_lengths) / n_docs) if n_docs else 0.0
+
+        # Precompute the per-document length normalisation so search only does lookups and adds
+        norms = [k1 * (1 - b + b * (dl / avg_len)) if avg_len else k1 for dl in doc_lengths]
+
+        self._postings: Dict[str, Tuple[float, List[Tuple[int, float]]]] = {}
+        for term, tf_by_doc in postings.items():
+            df = len(tf_by_doc)
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            weighted = [(doc_id, tf * (k1 + 1) / (tf + norms[doc_id])) for doc_id, tf in tf_by_doc.items()]
+            self._postings[term] = (idf, weighted)
+
+    def __len__(self) -> int:
+        return len(self.candidates)
+
+    def search(self, query: str, top_k: int) -> List[Tuple[str, float]]:
+        """
+        Returns up to `top_k` (candidate, score) pairs, best first.
+
+        Candidates that share no index term with the query are never returned.
+        """
+        if top_k <= 0:
+            return []
+
+        query_terms = set(_terms(query, self.ngram))
+        compact = "".join(_words(query))
+        if compact:
+            query_terms.add("a:" + compact)
+
+        scores: Dict[int, float] = defaultdict(float)
+        for term in query_terms:
+            entry = self._postings.get(term)
+            if entry is None:
+                continue
+            idf, weighted = entry
+            for doc_id, weight in weighted:
+                scores[doc_id] += idf * weight
+
+        # Ties keep the original candidate order
+        best = nlargest(top_k, scores.items(), key=lambda item: (item[1], -item[0]))
+        return [(self.candidates[doc_id], round(score, 4)) for doc_id, score in best]
+
+
+@lru_cache(maxsize=16)
+def get_candidate_index(candidates: Tuple[str, ...]) -> CandidateIndex:
+    """Cached index per distinct candidate list, so repeated lists are only indexed once."""
+    return CandidateIndex(candidates)
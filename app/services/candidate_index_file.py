@@ -0,0 +1,443 @@
+"""
+Persistent, memory-mapped candidate index files.
+
+A large candidate list that rarely changes (e.g. the canonical buyer registry) is compiled
+offline, once, into a single file of flat arrays:
+
+- the candidate strings (UTF-8 blob + offsets) and their prompt JSON
+- an exact-string membership table
+- the BM25 shortlisting postings (see candidate_index.CandidateIndex)
+- the pre-match normalized-name and acronym tables (see prematch.PrematchIndex)
+- the mock scorers' candidate vectors (see scoring.py)
+
+Workers open the file with mmap and read the arrays in place with numpy, so opening takes
+milliseconds and every worker shares the same pages through the OS page cache instead of
+each building and holding a private copy.
+
+Lookup tables are keyed by 64-bit BLAKE2b hashes of the term / name / acronym, kept sorted and
+searched with numpy.searchsorted.
+
+    python -m app.services.candidate_index_file build buyers.csv -o buyers.nmidx
+    python -m app.services.candidate_index_file info buyers.nmidx
+
+and set CANDIDATE_INDEX_FILES=buyers=buyers.nmidx to serve it as the candidate set "buyers".
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import hashlib
+import json
+import mmap
+import struct
+import threading
+from collections.abc import Sequence as SequenceABC
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, FrozenSet, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.services.candidate_index import CandidateIndex, _terms, _words
+from app.services.match_cache import candidates_fingerprint
+from app.services.prematch import PrematchIndex, _as_acronym, legal_suffixes, normalise_name
+from app.services.scoring import SequenceScorer, TrigramScorer
+
+FORMAT_VERSION = 1
+_MAGIC = b"NMIDX\x00\x00\x01"
+# Footer: header offset, header length, magic
+_FOOTER = struct.Struct("<QQ8s")
+_ALIGN = 64
+
+
+class IndexFileError(ValueError):
+    """The file isn't a candidate index file this version can read."""
+
+
+def _hash64(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def _group_table(groups: Dict[str, Sequence[int]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(sorted key hashes, indptr, ids): the ids for the i-th key are ids[indptr[i]:indptr[i + 1]]."""
+    by_hash: Dict[int, List[int]] = {}
+    for key, ids in groups.items():
+        # A (vanishingly unlikely) hash collision merges the two keys' ids
+        by_hash.setdefault(_hash64(key), []).extend(ids)
+    keys = np.array(sorted(by_hash), dtype=np.uint64)
+    lengths = [len(by_hash[int(k)]) for k in keys]
+    indptr = np.zeros(len(keys) + 1, dtype=np.uint64)
+    np.cumsum(lengths, out=indptr[1:])
+    ids = np.fromiter((i for k in keys for i in by_hash[int(k)]), dtype=np.uint32, count=int(indptr[-1]))
+    return keys, indptr, ids
+
+
+def _group_lookup(keys: np.ndarray, indptr: np.ndarray, ids: np.ndarray, key: str) -> np.ndarray:
+    h = np.uint64(_hash64(key))
+    pos = int(np.searchsorted(keys, h))
+    if pos == len(keys) or keys[pos] != h:
+        return ids[:0]
+    return ids[int(indptr[pos]) : int(indptr[pos + 1])]
+
+
+# ---------------------------------------------------------------------------------------------
+# Building
+
+
+def _string_table(strings: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.uint64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    return offsets, np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+
+def build_index_file(
+    candidates: Iterable[str],
+    path: str,
+    suffixes: Optional[FrozenSet[str]] = None,
+    ngram: int = 3,
+) -> Dict[str, object]:
+    """Compile a candidate list into an index file at `path`. Returns the file's header."""
+    candidates = list(dict.fromkeys(str(c) for c in candidates))
+    suffixes = legal_suffixes() if suffixes is None else suffixes
+    arrays: Dict[str, np.ndarray] = {}
+
+    arrays["cand_offsets"], arrays["cand_blob"] = _string_table(candidates)
+    arrays["cand_json"] = np.frombuffer(json.dumps(candidates, ensure_ascii=False).encode("utf-8"), dtype=np.uint8)
+    ids_by_name: Dict[str, List[int]] = {}
+    for i, c in enumerate(candidates):
+        ids_by_name.setdefault(c, []).append(i)
+    arrays["member_keys"], arrays["member_indptr"], arrays["member_ids"] = _group_table(ids_by_name)
+
+    # BM25 postings, from the in-memory index so scores are identical
+    bm25 = CandidateIndex(candidates, ngram=ngram)
+    postings = bm25._postings
+    terms = sorted(postings, key=_hash64)
+    term_keys = np.fromiter((_hash64(t) for t in terms), dtype=np.uint64, count=len(terms))
+    if len(term_keys) != len(np.unique(term_keys)):
+        raise IndexFileError("BM25 term hash collision; rebuild with a different n-gram size")
+    arrays["bm25_keys"] = term_keys
+    arrays["bm25_idf"] = np.fromiter((postings[t][0] for t in terms), dtype=np.float64, count=len(terms))
+    arrays["bm25_indptr"] = np.zeros(len(terms) + 1, dtype=np.uint64)
+    np.cumsum([len(postings[t][1]) for t in terms], out=arrays["bm25_indptr"][1:])
+    n_postings = int(arrays["bm25_indptr"][-1])
+    arrays["bm25_docs"] = np.fromiter((d for t in terms for d, _ in postings[t][1]), dtype=np.uint32, count=n_postings)
+    arrays["bm25_weights"] = np.fromiter(
+        (w for t in terms for _, w in postings[t][1]), dtype=np.float64, count=n_postings
+    )
+    del bm25, postings
+
+    # Pre-match tables, from the in-memory index so lookups are identical
+    prematch = PrematchIndex(candidates, suffixes)
+    position = {c: i for i, c in enumerate(candidates)}
+    arrays["norm_keys"], arrays["norm_indptr"], arrays["norm_ids"] = _group_table(
+        {k: [position[c] for c in v] for k, v in prematch._names.items()}
+    )
+    arrays["acr_keys"], arrays["acr_indptr"], arrays["acr_ids"] = _group_table(
+        {k: [position[c] for c in v] for k, v in prematch._acronyms.items()}
+    )
+    del prematch
+
+    # Mock scorer vectors
+    sequence = SequenceScorer(candidates)
+    arrays["seq_counts"] = sequence._counts.astype(np.uint32)
+    arrays["seq_lengths"] = sequence._lengths.astype(np.uint32)
+    del sequence
+    trigram = TrigramScorer(candidates)
+    arrays["tri_terms"] = trigram._terms
+    arrays["tri_indptr"] = trigram._indptr.astype(np.uint64)
+    arrays["tri_postings"] = trigram._postings.astype(np.uint32)
+    arrays["tri_sizes"] = trigram._sizes.astype(np.uint32)
+    del trigram
+
+    header: Dict[str, object] = {
+        "version": FORMAT_VERSION,
+        "n_candidates": len(candidates),
+        "fingerprint": candidates_fingerprint(candidates),
+        "ngram": ngram,
+        "suffixes": sorted(suffixes),
+        "sections": {},
+    }
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_MAGIC)
+        for name, array in arrays.items():
+            f.write(b"\0" * (-f.tell() % _ALIGN))
+            array = np.ascontiguousarray(array)
+            header["sections"][name] = {"offset": f.tell(), "dtype": array.dtype.str, "shape": list(array.shape)}
+            f.write(array.tobytes())
+        header_bytes = json.dumps(header).encode("utf-8")
+        header_offset = f.tell()
+        f.write(header_bytes)
+        f.write(_FOOTER.pack(header_offset, len(header_bytes), _MAGIC))
+    # Replace atomically, so workers never open a half-written file
+    Path(tmp_path).replace(path)
+    return header
+
+
+# ---------------------------------------------------------------------------------------------
+# Reading
+
+
+class StringTable(SequenceABC):
+    """Read-only sequence of the candidate strings, decoded from the mapped file on access."""
+
+    def __init__(self, index_file: "CandidateIndexFile"):
+        self.index_file = index_file
+        self._offsets = index_file.array("cand_offsets")
+        self._blob = index_file.array("cand_blob")
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self._blob[int(self._offsets[i]) : int(self._offsets[i + 1])].tobytes().decode("utf-8")
+
+    def __iter__(self):
+        text = self._blob.tobytes()
+        offsets = self._offsets.tolist()
+        for start, end in zip(offsets, offsets[1:]):
+            yield text[start:end].decode("utf-8")
+
+    def __contains__(self, item) -> bool:
+        return isinstance(item, str) and self.index_file.position(item) is not None
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, StringTable):
+            return self.index_file.fingerprint == other.index_file.fingerprint
+        return isinstance(other, (list, tuple)) and list(self) == list(other)
+
+    def __hash__(self) -> int:
+        return hash(self.index_file.fingerprint)
+
+    def __repr__(self) -> str:
+        return f"StringTable({self.index_file.path!r}, {len(self)} candidates)"
+
+
+class MmapCandidateIndex:
+    """Same search() as candidate_index.CandidateIndex, over the file's BM25 postings."""
+
+    def __init__(self, index_file: "CandidateIndexFile"):
+        self.candidates = index_file.candidates
+        self.ngram = index_file.header["ngram"]
+        self._keys = index_file.array("bm25_keys")
+        self._idf = index_file.array("bm25_idf")
+        self._indptr = index_file.array("bm25_indptr")
+        self._docs = index_file.array("bm25_docs")
+        self._weights = index_file.array("bm25_weights")
+
+    def __len__(self) -> int:
+        return len(self.candidates)
+
+    def search(self, query: str, top_k: int) -> List[Tuple[str, float]]:
+        if top_k <= 0:
+            return []
+
+        query_terms = set(_terms(query, self.ngram))
+        compact = "".join(_words(query))
+        if compact:
+            query_terms.add("a:" + compact)
+
+        hashes = np.array(sorted(_hash64(t) for t in query_terms), dtype=np.uint64)
+        pos = np.searchsorted(self._keys, hashes)
+        found = pos < len(self._keys)
+        found[found] = self._keys[pos[found]] == hashes[found]
+        pos = pos[found]
+        if not len(pos):
+            return []
+
+        docs = np.concatenate([self._docs[int(self._indptr[p]) : int(self._indptr[p + 1])] for p in pos])
+        weights = np.concatenate(
+            [self._weights[int(self._indptr[p]) : int(self._indptr[p + 1])] * self._idf[p] for p in pos]
+        )
+        scores = np.bincount(docs, weights=weights, minlength=len(self.candidates))
+        hits = np.flatnonzero(scores > 0)
+        if len(hits) > top_k:
+            # Keep everything tied with the k-th best score, then order exactly
+            kth = np.partition(scores[hits], len(hits) - top_k)[len(hits) - top_k]
+            hits = hits[scores[hits] >= kth]
+        # Best score first; ties keep the original candidate order
+        best = hits[np.lexsort((hits, -scores[hits]))][:top_k]
+        return [(self.candidates[int(d)], round(float(scores[d]), 4)) for d in best]
+
+
+class MmapPrematchIndex:
+    """Same lookup() as prematch.PrematchIndex, over the file's normalized-name and acronym tables."""
+
+    def __init__(self, index_file: "CandidateIndexFile"):
+        self.candidates = index_file.candidates
+        # The suffixes the file was built with; the table keys depend on them
+        self.suffixes = frozenset(index_file.header["suffixes"])
+        self._names = tuple(index_file.array(n) for n in ("norm_keys", "norm_indptr", "norm_ids"))
+        self._acronyms = tuple(index_file.array(n) for n in ("acr_keys", "acr_indptr", "acr_ids"))
+
+    def _unique(self, ids: np.ndarray, input_string: str) -> Optional[str]:
+        remaining = [c for c in (self.candidates[int(i)] for i in ids) if c != input_string]
+        return remaining[0] if len(remaining) == 1 else None
+
+    def lookup(self, input_string: str) -> Optional[Tuple[str, str]]:
+        normalized = normalise_name(input_string, self.suffixes)
+        if normalized:
+            found = self._unique(_group_lookup(*self._names, normalized), input_string)
+            if found is not None and normalise_name(found, self.suffixes) == normalized:
+                return found, "normalized"
+
+        acronym = _as_acronym(input_string)
+        if acronym is not None:
+            found = self._unique(_group_lookup(*self._acronyms, acronym), input_string)
+            if found is not None:
+                return found, "acronym"
+        return None
+
+
+class CandidateIndexFile:
+    """A mapped index file. Arrays are read-only views into the mapping; nothing is copied."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self._mmap) < len(_MAGIC) + _FOOTER.size or self._mmap[: len(_MAGIC)] != _MAGIC:
+            raise IndexFileError(f"Not a candidate index file: {path}")
+        header_offset, header_len, magic = _FOOTER.unpack_from(self._mmap, len(self._mmap) - _FOOTER.size)
+        if magic != _MAGIC:
+            raise IndexFileError(f"Truncated candidate index file: {path}")
+        self.header = json.loads(self._mmap[header_offset : header_offset + header_len].decode("utf-8"))
+        if self.header.get("version") != FORMAT_VERSION:
+            raise IndexFileError(f"Unsupported index file version {self.header.get('version')}: {path}")
+
+        self.fingerprint: str = self.header["fingerprint"]
+        self._lock = threading.Lock()
+        self._bm25: Optional[MmapCandidateIndex] = None
+        self._prematch: Optional[MmapPrematchIndex] = None
+        self._candidates_json: Optional[str] = None
+        self._members = tuple(self.array(n) for n in ("member_keys", "member_indptr", "member_ids"))
+        self.candidates = StringTable(self)
+
+    def array(self, name: str) -> np.ndarray:
+        section = self.header["sections"][name]
+        dtype = np.dtype(section["dtype"])
+        count = int(np.prod(section["shape"], dtype=np.int64))
+        return np.frombuffer(self._mmap, dtype=dtype, count=count, offset=section["offset"]).reshape(
+            section["shape"]
+        )
+
+    def __len__(self) -> int:
+        return self.header["n_candidates"]
+
+    def position(self, candidate: str) -> Optional[int]:
+        for i in _group_lookup(*self._members, candidate):
+            if self.candidates[int(i)] == candidate:
+                return int(i)
+        return None
+
+    @property
+    def candidates_json(self) -> str:
+        if self._candidates_json is None:
+            self._candidates_json = self.array("cand_json").tobytes().decode("utf-8")
+        return self._candidates_json
+
+    @property
+    def bm25(self) -> MmapCandidateIndex:
+        if self._bm25 is None:
+            with self._lock:
+                if self._bm25 is None:
+                    self._bm25 = MmapCandidateIndex(self)
+        return self._bm25
+
+    @property
+    def prematch(self) -> MmapPrematchIndex:
+        if self._prematch is None:
+            with self._lock:
+                if self._prematch is None:
+                    self._prematch = MmapPrematchIndex(self)
+        return self._prematch
+
+    def scorer(self, engine: str):
+        """A mock-model scorer (see scoring.build_scorer) over the file's precomputed vectors."""
+        if engine == SequenceScorer.name:
+            return SequenceScorer.from_arrays(self.candidates, self.array("seq_counts"), self.array("seq_lengths"))
+        if engine == TrigramScorer.name:
+            return TrigramScorer.from_arrays(
+                self.candidates,
+                self.array("tri_terms"),
+                self.array("tri_indptr"),
+                self.array("tri_postings"),
+                self.array("tri_sizes"),
+            )
+        raise ValueError(f"Unknown scoring engine: {engine!r}")
+
+
+@lru_cache(maxsize=16)
+def open_index_file(path: str) -> CandidateIndexFile:
+    """One mapping per file per process."""
+    return CandidateIndexFile(path)
+
+
+def parse_index_files(spec: str) -> List[Tuple[str, str]]:
+    """Parses CANDIDATE_INDEX_FILES ("name=path,name2=path2") into (name, path) pairs."""
+    pairs = []
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        name, sep, path = item.partition("=")
+        if not sep or not name.strip() or not path.strip():
+            raise ValueError(f"Expected name=path in CANDIDATE_INDEX_FILES, got {item!r}")
+        pairs.append((name.strip(), path.strip()))
+    return pairs
+
+
+# ---------------------------------------------------------------------------------------------
+# Command line
+
+
+def _read_candidates(path: str, column: Optional[str]) -> List[str]:
+    p = Path(path)
+    if p.suffix.lower() == ".json":
+        data = json.loads(p.read_text(encoding="utf-8"))
+        if not isinstance(data, list):
+            raise ValueError(f"{path}: expected a JSON list of strings")
+        return [str(c) for c in data]
+    if p.suffix.lower() == ".csv":
+        with p.open(newline="", encoding="utf-8-sig") as f:
+            rows = csv.reader(f)
+            header = next(rows, [])
+            index = header.index(column) if column else 0
+            first = [] if column else [header[0]] if header else []
+            return first + [row[index] for row in rows if len(row) > index and row[index].strip()]
+    return [line.strip() for line in p.read_text(encoding="utf-8-sig").splitlines() if line.strip()]
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Build or inspect memory-mapped candidate index files.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="Compile a candidate list (.txt, one per line; .csv; .json list).")
+    build.add_argument("input")
+    build.add_argument("-o", "--output", required=True)
+    build.add_argument("--column", help="CSV column holding the names (default: first column, no header).")
+
+    info = sub.add_parser("info", help="Show an index file's header.")
+    info.add_argument("path")
+
+    args = parser.parse_args(argv)
+    if args.command == "build":
+        header = build_index_file(_read_candidates(args.input, args.column), args.output)
+        size = Path(args.output).stat().st_size
+        print(f"Wrote {args.output}: {header['n_candidates']} candidates, {size:,} bytes")
+    else:
+        header = CandidateIndexFile(args.path).header
+        print(json.dumps({k: v for k, v in header.items() if k != "sections"}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Server-side named candidate lists.
+
+A candidate list is registered once (PUT /candidate-sets/{name}) and then referenced by name in
+match requests. Everything derived from the list is computed once and kept with it: the
+deduplicated list, its prompt JSON, its cache fingerprint, the BM25 shortlisting index, the
+pre-match lookup tables and the model (in mock mode, the model's precomputed scorer).
+
+Sets can also be served from candidate index files built offline (CANDIDATE_INDEX_FILES, see
+candidate_index_file.py), which are memory-mapped instead of being built at startup.
+"""
+
+from __future__ import annotations
+
+import json
+import threading
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from app.config import get_settings
+from app.services.candidate_index import CandidateIndex
+from app.services.candidate_index_file import CandidateIndexFile, open_index_file, parse_index_files
+from app.services.match_cache import candidates_fingerprint
+from app.services.prematch import PrematchIndex, legal_suffixes
+
+
+class CandidateSetNotFoundError(KeyError):
+    pass
+
+
+class CandidateSet:
+    def __init__(self, name: str, candidates: Sequence[str]):
+        self.name = name
+        # Deduplicate, keeping first-seen order
+        self.candidates: List[str] = list(dict.fromkeys(str(c) for c in candidates))
+        self.fingerprint = candidates_fingerprint(self.candidates)
+        self.candidates_json = json.dumps(self.candidates, ensure_ascii=False)
+        self._members = frozenset(self.candidates)
+
+        self._lock = threading.Lock()
+        self._index: Optional[CandidateIndex] = None
+        self._prematch: Optional[PrematchIndex] = None
+        self._model = None
+
+    @classmethod
+    def from_index_file(cls, name: str, index_file: CandidateIndexFile) -> "CandidateSet":
+        """A set whose list, indexes and scorer vectors are read in place from a mapped index file."""
+        cset = cls.__new__(cls)
+        cset.name = name
+        cset.candidates = index_file.candidates
+        cset.fingerprint = index_file.fingerprint
+        cset.candidates_json = index_file.candidates_json
+        # The file's string table answers membership from its hash table
+        cset._members = index_file.candidates
+
+        cset._lock = threading.Lock()
+        cset._index = index_file.bm25
+        cset._prematch = index_file.prematch
+        cset._model = None
+        return cset
+
+    def __len__(self) -> int:
+        return len(self.candidates)
+
+    def __contains__(self, item: str) -> bool:
+        return item in self._members
+
+    def without(self, input_string: str) -> Tuple[List[str], str]:
+        """
+        The candidate list (and its JSON) with the input removed.
+
+        See langchain_matcher._remove_input_from_candidates. Usually the input isn't in the set,
+        so the precomputed list and JSON are returned as they are.
+        """
+        if input_string not in self._members:
+            return self.candidates, self.candidates_json
+        filtered = [c for c in self.candidates if c != input_string]
+        return filtered, json.dumps(filtered, ensure_ascii=False)
+
+    @property
+    def index(self) -> CandidateIndex:
+        if self._index is None:
+            with self._lock:
+                if self._index is None:
+                    self._index = CandidateIndex(self.candidates)
+        return self._index
+
+    @property
+    def prematch(self) -> PrematchIndex:
+        if self._prematch is None:
+            with self._lock:
+                if self._prematch is None:
+                    self._prematch = PrematchIndex(self.candidates, legal_suffixes())
+        return self._prematch
+
+    @property
+    def model(self):
+        """The chat model for this set, built on first use and reused by every request."""
+        if self._model is None:
+            # Imported here: model_factory pulls in the model backends
+            from app.services.model_factory import get_chat_model
+
+            with self._lock:
+                if self._model is None:
+                    self._model = get_chat_model(candidates=self.candidates)
+        return self._model
+
+    def warm(self) -> "CandidateSet":
+        """Build the indexes and model now rather than on the first request."""
+        _ = self.index
+        _ = self.prematch
+        _ = self.model
+        return self
+
+
+class CandidateSetRegistry:
+    def __init__(self):
+        self._sets: Dict[str, CandidateSet] = {}
+        self._lock = threading.Lock()
+
+    def put(self, name: str, candidates: Sequence[str]) -> CandidateSet:
+        # Built outside the lock; requests keep using the old set until the swap
+        candidate_set = CandidateSet(name, candidates).warm()
+        with self._lock:
+            self._sets[name] = candidate_set
+        return candidate_set
+
+    def put_index_file(self, name: str, path: str) -> CandidateSet:
+        candidate_set = CandidateSet.from_index_file(name, open_index_file(path))
+        with self._lock:
+            self._sets[name] = candidate_set
+        return candidate_set
+
+    def get(self, name: str) -> CandidateSet:
+        try:
+            return self._sets[name]
+        except KeyError:
+            raise CandidateSetNotFoundError(name) from None
+
+    def delete(self, name: str) -> None:
+        with self._lock:
+            if self._sets.pop(name, None) is None:
+                raise CandidateSetNotFoundError(name)
+
+    def names(self) -> List[str]:
+        return sorted(self._sets)
+
+
+@lru_cache(maxsize=1)
+def get_candidate_set_registry() -> CandidateSetRegistry:
+    registry = CandidateSetRegistry()
+    for name, path in parse_index_files(get_settings().candidate_index_files):
+        registry.put_index_file(name, path)
+    return registry
@@ -0,0 +1,122 @@
+"""
+Tournament matching for candidate lists too long for one prompt.
+
+When the serialized candidate list is estimated at more than Settings.chunk_max_tokens tokens,
+it is split into chunks of roughly equal token size. Every chunk is sent to the model at the
+same time, with the normal prompt; each chunk's answer (if it is one of that chunk's
+candidates) goes through to a final round over the winners only. A single winner is the
+answer without a final call, and no winners means "None".
+
+Whatever the list size, a match therefore takes about two model round trips: one for the
+concurrent chunk round and one for the final. (Only lists whose winners alone overflow the
+budget, i.e. more than chunk_max_tokens / ~10 chunks, need a further round. If splitting the
+winners would not give fewer chunks than the round before, as with candidates each longer than
+the budget, the final call is made over all of them in one over-budget prompt instead.)
+"""
+
+from __future__ import annotations
+
+import json
+import math
+from dataclasses import dataclass
+from typing import Awaitable, Callable, List, Optional, Sequence
+
+from langchain_core.messages import HumanMessage, SystemMessage
+
+
+def estimate_candidate_tokens(candidate: str) -> float:
+    """Rough tokens a candidate adds to the serialized list: ~4 characters per token."""
+    # The quoted JSON string plus its ", " separator
+    return (len(json.dumps(candidate, ensure_ascii=False)) + 2) / 4
+
+
+def plan_chunks(candidates: Sequence[str], max_tokens: int) -> Optional[List[List[str]]]:
+    """
+    Split `candidates` into chunks of at most about `max_tokens` estimated tokens each.
+
+    Returns None if the whole list fits (or max_tokens is 0), i.e. no chunking is needed.
+    Chunks are balanced (the same target size each, give or take a candidate) rather than
+    filled greedily, so there is no small last chunk.
+    """
+    if max_tokens <= 0:
+        return None
+    sizes = [estimate_candidate_tokens(c) for c in candidates]
+    total = sum(sizes)
+    if total <= max_tokens:
+        return None
+
+    n_chunks = math.ceil(total / max_tokens)
+    target = total / n_chunks
+    chunks: List[List[str]] = [[] for _ in range(n_chunks)]
+    filled = 0.0
+    for candidate, size in zip(candidates, sizes):
+        # Each candidate goes to the chunk its midpoint falls in
+        chunks[min(n_chunks - 1, int((filled + size / 2) / target))].append(candidate)
+        filled += size
+    return [chunk for chunk in chunks if chunk]
+
+
+@dataclass
+class TournamentResult:
+    """The final answer, in place of a model response."""
+
+    content: str
+    rounds: int
+    calls: int
+
+
+@dataclass
+class ChunkedMatch:
+    input_string: str
+    chunks: List[List[str]]
+    # Renders the system prompt for one list of candidates
+    render: Callable[[List[str]], str]
+    max_tokens: int
+
+    def messages(self, candidates: List[str]) -> list:
+        return [SystemMessage(content=self.render(candidates)), HumanMessage(content=self.input_string)]
+
+    def winners(self, chunks: List[List[str]], responses: list) -> List[str]:
+        """Each chunk's answer, if it is one of that chunk's candidates, in chunk order."""
+        # Imported here: langchain_matcher imports this module
+        from app.services.langchain_matcher import _normalize_output
+
+        found: List[str] = []
+        for chunk, response in zip(chunks, responses):
+            answer = _normalize_output(getattr(response, "content", ""))
+            if answer is not None and answer in chunk and answer not in found:
+                found.append(answer)
+        return found
+
+    def _next(self, chunks: List[List[str]], winners: List[str]) -> List[List[str]]:
+        """The next round's chunks. Each round must have fewer than the last, so the tournament ends."""
+        next_chunks = plan_chunks(winners, self.max_tokens) or [winners]
+        if len(next_chunks) >= len(chunks):
+            return [winners]
+        return next_chunks
+
+    def run(self, invoke_all: Callable[[List[list]], list]) -> TournamentResult:
+        """Play the tournament; invoke_all makes the given model calls concurrently."""
+        chunks, rounds, calls = self.chunks, 0, 0
+        while True:
+            responses = invoke_all([self.messages(c) for c in chunks])
+            rounds, calls = rounds + 1, calls + len(chunks)
+            if len(chunks) == 1:
+                return TournamentResult(getattr(responses[0], "content", ""), rounds, calls)
+            winners = self.winners(chunks, responses)
+            if len(winners) <= 1:
+                return TournamentResult(winners[0] if winners else "None", rounds, calls)
+            chunks = self._next(chunks, winners)
+
+    async def arun(self, ainvoke_all: Callable[[List[list]], Awaitable[list]]) -> TournamentResult:
+        """Async variant of run()."""
+        chunks, rounds, calls = self.chunks, 0, 0
+        while True:
+            responses = await ainvoke_all([self.messages(c) for c in chunks])
+            rounds, calls = rounds + 1, calls + len(chunks)
+            if len(chunks) == 1:
+                return TournamentResult(getattr(responses[0], "content", ""), rounds, calls)
+            winners = self.winners(chunks, responses)
+            if len(winners) <= 1:
+                return TournamentResult(winners[0] if winners else "None", rounds, calls)
+            chunks = self._next(chunks, winners)
@@ -0,0 +1,238 @@
+"""
+A pool of chat model clients for several Azure OpenAI deployments.
+
+DeploymentPool looks like a single chat model (invoke / ainvoke) and sends each call to one of
+its deployments:
+
+- Selection: the deployment with the fewest outstanding calls; ties go to the one picked
+  least recently, so idle deployments share the load round-robin.
+- Circuit breaking: after `failure_threshold` consecutive failures a deployment is taken out
+  of rotation for `cooldown_seconds`. After that one trial call at a time is let through
+  (half-open); a success closes the circuit again, a failure re-opens it.
+- Failover: a call that fails on one deployment (429, 5xx, timeouts and connection errors) is
+  retried on another, up to `failover_retries` times. Anything else (errors about the request
+  itself such as 400 and 422, auth errors, bugs in our own code) is raised straight away.
+
+Per-deployment counters and latency quantiles are available from stats() (GET /stats), and
+call outcomes are counted in the metrics (GET /metrics).
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from app.services.metrics import LatencyHistogram, get_metrics
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+# Transport errors by class name (openai / httpx), so this module needn't import either SDK
+_TRANSPORT_ERROR_NAMES = {"APIConnectionError", "APITimeoutError", "TransportError", "TimeoutException"}
+
+
+def is_failover_error(exc: BaseException) -> bool:
+    """Whether the deployment, rather than the request, is at fault: another deployment may succeed."""
+    status_code = getattr(exc, "status_code", None)
+    if isinstance(status_code, int):
+        return status_code in (408, 429) or status_code >= 500
+    if isinstance(exc, (TimeoutError, ConnectionError)):
+        return True
+    return any(cls.__name__ in _TRANSPORT_ERROR_NAMES for cls in type(exc).__mro__)
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker. Not thread-safe: the pool holds its lock around it."""
+
+    def __init__(
+        self, failure_threshold: int = 5, cooldown_seconds: float = 30.0, clock: Callable[[], float] = time.monotonic
+    ):
+        self.failure_threshold = max(1, failure_threshold)
+        self.cooldown_seconds = cooldown_seconds
+        self.clock = clock
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.times_opened = 0
+        self._trial_in_flight = False
+
+    def available(self) -> bool:
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and self.clock() - self.opened_at >= self.cooldown_seconds:
+            self.state = HALF_OPEN
+        return self.state == HALF_OPEN and not self._trial_in_flight
+
+    def on_pick(self) -> None:
+        if self.state != CLOSED:
+            self._trial_in_flight = True
+
+    def record_success(self) -> None:
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        self.consecutive_failures += 1
+        self._trial_in_flight = False
+        if self.state != CLOSED or self.consecutive_failures >= self.failure_threshold:
+            if self.state != OPEN:
+                self.times_opened += 1
+            self.state = OPEN
+            self.opened_at = self.clock()
+
+    def release(self) -> None:
+        """The trial call ended without a verdict (e.g. a request error or cancellation)."""
+        self._trial_in_flight = False
+
+
+class PoolMember:
+    def __init__(self, name: str, model, breaker: CircuitBreaker):
+        self.name = name
+        self.model = model
+        self.breaker = breaker
+        self.outstanding = 0
+        self.last_picked = 0
+        self.calls = 0
+        self.errors = 0
+        self.failovers = 0
+        self.latency = LatencyHistogram(window=512)
+
+
+class DeploymentPool:
+    """Least-outstanding-requests load balancing with circuit breaking and failover."""
+
+    def __init__(
+        self,
+        members: Sequence[tuple],
+        failover_retries: int = 2,
+        failure_threshold: int = 5,
+        cooldown_seconds: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """members: (name, chat model) pairs, one per deployment."""
+        if not members:
+            raise ValueError("A deployment pool needs at least one deployment")
+        self.members = [
+            PoolMember(name, model, CircuitBreaker(failure_threshold, cooldown_seconds, clock))
+            for name, model in members
+        ]
+        self.failover_retries = max(0, failover_retries)
+        self._lock = threading.Lock()
+        self._picks = 0
+
+    @property
+    def cache_id(self) -> str:
+        """The deployments are assumed to serve the same model, so answers are interchangeable."""
+        ids = sorted(_member_id(m) for m in self.members)
+        return "azure-pool:" + ",".join(ids)
+
+    def _pick(self, tried: List[PoolMember]) -> PoolMember:
+        with self._lock:
+            # Never empty: _failover stops once every deployment has been tried
+            untried = [m for m in self.members if m not in tried]
+            ready = [m for m in untried if m.breaker.available()]
+            if ready:
+                member = min(ready, key=lambda m: (m.outstanding, m.last_picked))
+            else:
+                # Every remaining circuit is open: try the one closest to the end of its cooldown
+                # rather than failing without a call
+                member = min(untried, key=lambda m: m.breaker.opened_at or 0.0)
+            member.breaker.on_pick()
+            self._picks += 1
+            member.last_picked = self._picks
+            member.outstanding += 1
+            return member
+
+    def _done(self, member: PoolMember, started: float, error: Optional[BaseException]) -> bool:
+        """Record a finished call. Returns True if the error should be retried elsewhere."""
+        failover = error is not None and isinstance(error, Exception) and is_failover_error(error)
+        with self._lock:
+            member.outstanding -= 1
+            member.calls += 1
+            if error is None:
+                member.latency.observe(time.perf_counter() - started)
+                member.breaker.record_success()
+            elif failover:
+                member.errors += 1
+                member.breaker.record_failure()
+            else:
+                # Not the deployment's fault: no verdict on its health
+                member.breaker.release()
+        if error is None:
+            outcome = "ok"
+        elif not isinstance(error, Exception):
+            outcome = "cancelled"
+        else:
+            outcome = "error" if failover else "request_error"
+        get_metrics().inc("name_matcher_deployment_calls_total", deployment=member.name, outcome=outcome)
+        return failover
+
+    def _failover(self, member: PoolMember, tried: List[PoolMember]) -> bool:
+        """Whether to retry on another deployment (one not tried yet for this call)."""
+        if len(tried) > self.failover_retries or len(tried) >= len(self.members):
+            return False
+        with self._lock:
+            member.failovers += 1
+        get_metrics().inc("name_matcher_deployment_failovers_total", deployment=member.name)
+        return True
+
+    def invoke(self, messages, **kwargs):
+        tried: List[PoolMember] = []
+        while True:
+            member = self._pick(tried)
+            tried.append(member)
+            started = time.perf_counter()
+            try:
+                response = member.model.invoke(messages, **kwargs)
+            except BaseException as e:
+                if not self._done(member, started, e) or not self._failover(member, tried):
+                    raise
+                continue
+            self._done(member, started, None)
+            return response
+
+    async def ainvoke(self, messages, **kwargs):
+        tried: List[PoolMember] = []
+        while True:
+            member = self._pick(tried)
+            tried.append(member)
+            started = time.perf_counter()
+            try:
+                response = await member.model.ainvoke(messages, **kwargs)
+            except BaseException as e:
+                if not self._done(member, started, e) or not self._failover(member, tried):
+                    raise
+                continue
+            self._done(member, started, None)
+            return response
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            deployments = {}
+            for m in self.members:
+                quantiles = m.latency.quantiles((0.5, 0.95))
+                deployments[m.name] = {
+                    "state": m.breaker.state,
+                    "outstanding": m.outstanding,
+                    "calls": m.calls,
+                    "errors": m.errors,
+                    "failovers": m.failovers,
+                    "consecutive_failures": m.breaker.consecutive_failures,
+                    "times_opened": m.breaker.times_opened,
+                    "latency_p50_seconds": _round(quantiles[0.5]),
+                    "latency_p95_seconds": _round(quantiles[0.95]),
+                }
+        for m in self.members:
+            if hasattr(m.model, "stats"):
+                deployments[m.name]["rate_limit"] = m.model.stats()
+        return {"deployments": deployments}
+
+
+def _member_id(member: PoolMember) -> str:
+    model = member.model
+    return f"{getattr(model, 'azure_endpoint', '')}:{getattr(model, 'deployment_name', member.name)}"
+
+
+def _round(value: float) -> Optional[float]:
+    return None if value != value else round(value, 4)
@@ -0,0 +1,459 @@
+"""
+Evaluation of prompt versions against a labelled dataset.
+
+A labelled CSV has an `input_string` column and an `expected` column (the correct candidate,
+or empty / "None" when the input should not match), and optionally a `candidates` column with a
+JSON list per row. Rows without candidates use the dataset-wide list (--candidates, or else
+every distinct expected value).
+
+Every (prompt version, row) pair is matched concurrently through amatch_string_with_langchain,
+so the evaluation exercises the same pipeline as the API (pre-match, shortlisting, chunking...).
+The model is wrapped in a ReplayModel that records every raw response, with its token usage and
+latency, in a SQLite ReplayStore (EVAL_REPLAY_DB_PATH). Later runs answer identical requests
+from the store, so re-scoring, or changing _normalize_output, costs no model calls:
+
+    python -m app.services.evaluation labelled.csv --prompts buyer_match_v1,buyer_match_v4
+    python -m app.services.evaluation labelled.csv --replay-only   # fail instead of calling the model
+
+For each version the report has accuracy, None-precision / None-recall, model latency
+quantiles (as recorded when the response was first obtained), and token usage and cost.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextvars
+import csv
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+from app.config import get_settings
+from app.services.langchain_matcher import MatchTrace, _normalize_output, amatch_string_with_langchain
+from app.services.match_cache import model_cache_id
+from app.services.prompt_registry import get_prompt_registry
+
+
+class ReplayMissError(KeyError):
+    """Raised in replay-only mode for a request that has no recorded response."""
+
+
+@dataclass
+class LabelledExample:
+    input_string: str
+    # The correct candidate, or None if the input shouldn't match anything
+    expected: Optional[str]
+    candidates: List[str]
+
+
+@dataclass
+class RecordedCall:
+    content: str
+    input_tokens: int
+    output_tokens: int
+    # True when the model reported no usage and the token counts are estimated (4 chars a token)
+    tokens_estimated: bool
+    latency_seconds: float
+    replayed: bool = False
+
+
+@dataclass
+class ReplayedResponse:
+    """What a ReplayModel returns: the recorded content, like a chat model response."""
+
+    content: str
+    usage_metadata: Dict[str, int] = field(default_factory=dict)
+
+
+# ---------------------------------------------------------------------------------------------
+# Datasets
+
+
+def load_labelled_csv(path: str, candidates: Optional[Sequence[str]] = None) -> List[LabelledExample]:
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        rows = list(csv.DictReader(f))
+    if rows and ("input_string" not in rows[0] or "expected" not in rows[0]):
+        raise ValueError(f"{path}: expected input_string and expected columns")
+
+    expected = [_normalize_output(row["expected"] or "") for row in rows]
+    if candidates is None:
+        # Closed world: every labelled answer is a candidate for every row
+        candidates = list(dict.fromkeys(e for e in expected if e is not None))
+    shared = list(candidates)
+
+    examples = []
+    for row, answer in zip(rows, expected):
+        row_candidates = shared
+        if (row.get("candidates") or "").strip():
+            row_candidates = json.loads(row["candidates"])
+            if not isinstance(row_candidates, list):
+                raise ValueError(f"{path}: candidates must be a JSON list, got {row['candidates']!r}")
+        examples.append(LabelledExample(row["input_string"].strip(), answer, [str(c) for c in row_candidates]))
+    return examples
+
+
+# ---------------------------------------------------------------------------------------------
+# Replay store
+
+
+def request_key(model_id: str, messages) -> str:
+    """Identifies a model request: the model and the exact messages sent to it."""
+    payload = [model_id, [[getattr(m, "type", ""), str(getattr(m, "content", ""))] for m in messages]]
+    return hashlib.sha256(json.dumps(payload, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class ReplayStore:
+    """SQLite store of raw model responses by request_key. Safe to share between threads."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = sqlite3.connect(path, timeout=30.0, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    model_id TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    input_tokens INTEGER NOT NULL,
+                    output_tokens INTEGER NOT NULL,
+                    tokens_estimated INTEGER NOT NULL,
+                    latency_seconds REAL NOT NULL,
+                    created_at REAL NOT NULL
+                )
+                """
+            )
+
+    def get(self, key: str) -> Optional[RecordedCall]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content, input_tokens, output_tokens, tokens_estimated, latency_seconds"
+                " FROM responses WHERE key = ?",
+                (key,),
+            ).fetchone()
+        if row is None:
+            return None
+        return RecordedCall(row[0], row[1], row[2], bool(row[3]), row[4], replayed=True)
+
+    def put(self, key: str, model_id: str, call: RecordedCall) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    key,
+                    model_id,
+                    call.content,
+                    call.input_tokens,
+                    call.output_tokens,
+                    int(call.tokens_estimated),
+                    call.latency_seconds,
+                    time.time(),
+                ),
+            )
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+# The calls made for the match being evaluated in the current task (see _evaluate_one)
+_current_calls: contextvars.ContextVar[Optional[List[RecordedCall]]] = contextvars.ContextVar(
+    "evaluation_calls", default=None
+)
+
+
+def _usage(response, messages) -> tuple:
+    """(input tokens, output tokens, estimated) for a response."""
+    usage = getattr(response, "usage_metadata", None) or {}
+    if usage.get("input_tokens") is not None:
+        return int(usage["input_tokens"]), int(usage.get("output_tokens") or 0), False
+    prompt_chars = sum(len(str(getattr(m, "content", ""))) for m in messages)
+    return prompt_chars // 4 + 1, len(str(getattr(response, "content", ""))) // 4 + 1, True
+
+
+class ReplayModel:
+    """
+    Wraps a chat model: answers from the replay store when it can, else calls the model and
+    records the response. With replay_only, a request without a recording raises ReplayMissError.
+    """
+
+    def __init__(self, model, store: ReplayStore, replay_only: bool = False):
+        self.model = model
+        self.store = store
+        self.replay_only = replay_only
+        self.model_id = model_cache_id(model) or type(model).__name__
+
+    @property
+    def cache_id(self) -> Optional[str]:
+        return model_cache_id(self.model)
+
+    def _replayed(self, key: str) -> Optional[ReplayedResponse]:
+        recorded = self.store.get(key)
+        if recorded is None:
+            if self.replay_only:
+                raise ReplayMissError(key)
+            return None
+        return self._response(recorded)
+
+    def _record(self, key: str, messages, response, started: float) -> ReplayedResponse:
+        input_tokens, output_tokens, estimated = _usage(response, messages)
+        call = RecordedCall(
+            str(getattr(response, "content", "")),
+            input_tokens,
+            output_tokens,
+            estimated,
+            time.perf_counter() - started,
+        )
+        self.store.put(key, self.model_id, call)
+        return self._response(call)
+
+    def _response(self, call: RecordedCall) -> ReplayedResponse:
+        calls = _current_calls.get()
+        if calls is not None:
+            calls.append(call)
+        return ReplayedResponse(
+            call.content,
+            {
+                "input_tokens": call.input_tokens,
+                "output_tokens": call.output_tokens,
+                "total_tokens": call.input_tokens + call.output_tokens,
+            },
+        )
+
+    def invoke(self, messages):
+        key = request_key(self.model_id, messages)
+        replayed = self._replayed(key)
+        if replayed is not None:
+            return replayed
+        started = time.perf_counter()
+        return self._record(key, messages, self.model.invoke(messages), started)
+
+    async def ainvoke(self, messages):
+        key = request_key(self.model_id, messages)
+        replayed = await asyncio.to_thread(self._replayed, key)
+        if replayed is not None:
+            return replayed
+        started = time.perf_counter()
+        if hasattr(self.model, "ainvoke"):
+            response = await self.model.ainvoke(messages)
+        else:
+            response = await asyncio.to_thread(self.model.invoke, messages)
+        return await asyncio.to_thread(self._record, key, messages, response, started)
+
+
+# ---------------------------------------------------------------------------------------------
+# Running and scoring
+
+
+@dataclass
+class EvaluationRow:
+    prompt: str
+    example: LabelledExample
+    raw: Optional[str]
+    error: Optional[str]
+    tier: Optional[str]
+    calls: List[RecordedCall]
+
+    @property
+    def predicted(self) -> Optional[str]:
+        return _normalize_output(self.raw or "")
+
+
+async def _evaluate_one(prompt: str, example: LabelledExample, model, semaphore: asyncio.Semaphore) -> EvaluationRow:
+    async with semaphore:
+        calls: List[RecordedCall] = []
+        # Each gathered task runs in its own context, so the calls of concurrent rows don't mix
+        _current_calls.set(calls)
+        trace = MatchTrace()
+        raw, error = None, None
+        try:
+            raw = await amatch_string_with_langchain(
+                example.input_string, example.candidates, model, prompt_path=prompt, trace=trace
+            )
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        return EvaluationRow(prompt, example, raw, error, trace.tier, calls)
+
+
+async def aevaluate(
+    examples: Sequence[LabelledExample],
+    prompts: Sequence[str],
+    store: ReplayStore,
+    concurrency: int = 16,
+    replay_only: bool = False,
+    model_factory: Optional[Callable[[List[str]], object]] = None,
+) -> List[EvaluationRow]:
+    """Matches every example with every prompt version, at most `concurrency` at a time."""
+    if model_factory is None:
+        from app.services.model_factory import get_chat_model
+
+        model_factory = get_chat_model
+    registry = get_prompt_registry()
+    for prompt in prompts:
+        # Unknown versions fail before any model call
+        registry.get(prompt)
+
+    models: Dict[tuple, ReplayModel] = {}
+    for example in examples:
+        key = tuple(example.candidates)
+        if key not in models:
+            models[key] = ReplayModel(model_factory(example.candidates), store, replay_only)
+
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    return await asyncio.gather(
+        *(
+            _evaluate_one(prompt, example, models[tuple(example.candidates)], semaphore)
+            for prompt in prompts
+            for example in examples
+        )
+    )
+
+
+def _quantile(sorted_values: Sequence[float], q: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    return round(sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))], 4)
+
+
+def _ratio(numerator: int, denominator: int) -> Optional[float]:
+    return round(numerator / denominator, 4) if denominator else None
+
+
+def summarize(
+    rows: Sequence[EvaluationRow], input_cost_per_1k: float = 0.0, output_cost_per_1k: float = 0.0
+) -> Dict[str, Dict[str, object]]:
+    """Per prompt version: accuracy, None-precision/recall, latency and token cost."""
+    by_prompt: Dict[str, List[EvaluationRow]] = {}
+    for row in rows:
+        by_prompt.setdefault(row.prompt, []).append(row)
+
+    report = {}
+    for prompt, prompt_rows in by_prompt.items():
+        scored = [r for r in prompt_rows if r.error is None]
+        correct = sum(r.predicted == r.example.expected for r in scored)
+        predicted_none = [r for r in scored if r.predicted is None]
+        expected_none = [r for r in scored if r.example.expected is None]
+        calls = [c for r in prompt_rows for c in r.calls]
+        # Model latency of each row that needed the model: the sum of its calls
+        latencies = sorted(sum(c.latency_seconds for c in r.calls) for r in prompt_rows if r.calls)
+        input_tokens = sum(c.input_tokens for c in calls)
+        output_tokens = sum(c.output_tokens for c in calls)
+        tiers: Dict[str, int] = {}
+        for r in scored:
+            tiers[r.tier or "unknown"] = tiers.get(r.tier or "unknown", 0) + 1
+
+        report[prompt] = {
+            "examples": len(prompt_rows),
+            "errors": len(prompt_rows) - len(scored),
+            "accuracy": _ratio(correct, len(scored)),
+            "none_precision": _ratio(sum(r.example.expected is None for r in predicted_none), len(predicted_none)),
+            "none_recall": _ratio(sum(r.predicted is None for r in expected_none), len(expected_none)),
+            "tiers": tiers,
+            "model_calls": len(calls),
+            "replayed_calls": sum(c.replayed for c in calls),
+            "latency_seconds": {
+                "mean": round(sum(latencies) / len(latencies), 4) if latencies else None,
+                "p50": _quantile(latencies, 0.5),
+                "p95": _quantile(latencies, 0.95),
+            },
+            "tokens": {
+                "input": input_tokens,
+                "output": output_tokens,
+                "per_example": round((input_tokens + output_tokens) / len(prompt_rows), 1) if prompt_rows else 0,
+                "estimated": any(c.tokens_estimated for c in calls),
+            },
+            "cost": round(input_tokens / 1000 * input_cost_per_1k + output_tokens / 1000 * output_cost_per_1k, 6),
+        }
+    return report
+
+
+def default_prompts() -> List[str]:
+    """Every known single-match prompt version; the packed prompt (several inputs per call) is left out."""
+    packed = Path(get_settings().packed_prompt_path.strip()).stem
+    return [p for p in get_prompt_registry().known_prompts() if p != packed]
+
+
+def _row_line(row: EvaluationRow) -> str:
+    line = {
+        "prompt": row.prompt,
+        "input_string": row.example.input_string,
+        "expected": row.example.expected,
+        "predicted": row.predicted,
+        "correct": row.error is None and row.predicted == row.example.expected,
+        "raw": row.raw,
+        "tier": row.tier,
+    }
+    if row.error is not None:
+        line["error"] = row.error
+    return json.dumps(line, ensure_ascii=False)
+
+
+# ---------------------------------------------------------------------------------------------
+# Command line
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Evaluate prompt versions against a labelled CSV.")
+    parser.add_argument("dataset", help="CSV with input_string, expected and optionally candidates columns.")
+    parser.add_argument("--prompts", default="", help="Comma-separated prompt versions (default: every single-match version).")
+    parser.add_argument("--candidates", help="Candidate list for rows without one (one name per line).")
+    parser.add_argument("--concurrency", type=int, default=16, help="Matches in flight at once.")
+    parser.add_argument("--replay-db", default=None, help="Replay store (default: EVAL_REPLAY_DB_PATH).")
+    parser.add_argument("--replay-only", action="store_true", help="Never call the model; fail on a miss.")
+    parser.add_argument("--input-cost-per-1k", type=float, default=0.0, help="Price of 1000 input tokens.")
+    parser.add_argument("--output-cost-per-1k", type=float, default=0.0, help="Price of 1000 output tokens.")
+    parser.add_argument("--details", help="Write one NDJSON line per (prompt, row) to this file.")
+    parser.add_argument("--out", default="-", help="Output JSON file, or - for stdout.")
+    args = parser.parse_args(argv)
+
+    # Every row should reach the replay store, not be answered by the result cache, so that
+    # each version's calls and tokens are accounted for. Must happen before get_settings().
+    os.environ.setdefault("MATCH_CACHE_ENABLED", "false")
+    os.environ.setdefault("SINGLEFLIGHT_ENABLED", "false")
+
+    candidates = None
+    if args.candidates:
+        lines = Path(args.candidates).read_text(encoding="utf-8-sig").splitlines()
+        candidates = [line.strip() for line in lines if line.strip()]
+    examples = load_labelled_csv(args.dataset, candidates)
+    prompts = [p.strip() for p in args.prompts.split(",") if p.strip()] or default_prompts()
+    store = ReplayStore(args.replay_db or get_settings().eval_replay_db_path)
+
+    started = time.perf_counter()
+    rows = asyncio.run(aevaluate(examples, prompts, store, args.concurrency, args.replay_only))
+    report = {
+        "meta": {
+            "dataset": args.dataset,
+            "examples": len(examples),
+            "seconds": round(time.perf_counter() - started, 3),
+            "replay_db": store.path,
+        },
+        "prompts": summarize(rows, args.input_cost_per_1k, args.output_cost_per_1k),
+    }
+    store.close()
+
+    if args.details:
+        with open(args.details, "w", encoding="utf-8") as f:
+            f.writelines(_row_line(row) + "\n" for row in rows)
+    text = json.dumps(report, indent=2)
+    if args.out == "-":
+        print(text)
+    else:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
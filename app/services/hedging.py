@@ -0,0 +1,158 @@
+"""
+Hedged model calls: a second, identical call when the first is slower than usual.
+
+Tail latency of a hosted model is much worse than its median. With HEDGE_ENABLED, a model call
+that hasn't answered within the hedge delay is sent again and whichever call answers first is
+used; the other is cancelled. Through a DeploymentPool the second call usually lands on another
+deployment, since the first one still counts as outstanding on its deployment.
+
+Only async calls (every API endpoint) are hedged. A sync caller makes its call on its own
+thread, which can't abandon a call in progress, so a hedge could only add a second paid call
+whose answer comes too late to use. Sync calls are timed, and counted as unhedged.
+
+The hedge delay is HEDGE_DELAY_SECONDS if set, else the HEDGE_QUANTILE (default p95) of the
+model's recent call latencies. Only first calls are timed; a first call that is cancelled (the
+hedge won, or the caller gave up) is recorded with the time it had taken so far, a lower bound
+on its latency, so slow calls still pull the quantile up. Hedging only starts once
+HEDGE_MIN_SAMPLES latencies have been observed for the model, so a cold model never doubles its
+traffic. At most about 1 - HEDGE_QUANTILE of calls are hedged.
+
+A failed call doesn't fail the hedged call while the other attempt may still answer.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from app.config import get_settings
+from app.services.match_cache import model_cache_id
+from app.services.metrics import LatencyHistogram, get_metrics
+
+
+class Hedger:
+    def __init__(self, quantile: float = 0.95, delay_seconds: float = 0.0, min_samples: int = 20):
+        self.quantile = quantile
+        self.delay_seconds = delay_seconds
+        self.min_samples = max(1, min_samples)
+        self._lock = threading.Lock()
+        self._latencies: Dict[str, LatencyHistogram] = {}
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+
+    @staticmethod
+    def _key(model) -> str:
+        return model_cache_id(model) or type(model).__name__
+
+    def delay(self, model) -> Optional[float]:
+        """Seconds to wait before hedging a call to `model`, or None to not hedge (yet)."""
+        if self.delay_seconds > 0:
+            return self.delay_seconds
+        with self._lock:
+            histogram = self._latencies.get(self._key(model))
+            if histogram is None or histogram.count < self.min_samples:
+                return None
+            return histogram.quantiles((self.quantile,))[self.quantile]
+
+    def observe(self, model, seconds: float) -> None:
+        with self._lock:
+            histogram = self._latencies.get(self._key(model))
+            if histogram is None:
+                histogram = self._latencies[self._key(model)] = LatencyHistogram(window=512)
+            histogram.observe(seconds)
+
+    def _timed(self, model, fn: Callable[[], Any]) -> Any:
+        started = time.perf_counter()
+        result = fn()
+        self.observe(model, time.perf_counter() - started)
+        return result
+
+    async def _atimed(self, model, fn: Callable[[], Awaitable[Any]]) -> Any:
+        started = time.perf_counter()
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            # Censored: the call took at least this long. Dropping it would bias the quantile low
+            self.observe(model, time.perf_counter() - started)
+            raise
+        self.observe(model, time.perf_counter() - started)
+        return result
+
+    def _count(self, hedged: bool, hedge_won: bool = False) -> None:
+        with self._lock:
+            self.calls += 1
+            self.hedged += hedged
+            self.hedge_wins += hedge_won
+        if hedged:
+            get_metrics().inc("name_matcher_hedged_calls_total", winner="hedge" if hedge_won else "first")
+
+    def invoke(self, model, messages) -> Any:
+        """model.invoke(messages), timed but not hedged (see module docstring)."""
+        self._count(False)
+        return self._timed(model, lambda: model.invoke(messages))
+
+    async def ainvoke(self, model, call: Callable[[], Awaitable[Any]]) -> Any:
+        """await call() (one call to `model`), hedged."""
+        delay = self.delay(model)
+        if delay is None:
+            self._count(False)
+            return await self._atimed(model, call)
+
+        first = asyncio.ensure_future(self._atimed(model, call))
+        pending = {first}
+        try:
+            done, _ = await asyncio.wait(pending, timeout=delay)
+            if done:
+                self._count(False)
+                return first.result()
+
+            # Not timed: it started late, so its latency isn't a first call's
+            second = asyncio.ensure_future(call())
+            pending, error = {first, second}, None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        self._count(True, hedge_won=task is second)
+                        return task.result()
+                    error = task.exception()
+            self._count(True)
+            raise error
+        finally:
+            # The slower call, or both if the caller gave up (e.g. its deadline passed)
+            for task in pending:
+                task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            delays = {}
+            for key, histogram in self._latencies.items():
+                if self.delay_seconds > 0:
+                    delays[key] = self.delay_seconds
+                elif histogram.count >= self.min_samples:
+                    delays[key] = round(histogram.quantiles((self.quantile,))[self.quantile], 4)
+                else:
+                    delays[key] = None
+            return {
+                "calls": self.calls,
+                "hedged": self.hedged,
+                "hedge_wins": self.hedge_wins,
+                "delay_seconds": delays,
+            }
+
+
+@lru_cache(maxsize=1)
+def get_hedger() -> Optional[Hedger]:
+    """Process-wide hedger built from Settings, or None if hedging is disabled."""
+    settings = get_settings()
+    if not settings.hedge_enabled:
+        return None
+    return Hedger(
+        quantile=settings.hedge_quantile,
+        delay_seconds=settings.hedge_delay_seconds,
+        min_samples=settings.hedge_min_samples,
+    )
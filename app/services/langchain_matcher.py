@@ -1,20 +1,97 @@
+import asyncio
+import contextvars
 import json
 import logging
-from pathlib import Path
-from typing import List, Optional
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple, Union
 
 from langchain_core.messages import HumanMessage, SystemMessage
 
 from app.config import get_settings
+from app.services.candidate_index import get_candidate_index
+from app.services.candidate_sets import CandidateSet
+from app.services.chunked_matcher import ChunkedMatch, plan_chunks
+from app.services.hedging import get_hedger
+from app.services.match_cache import candidates_fingerprint, get_match_cache, make_cache_key, model_cache_id
+from app.services.metrics import get_metrics
+from app.services.prematch import get_prematch_index, legal_suffixes
+from app.services.prompt_registry import compile_prompt, get_prompt_registry
+from app.services.singleflight import get_singleflight
 
 logger = logging.getLogger(__name__)
 
 
+@dataclass
+class MatchTrace:
+    """
+    Optional out-parameter for match_string_with_langchain.
+
+    Callers that want to report how a match was made (e.g. the API) pass one in and read it
+    back afterwards; the return value of match_string_with_langchain stays a plain string.
+    """
+
+    # (candidate, score) pairs sent to the model, best first. None if no shortlisting happened.
+    shortlist: Optional[List[Tuple[str, float]]] = None
+    # "hit" / "miss" if the result cache was consulted, None if the call wasn't cacheable
+    cache: Optional[str] = None
+    # Which tier produced the answer: "normalized" / "acronym" (pre-match), "cache", "model", or
+    # "fallback" (the local fuzzy match, when the model missed Settings.match_deadline_seconds)
+    tier: Optional[str] = None
+    # Seconds spent in each stage (prompt, prematch, cache, shortlist, format, model, normalize, total)
+    timings: Dict[str, float] = field(default_factory=dict)
+    # Number of chunks in the first round if the list was matched as a tournament (see chunked_matcher)
+    chunks: Optional[int] = None
+    # True if the answer is the local fuzzy fallback rather than the model's
+    degraded: bool = False
+    # Prompt tokens of this match's model call(s) and how many of them the provider served from its
+    # prompt cache, if the model reported usage. None for matches that made no call of their own.
+    # A packed match reports its pack's call, which it shared with the other inputs in the pack.
+    prompt_tokens: Optional[int] = None
+    cached_prompt_tokens: Optional[int] = None
+
+
+class _StageClock:
+    """Times consecutive stages of one match into the metrics and, if given, its MatchTrace."""
+
+    def __init__(self, trace: Optional[MatchTrace]):
+        self.trace = trace
+        self.started = self._last = time.perf_counter()
+
+    def _record(self, stage: str, seconds: float) -> None:
+        get_metrics().observe_stage(stage, seconds)
+        if self.trace is not None:
+            self.trace.timings[stage] = self.trace.timings.get(stage, 0.0) + seconds
+
+    def lap(self, stage: str) -> None:
+        now = time.perf_counter()
+        self._record(stage, now - self._last)
+        self._last = now
+
+    def finish(self) -> None:
+        self._record("total", time.perf_counter() - self.started)
+
+
+_DEFAULT_PROMPT = compile_prompt(
+    "<default>",
+    "Match the input string to one of these : {candidates}. If you can't find a match, return 'None'.",
+)
+
+
 def _load_prompt_text(prompt_path: str) -> str:
-    p = Path(prompt_path)
-    if not p.exists():
-        raise FileNotFoundError(f"Prompt file not found: {prompt_path}")
-    return p.read_text(encoding="utf-8")
+    return get_prompt_registry().get(prompt_path).text
+
+
+def _normalize_output(raw: str) -> Optional[str]:
+    s = (raw or "").strip()
+    s = s.strip('"').strip("'").strip()
+    if s.lower() in {"none", "null", "n/a", "na", ""}:
+        return None
+    return s
 
 
 def _remove_input_from_candidates(input_string: str, candidates: List[str]) -> List[str]:
@@ -28,51 +105,532 @@ def _remove_input_from_candidates(input_string: str, candidates: List[str]) -> L
     return [c for c in candidates if c != input_string]
 
 
+def _shortlist_candidates(
+    input_string: str, candidates: List[str], n_filtered: int, top_k: int
+) -> Optional[List[Tuple[str, float]]]:
+    """
+    Retrieve the `top_k` most plausible candidates for the input from a BM25 index.
+
+    `candidates` is the full list, so its index is shared by every input; the input itself is
+    dropped from the hits. `n_filtered` is the size of the list without the input.
+
+    Returns None when shortlisting is disabled (top_k <= 0) or the list is already small enough.
+    """
+    if top_k <= 0 or n_filtered <= top_k:
+        return None
+    hits = get_candidate_index(tuple(candidates)).search(input_string, top_k + 1)
+    return [(c, score) for c, score in hits if c != input_string][:top_k]
+
+
+def _within_prompt_cache_budget(list_of_strings: Union[List[str], CandidateSet]) -> bool:
+    """
+    Whether the whole list is estimated at no more than Settings.prompt_cache_max_tokens. Such a
+    list is sent unshortlisted, so that every input's prompt starts with the same prefix, which the
+    provider can serve from its prompt cache.
+    """
+    budget = get_settings().prompt_cache_max_tokens
+    if budget <= 0:
+        return False
+    if isinstance(list_of_strings, CandidateSet):
+        return len(list_of_strings.candidates_json) / 4 <= budget
+    # Every candidate is at least a token, so a longer list needn't be measured
+    if len(list_of_strings) > budget:
+        return False
+    # ~4 characters per token, counting each candidate's quotes and separator, as estimate_candidate_tokens
+    return (sum(map(len, list_of_strings)) + 4 * len(list_of_strings)) / 4 <= budget
+
+
+def _shortlist_candidate_set(
+    input_string: str, candidate_set: CandidateSet, top_k: int
+) -> Optional[List[Tuple[str, float]]]:
+    """Same as _shortlist_candidates, using the set's prebuilt index (which still contains the input)."""
+    n_filtered = len(candidate_set) - (1 if input_string in candidate_set else 0)
+    if top_k <= 0 or n_filtered <= top_k:
+        return None
+    hits = candidate_set.index.search(input_string, top_k + 1)
+    return [(c, score) for c, score in hits if c != input_string][:top_k]
+
+
+@dataclass
+class _PreparedMatch:
+    """Everything needed to call the model for one match, or the answer if no call is needed."""
+
+    input_string: str
+    answer: Optional[str] = None
+    messages: Optional[list] = None
+    # Identifies identical requests (see match_cache.make_cache_key); None if the model is unidentifiable
+    request_key: Optional[str] = None
+    use_cache: bool = False
+    shortlist: Optional[List[Tuple[str, float]]] = None
+    tier: Optional[str] = None
+    clock: Optional[_StageClock] = field(default=None, repr=False)
+    # Set instead of messages when the candidate list is too long for one prompt
+    chunked: Optional[ChunkedMatch] = None
+    # The candidates the model chooses from, for the deadline fallback
+    candidates: Optional[List[str]] = field(default=None, repr=False)
+    # (prompt tokens, cached prompt tokens) summed over this match's model calls
+    usage: Optional[Tuple[int, int]] = None
+
+
+def _match_prompt(prompt_path: Optional[str]):
+    """(compiled prompt, effective prompt path or "" for the built-in default)."""
+    effective_prompt_path = (prompt_path or get_settings().prompt_path or "").strip()
+    if effective_prompt_path:
+        # Prompt file should contain {candidates}; the input is the HumanMessage that follows it
+        # (and {input_name}, which only older templates use)
+        return get_prompt_registry().get(effective_prompt_path), effective_prompt_path
+    return _DEFAULT_PROMPT, ""
+
+
+def _prematch(prepared: _PreparedMatch, list_of_strings: Union[List[str], CandidateSet]) -> bool:
+    """Answers the match from the pre-match index if it can. Returns True if it did."""
+    if not get_settings().prematch_enabled:
+        return False
+    trace = prepared.clock.trace
+    if isinstance(list_of_strings, CandidateSet):
+        prematch = list_of_strings.prematch
+    else:
+        prematch = get_prematch_index(tuple(list_of_strings), legal_suffixes())
+    found = prematch.lookup(prepared.input_string)
+    if found is not None:
+        logger.info("Pre-matched %s to %s (%s)", prepared.input_string, found[0], found[1])
+        prepared.tier = found[1]
+        if trace is not None:
+            trace.tier = found[1]
+        prepared.answer = found[0]
+    prepared.clock.lap("prematch")
+    return found is not None
+
+
+def _lookup_cache(prepared: _PreparedMatch, list_of_strings: Union[List[str], CandidateSet], model, prompt) -> bool:
+    """Sets the match's request key and answers it from the result cache if it can. Returns True if it did."""
+    settings = get_settings()
+    trace = prepared.clock.trace
+    input_string = prepared.input_string
+    cache = get_match_cache()
+    model_id = model_cache_id(model) if (cache is not None or settings.singleflight_enabled) else None
+    if model_id is not None:
+        if isinstance(list_of_strings, CandidateSet):
+            fingerprint = list_of_strings.fingerprint
+        else:
+            fingerprint = candidates_fingerprint(list_of_strings)
+        prepared.request_key = make_cache_key(
+            input_string, fingerprint, prompt.sha256, model_id, exact_input=input_string in list_of_strings
+        )
+
+    if cache is not None and prepared.request_key is not None:
+        prepared.use_cache = True
+        cached = cache.get(prepared.request_key)
+        if trace is not None:
+            trace.cache = "hit" if cached is not None else "miss"
+        if cached is not None:
+            logger.info("Cache hit for %s", input_string)
+            prepared.tier = "cache"
+            if trace is not None:
+                trace.tier = "cache"
+                if cached.get("shortlist") is not None:
+                    trace.shortlist = [tuple(item) for item in cached["shortlist"]]
+            prepared.answer = cached["raw"]
+            prepared.clock.lap("cache")
+            return True
+    prepared.clock.lap("cache")
+    return False
+
+
+def _select_candidates(prepared: _PreparedMatch, list_of_strings: Union[List[str], CandidateSet]) -> Optional[str]:
+    """
+    Sets the candidates the model chooses from: the list without the input, or its shortlist.
+
+    Returns the candidates' precomputed JSON if a registered set has it, else None.
+    """
+    settings = get_settings()
+    input_string = prepared.input_string
+    top_k = 0 if _within_prompt_cache_budget(list_of_strings) else settings.shortlist_top_k
+    candidates_json = None
+    if isinstance(list_of_strings, CandidateSet):
+        filtered_candidates, candidates_json = list_of_strings.without(input_string)
+        shortlist = _shortlist_candidate_set(input_string, list_of_strings, top_k)
+    else:
+        filtered_candidates = _remove_input_from_candidates(input_string, list_of_strings)
+        shortlist = _shortlist_candidates(input_string, list_of_strings, len(filtered_candidates), top_k)
+
+    if shortlist is not None:
+        logger.info(
+            "Shortlisted %d of %d candidates for %s", len(shortlist), len(filtered_candidates), input_string
+        )
+        filtered_candidates = [c for c, _ in shortlist]
+        candidates_json = None
+    if settings.prompt_sort_candidates and candidates_json is None:
+        # A registered set's precomputed order is already the same on every request
+        filtered_candidates = sorted(filtered_candidates)
+    prepared.shortlist = shortlist
+    prepared.candidates = filtered_candidates
+    if prepared.clock.trace is not None:
+        prepared.clock.trace.shortlist = shortlist
+    prepared.clock.lap("shortlist")
+    return candidates_json
+
+
+def _format_messages(
+    prepared: _PreparedMatch, prompt, effective_prompt_path: str, candidates_json: Optional[str]
+) -> None:
+    """Renders the prompt for prepared.candidates, or plans a chunked match if they don't fit in one."""
+    settings = get_settings()
+    trace = prepared.clock.trace
+    input_string = prepared.input_string
+    filtered_candidates = prepared.candidates
+
+    def render(candidates: List[str], candidates_json: Optional[str] = None) -> str:
+        if effective_prompt_path:
+            return prompt.render(
+                input_name=input_string,
+                candidates=candidates_json or json.dumps(candidates, ensure_ascii=False),
+            )
+        return prompt.render(candidates=str(candidates))
+
+    chunks = None
+    # A precomputed JSON list that is already short enough needn't be measured candidate by candidate
+    if candidates_json is None or len(candidates_json) / 4 > settings.chunk_max_tokens:
+        chunks = plan_chunks(filtered_candidates, settings.chunk_max_tokens)
+    if chunks is not None:
+        logger.info(
+            "Matching %s against %d candidates in %d chunks", input_string, len(filtered_candidates), len(chunks)
+        )
+        prepared.chunked = ChunkedMatch(input_string, chunks, render, settings.chunk_max_tokens)
+        if trace is not None:
+            trace.chunks = len(chunks)
+    else:
+        prepared.messages = [
+            SystemMessage(content=render(filtered_candidates, candidates_json)),
+            HumanMessage(content=input_string),
+        ]
+    prepared.tier = "model"
+    if trace is not None:
+        trace.tier = "model"
+    prepared.clock.lap("format")
+
+
+def _prepare_match(
+    input_string: str,
+    list_of_strings: Union[List[str], CandidateSet],
+    model,
+    prompt_path: Optional[str],
+    trace: Optional[MatchTrace],
+) -> _PreparedMatch:
+    prompt, effective_prompt_path = _match_prompt(prompt_path)
+    prepared = _PreparedMatch(input_string=input_string, clock=_StageClock(trace))
+    prepared.clock.lap("prompt")
+
+    if _prematch(prepared, list_of_strings) or _lookup_cache(prepared, list_of_strings, model, prompt):
+        return prepared
+    candidates_json = _select_candidates(prepared, list_of_strings)
+    _format_messages(prepared, prompt, effective_prompt_path, candidates_json)
+    return prepared
+
+
+def _prepare_candidates(
+    input_string: str, list_of_strings: Union[List[str], CandidateSet], trace: Optional[MatchTrace]
+) -> _PreparedMatch:
+    """
+    The light half of _prepare_match, for inputs that may be packed (see packed_matcher): pre-match
+    and shortlist only. The packed prompt and cache key are the caller's; if the input ends up
+    matched on its own, _complete_prepared does the rest.
+    """
+    prepared = _PreparedMatch(input_string=input_string, clock=_StageClock(trace))
+    if not _prematch(prepared, list_of_strings):
+        _select_candidates(prepared, list_of_strings)
+        prepared.tier = "model"
+        if trace is not None:
+            trace.tier = "model"
+    return prepared
+
+
+def _complete_prepared(
+    prepared: _PreparedMatch, list_of_strings: Union[List[str], CandidateSet], model, prompt_path: Optional[str]
+) -> None:
+    """Cache lookup and prompt for a match set up by _prepare_candidates, to match it on its own."""
+    prompt, effective_prompt_path = _match_prompt(prompt_path)
+    if _lookup_cache(prepared, list_of_strings, model, prompt):
+        return
+    candidates_json = None
+    if isinstance(list_of_strings, CandidateSet) and prepared.shortlist is None:
+        candidates_json = list_of_strings.without(prepared.input_string)[1]
+    _format_messages(prepared, prompt, effective_prompt_path, candidates_json)
+
+
+def _record_result(prepared: _PreparedMatch, raw: str) -> str:
+    """Count the result in the metrics and close its timings."""
+    metrics = get_metrics()
+    matched = _normalize_output(raw)
+    prepared.clock.lap("normalize")
+    metrics.inc("name_matcher_results_total", tier=prepared.tier or "unknown")
+    if matched is None:
+        metrics.inc("name_matcher_none_results_total")
+    prepared.clock.finish()
+    return raw
+
+
+def _prompt_usage(response) -> Optional[Tuple[int, int]]:
+    """(prompt tokens, of which served from the provider's prompt cache) as reported by the model."""
+    usage = getattr(response, "usage_metadata", None) or {}
+    if usage.get("input_tokens") is not None:
+        details = usage.get("input_token_details") or {}
+        return int(usage["input_tokens"]), int(details.get("cache_read") or 0)
+    token_usage = (getattr(response, "response_metadata", None) or {}).get("token_usage") or {}
+    if token_usage.get("prompt_tokens") is not None:
+        details = token_usage.get("prompt_tokens_details") or {}
+        return int(token_usage["prompt_tokens"]), int(details.get("cached_tokens") or 0)
+    return None
+
+
+def _note_usage(prepared: Optional[_PreparedMatch], responses: list) -> list:
+    """Counts the prompt tokens of model responses in the metrics and, if given, the match's usage."""
+    metrics = get_metrics()
+    for response in responses:
+        usage = _prompt_usage(response)
+        if usage is None:
+            continue
+        prompt_tokens, cached = usage
+        metrics.inc("name_matcher_prompt_tokens_total", cached, cached="true")
+        metrics.inc("name_matcher_prompt_tokens_total", prompt_tokens - cached, cached="false")
+        if prepared is not None:
+            total, total_cached = prepared.usage or (0, 0)
+            prepared.usage = (total + prompt_tokens, total_cached + cached)
+    return responses
+
+
+def _finish_match(prepared: _PreparedMatch, response, shared: bool = False) -> str:
+    prepared.clock.lap("model")
+    content = getattr(response, "content", "")
+    logger.info("Response = %s", content)
+    trace = prepared.clock.trace
+    if trace is not None and prepared.usage is not None and not shared:
+        trace.prompt_tokens, trace.cached_prompt_tokens = prepared.usage
+
+    # A shared (coalesced) response was already cached by the caller that made the model call
+    if prepared.use_cache and not shared:
+        get_match_cache().set(prepared.request_key, {"raw": content, "shortlist": prepared.shortlist})
+        prepared.clock.lap("cache")
+    return _record_result(prepared, content)
+
+
+def _coalesce(prepared: _PreparedMatch) -> bool:
+    return prepared.request_key is not None and get_settings().singleflight_enabled
+
+
+@lru_cache(maxsize=16)
+def _fallback_model(candidates: Tuple[str, ...]):
+    """Cached mock model per candidate list, so repeated fallbacks don't rebuild its scorer."""
+    from app.services.model_factory import load_backend
+
+    return load_backend("mock").build_chat_model(list(candidates))
+
+
+def _fallback_match(prepared: _PreparedMatch) -> str:
+    """
+    The local fuzzy match (the mock model) over the candidates the model was given, for a match
+    whose model call missed the deadline. Not cached: the next identical request asks the model.
+    Blocking (scoring, and building the scorer for a new list): async callers run it in a thread.
+    """
+    logger.warning("Model missed the deadline for %s; using the fuzzy fallback", prepared.input_string)
+    fallback = _fallback_model(tuple(prepared.candidates or ()))
+    content = fallback.invoke([HumanMessage(content=prepared.input_string)]).content
+    prepared.tier = "fallback"
+    trace = prepared.clock.trace
+    if trace is not None:
+        trace.tier = "fallback"
+        trace.degraded = True
+    get_metrics().inc("name_matcher_degraded_results_total")
+    prepared.clock.lap("model")
+    return _record_result(prepared, content)
+
+
+@lru_cache(maxsize=1)
+def _deadline_executor() -> ThreadPoolExecutor:
+    # Sync matches with a deadline wait for their model call on one of these threads
+    return ThreadPoolExecutor(
+        max_workers=max(1, get_settings().max_inflight_llm_calls), thread_name_prefix="deadline-match"
+    )
+
+
+def _invoke(model, messages):
+    hedger = get_hedger()
+    if hedger is not None:
+        return hedger.invoke(model, messages)
+    return model.invoke(messages)
+
+
+def _invoke_all(model, batches: List[list]) -> list:
+    """One model call per message list, all at once (the rounds of a chunked match)."""
+    get_metrics().inc("name_matcher_model_calls_total", len(batches), mode="chunked")
+    if len(batches) == 1:
+        return [_invoke(model, batches[0])]
+    workers = min(len(batches), max(1, get_settings().max_inflight_llm_calls))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="chunked-match") as pool:
+        return list(pool.map(lambda messages: _invoke(model, messages), batches))
+
+
 def match_string_with_langchain(
     input_string: str,
-    list_of_strings: List[str],
+    list_of_strings: Union[List[str], CandidateSet],
     model,
     prompt_path: Optional[str] = None,
+    trace: Optional[MatchTrace] = None,
 ) -> str:
     """
     Matches an input string to one of a list of strings using a LangChain model.
 
     Args:
         input_string: The string to match.
-        list_of_strings: A list of strings to match against.
+        list_of_strings: A list of strings to match against, or a registered CandidateSet.
         model: The LangChain model object (e.g., AzureChatOpenAI or mock).
         prompt_path: Optional prompt file path. If not provided, uses Settings.prompt_path.
+        trace: Optional MatchTrace that is filled in with details of how the match was made.
 
     Returns:
         The model's response content.
     """
-    settings = get_settings()
-    effective_prompt_path = (prompt_path or settings.prompt_path or "").strip()
+    prepared = _prepare_match(input_string, list_of_strings, model, prompt_path, trace)
+    if prepared.answer is not None:
+        return _record_result(prepared, prepared.answer)
 
-    filtered_candidates = _remove_input_from_candidates(input_string, list_of_strings)
+    def _call():
+        logger.info("Using LLM to find match for %s", input_string)
+        if prepared.chunked is not None:
+            return prepared.chunked.run(lambda batches: _note_usage(prepared, _invoke_all(model, batches)))
+        get_metrics().inc("name_matcher_model_calls_total", mode="single")
+        return _note_usage(prepared, [_invoke(model, prepared.messages)])[0]
 
-    if effective_prompt_path:
-        prompt_template = _load_prompt_text(effective_prompt_path)
+    def _run():
+        if _coalesce(prepared):
+            return get_singleflight().do(prepared.request_key, _call)
+        return _call(), False
 
-        # Prompt file should contain {input_name} and {candidates}
-        system_prompt = prompt_template.format(
-            input_name=input_string,
-            candidates=json.dumps(filtered_candidates, ensure_ascii=False),
-        )
-    else:
-        system_prompt = (
-            f"Match the input string to one of these : {filtered_candidates}. "
-            f"If you can't find a match, return 'None'."
-        )
+    deadline = get_settings().match_deadline_seconds
+    try:
+        if deadline > 0:
+            # The deadline covers the whole call, including time queued for a free thread
+            future = _deadline_executor().submit(contextvars.copy_context().run, _run)
+            try:
+                response, shared = future.result(timeout=deadline)
+            except FutureTimeoutError:
+                # Dropped if still queued; a call in progress carries on in the background, its answer dropped
+                future.cancel()
+                return _fallback_match(prepared)
+        else:
+            response, shared = _run()
+    except Exception:
+        get_metrics().inc("name_matcher_errors_total", stage="model")
+        raise
+    return _finish_match(prepared, response, shared)
 
-    messages = [
-        SystemMessage(content=system_prompt),
-        HumanMessage(content=input_string),
-    ]
 
-    logger.info("Using LLM to find match for %s", input_string)
-    response = model.invoke(messages)
+_llm_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = (
+    weakref.WeakKeyDictionary()
+)
 
-    content = getattr(response, "content", "")
-    logger.info("Response = %s", content)
-    return content
+
+def _llm_semaphore() -> asyncio.Semaphore:
+    """
+    Process-wide limit on in-flight async model calls (Settings.max_inflight_llm_calls).
+
+    asyncio primitives belong to one event loop, so there is one semaphore per running loop.
+    """
+    loop = asyncio.get_running_loop()
+    semaphore = _llm_semaphores.get(loop)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(max(1, get_settings().max_inflight_llm_calls))
+        _llm_semaphores[loop] = semaphore
+    return semaphore
+
+
+async def _ainvoke_once(model, messages):
+    if hasattr(model, "ainvoke"):
+        return await model.ainvoke(messages)
+    # Models without an async API still mustn't block the event loop
+    return await asyncio.to_thread(model.invoke, messages)
+
+
+async def _ainvoke(model, messages):
+    hedger = get_hedger()
+    if hedger is not None:
+        return await hedger.ainvoke(model, lambda: _ainvoke_once(model, messages))
+    return await _ainvoke_once(model, messages)
+
+
+async def _ainvoke_all(model, batches: List[list]) -> list:
+    """Async variant of _invoke_all, each call taking a slot of the in-flight limit."""
+
+    async def _one(messages):
+        async with _llm_semaphore():
+            get_metrics().inc("name_matcher_model_calls_total", mode="chunked")
+            return await _ainvoke(model, messages)
+
+    return await asyncio.gather(*(_one(m) for m in batches))
+
+
+async def amatch_string_with_langchain(
+    input_string: str,
+    list_of_strings: Union[List[str], CandidateSet],
+    model,
+    prompt_path: Optional[str] = None,
+    trace: Optional[MatchTrace] = None,
+) -> str:
+    """
+    Async variant of match_string_with_langchain, using model.ainvoke.
+
+    At most Settings.max_inflight_llm_calls model calls are in flight at once; further calls
+    wait for a free slot. Concurrent identical requests share a single model call.
+    """
+    # Preparing can build the list's pre-match and BM25 indexes and read the SQLite cache tier:
+    # all blocking work, so it runs in a thread rather than on the event loop
+    prepared = await asyncio.to_thread(_prepare_match, input_string, list_of_strings, model, prompt_path, trace)
+    return await _amatch_prepared(prepared, model)
+
+
+def _disk_cache() -> bool:
+    cache = get_match_cache()
+    return cache is not None and bool(cache.sqlite_path)
+
+
+async def _amatch_prepared(prepared: _PreparedMatch, model) -> str:
+    """The model-call half of amatch_string_with_langchain, for a match _prepare_match has set up."""
+    if prepared.answer is not None:
+        return _record_result(prepared, prepared.answer)
+
+    async def _call():
+        logger.info("Using LLM to find match for %s", prepared.input_string)
+        if prepared.chunked is not None:
+
+            async def _all(batches):
+                return _note_usage(prepared, await _ainvoke_all(model, batches))
+
+            return await prepared.chunked.arun(_all)
+        async with _llm_semaphore():
+            get_metrics().inc("name_matcher_model_calls_total", mode="single")
+            return _note_usage(prepared, [await _ainvoke(model, prepared.messages)])[0]
+
+    async def _run():
+        if _coalesce(prepared):
+            # Identical concurrent requests wait for one shared model call
+            return await get_singleflight().ado(prepared.request_key, _call)
+        return await _call(), False
+
+    deadline = get_settings().match_deadline_seconds
+    try:
+        if deadline > 0:
+            try:
+                # As for sync matches, time queued for a model slot counts against the deadline
+                response, shared = await asyncio.wait_for(_run(), timeout=deadline)
+            except asyncio.TimeoutError:
+                # Our own call is cancelled; a shared single-flight call carries on for its other waiters
+                return await asyncio.to_thread(_fallback_match, prepared)
+        else:
+            response, shared = await _run()
+    except Exception:
+        get_metrics().inc("name_matcher_errors_total", stage="model")
+        raise
+    if prepared.use_cache and not shared and _disk_cache():
+        # _finish_match writes the answer to the SQLite tier
+        return await asyncio.to_thread(_finish_match, prepared, response, shared)
+    return _finish_match(prepared, response, shared)
@@ -0,0 +1,196 @@
+"""
+Result cache for match_string_with_langchain.
+
+Two tiers:
+- in-memory LRU with a TTL, per process
+- optional SQLite file (MATCH_CACHE_SQLITE_PATH), so entries survive restarts and are shared
+  between uvicorn workers on the same host
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+from app.config import get_settings
+
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def normalize_input(input_string: str) -> str:
+    """Case- and whitespace-insensitive form of the input used in cache keys."""
+    return " ".join(input_string.casefold().split())
+
+
+def candidates_fingerprint(candidates: Sequence[str]) -> str:
+    # \x1f (unit separator) can't be confused with text inside a candidate name
+    return _sha256("\x1f".join(str(c) for c in candidates))
+
+
+def model_cache_id(model) -> Optional[str]:
+    """
+    Identifies the model (and its settings) an answer came from.
+
+    Returns None for models we can't identify; their answers are never cached.
+    """
+    cache_id = getattr(model, "cache_id", None)
+    if cache_id:
+        return str(cache_id)
+    deployment = getattr(model, "deployment_name", None)
+    if deployment:
+        return f"azure:{getattr(model, 'azure_endpoint', '')}:{deployment}"
+    return None
+
+
+def make_cache_key(
+    input_string: str, candidates_sha256: str, prompt_sha256: str, model_id: str, exact_input: bool = False
+) -> str:
+    """
+    Key of a match result. The input is normalized (see normalize_input) unless exact_input is set:
+    an input that is itself a candidate is removed from the list sent to the model by exact
+    comparison, so "HMRC" and "hmrc" get different prompts and mustn't share an answer.
+    """
+    return _sha256(
+        "\n".join(
+            [
+                # \x00 can't start a normalized input, so exact and normalized keys never collide
+                "\x00" + input_string if exact_input else normalize_input(input_string),
+                candidates_sha256,
+                prompt_sha256,
+                model_id,
+            ]
+        )
+    )
+
+
+class MatchCache:
+    """Thread-safe LRU + TTL cache of JSON-serializable match results, with optional SQLite tier."""
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 86400.0, sqlite_path: str = ""):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.sqlite_path = sqlite_path
+
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if sqlite_path:
+            self._db().execute(
+                "CREATE TABLE IF NOT EXISTS match_cache "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+
+    def _db(self) -> sqlite3.Connection:
+        # sqlite3 connections can't be shared across threads, so keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.sqlite_path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _expired(self, created_at: float, now: float) -> bool:
+        return self.ttl_seconds > 0 and now - created_at > self.ttl_seconds
+
+    def _remember(self, key: str, created_at: float, value: Dict[str, Any]) -> None:
+        # Caller holds self._lock
+        self._entries[key] = (created_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                created_at, value = entry
+                if not self._expired(created_at, now):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+
+        if self.sqlite_path:
+            row = self._db().execute(
+                "SELECT value, created_at FROM match_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and not self._expired(row[1], now):
+                value = json.loads(row[0])
+                with self._lock:
+                    self._remember(key, row[1], value)
+                    self.hits += 1
+                    self.disk_hits += 1
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    async def aget(self, key: str) -> Optional[Dict[str, Any]]:
+        """get() for async callers: with the SQLite tier the lookup runs in a thread, off the event loop."""
+        if not self.sqlite_path:
+            return self.get(key)
+        return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key: str, value: Dict[str, Any]) -> None:
+        """set() for async callers, see aget()."""
+        if not self.sqlite_path:
+            self.set(key, value)
+            return
+        await asyncio.to_thread(self.set, key, value)
+
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, value)
+        if self.sqlite_path:
+            self._db().execute(
+                "INSERT OR REPLACE INTO match_cache (key, value, created_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), now),
+            )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+        if self.sqlite_path:
+            self._db().execute("DELETE FROM match_cache")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "sqlite": bool(self.sqlite_path),
+            }
+
+
+@lru_cache(maxsize=1)
+def get_match_cache() -> Optional[MatchCache]:
+    """Process-wide cache built from Settings, or None if caching is disabled."""
+    settings = get_settings()
+    if not settings.match_cache_enabled:
+        return None
+    return MatchCache(
+        max_entries=settings.match_cache_max_entries,
+        ttl_seconds=settings.match_cache_ttl_seconds,
+        sqlite_path=settings.match_cache_sqlite_path,
+    )
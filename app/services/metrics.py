@@ -0,0 +1,130 @@
+"""
+In-process metrics, exposed in Prometheus text format on GET /metrics.
+
+- Latency histograms per match stage (prompt, prematch, cache, shortlist, format, model,
+  normalize, total). Each keeps the total count and sum plus a window of the most recent
+  samples, from which p50/p95/p99 are computed (exported as a Prometheus summary).
+- Counters for model calls, results by tier, "None" results, errors, Azure deployment pool
+  calls and failovers, hedged calls and degraded (deadline) results.
+
+Everything is kept in memory per process; nothing here needs a Prometheus client library.
+"""
+
+from __future__ import annotations
+
+import math
+import threading
+from collections import deque
+from functools import lru_cache
+from typing import Deque, Dict, List, Tuple
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+# (name, help) for every metric family, in output order
+_STAGE_SECONDS = ("name_matcher_stage_seconds", "Time spent in each match stage.")
+_COUNTERS = {
+    "name_matcher_model_calls_total": "Model calls made, by mode (single, packed or chunked).",
+    "name_matcher_results_total": "Match results, by the tier that produced them.",
+    "name_matcher_none_results_total": "Match results with no matching candidate.",
+    "name_matcher_errors_total": "Errors, by stage.",
+    "name_matcher_deployment_calls_total": "Azure deployment pool calls, by deployment and outcome.",
+    "name_matcher_deployment_failovers_total": "Calls retried on another deployment, by the deployment that failed.",
+    "name_matcher_hedged_calls_total": "Model calls that were hedged, by which call answered first.",
+    "name_matcher_degraded_results_total": "Matches answered by the local fuzzy match because the deadline passed.",
+    "name_matcher_prompt_tokens_total": "Prompt tokens reported by the model, by whether the provider's prompt cache served them.",
+}
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+class LatencyHistogram:
+    """Count, sum and a sliding window of recent samples for quantiles."""
+
+    def __init__(self, window: int = 2048):
+        self.count = 0
+        self.sum = 0.0
+        self._samples: Deque[float] = deque(maxlen=window)
+
+    def observe(self, seconds: float) -> None:
+        self.count += 1
+        self.sum += seconds
+        self._samples.append(seconds)
+
+    def quantiles(self, qs=QUANTILES) -> Dict[float, float]:
+        samples = sorted(self._samples)
+        if not samples:
+            return {q: math.nan for q in qs}
+        # Nearest-rank quantiles over the window
+        return {q: samples[min(len(samples) - 1, max(0, math.ceil(q * len(samples)) - 1))] for q in qs}
+
+
+def _labels(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = key + extra
+    if not pairs:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isnan(value):
+        return "NaN"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metrics:
+    def __init__(self, window: int = 2048):
+        self.window = window
+        self._lock = threading.Lock()
+        self._stages: Dict[str, LatencyHistogram] = {}
+        self._counters: Dict[str, Dict[LabelKey, float]] = {name: {} for name in _COUNTERS}
+
+    def observe_stage(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            histogram = self._stages.get(stage)
+            if histogram is None:
+                histogram = self._stages[stage] = LatencyHistogram(self.window)
+            histogram.observe(seconds)
+
+    def inc(self, name: str, amount: float = 1, **labels: str) -> None:
+        key = _labels(labels)
+        with self._lock:
+            series = self._counters[name]
+            series[key] = series.get(key, 0) + amount
+
+    def stage_quantiles(self) -> Dict[str, Dict[float, float]]:
+        with self._lock:
+            return {stage: h.quantiles() for stage, h in self._stages.items()}
+
+    def counter(self, name: str, **labels: str) -> float:
+        with self._lock:
+            return self._counters[name].get(_labels(labels), 0)
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines: List[str] = []
+        with self._lock:
+            name, help_text = _STAGE_SECONDS
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} summary"]
+            for stage in sorted(self._stages):
+                histogram = self._stages[stage]
+                key = (("stage", stage),)
+                for q, value in histogram.quantiles().items():
+                    lines.append(f"{name}{_format_labels(key, (('quantile', str(q)),))} {_format_value(value)}")
+                lines.append(f"{name}_sum{_format_labels(key)} {_format_value(histogram.sum)}")
+                lines.append(f"{name}_count{_format_labels(key)} {histogram.count}")
+
+            for name, help_text in _COUNTERS.items():
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+                for key, value in sorted(self._counters[name].items()):
+                    lines.append(f"{name}{_format_labels(key)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+@lru_cache(maxsize=1)
+def get_metrics() -> Metrics:
+    return Metrics()
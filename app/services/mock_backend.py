@@ -0,0 +1,41 @@
+"""
+Mock model backend (USE_MOCK_LLM=true): fuzzy matching against the candidate list, no network.
+
+Loaded through model_factory's backend registry.
+"""
+
+from __future__ import annotations
+
+from typing import Optional, Sequence
+
+from app.config import get_settings
+from app.services.candidate_index_file import StringTable
+from app.services.mock_langchain_model import MockChatModelWithCandidates
+
+
+def build_chat_model(candidates: Optional[Sequence[str]] = None):
+    """A mock model that matches against `candidates`."""
+    settings = get_settings()
+    candidates = candidates if candidates is not None else []
+    if isinstance(candidates, StringTable):
+        # Candidates from an index file: its scorer vectors are already built
+        index_file = candidates.index_file
+        return MockChatModelWithCandidates(
+            candidates=candidates,
+            similarity_threshold=settings.mock_similarity_threshold,
+            scoring_engine=settings.mock_scoring_engine,
+            scorer=index_file.scorer(settings.mock_scoring_engine),
+            fingerprint=index_file.fingerprint,
+        )
+    scorer = None
+    if settings.mock_scoring_workers > 0 and len(candidates) >= settings.mock_scoring_parallel_min_candidates:
+        # Imported here: only needed (and its process pool only started) for large lists
+        from app.services.parallel_scoring import get_parallel_scorer
+
+        scorer = get_parallel_scorer(settings.mock_scoring_engine, candidates, settings.mock_scoring_workers)
+    return MockChatModelWithCandidates(
+        candidates=candidates,
+        similarity_threshold=settings.mock_similarity_threshold,
+        scoring_engine=settings.mock_scoring_engine,
+        scorer=scorer,
+    )
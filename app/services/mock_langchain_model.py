@@ -1,8 +1,11 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
-from difflib import SequenceMatcher
-from typing import List
+import asyncio
+from dataclasses import dataclass, field
+from typing import Any, ClassVar, List, Optional
+
+from app.services.match_cache import candidates_fingerprint
+from app.services.scoring import build_scorer
 
 
 @dataclass
@@ -12,25 +15,50 @@ class MockResponse:
 
 @dataclass
 class MockChatModelWithCandidates:
+    # Matches the last message as one input name, so packed_matcher sends it one input per call
+    supports_packed_prompts: ClassVar[bool] = False
+
     candidates: List[str]
     similarity_threshold: float = 0.85
+    # See app/services/scoring.py. "sequence" keeps the original SequenceMatcher semantics.
+    scoring_engine: str = "sequence"
+    # Optional precomputed scorer and fingerprint, e.g. from a candidate index file
+    scorer: Any = field(default=None, repr=False, compare=False)
+    fingerprint: Optional[str] = field(default=None, repr=False, compare=False)
+    _scorer: Any = field(init=False, repr=False, compare=False)
+    _fingerprint: str = field(init=False, repr=False, compare=False)
 
-    def invoke(self, messages):
-        input_name = (messages[-1].content or "").strip()
+    def __post_init__(self):
+        # Candidate representations are precomputed once per model, not on every invoke
+        self._scorer = self.scorer if self.scorer is not None else build_scorer(self.scoring_engine, self.candidates)
+        self._fingerprint = self.fingerprint or candidates_fingerprint(self.candidates)
 
-        if not self.candidates:
-            return MockResponse("None")
+    @property
+    def cache_id(self) -> str:
+        """Identity of this model's behaviour, used in result cache keys."""
+        return f"mock:{self.scoring_engine}:{self.similarity_threshold}:{self._fingerprint}"
 
-        best = None
-        best_score = 0.0
+    def _answer(self, best: int, best_score: float) -> str:
+        if best < 0 or best_score < self.similarity_threshold:
+            return "None"
 
-        for c in self.candidates:
-            score = SequenceMatcher(None, input_name.lower(), str(c).lower()).ratio()
-            if score > best_score:
-                best_score = score
-                best = c
+        return str(self.candidates[best])
 
-        if best is None or best_score < self.similarity_threshold:
-            return MockResponse("None")
+    def _best(self, input_name: str) -> str:
+        if not self.candidates:
+            return "None"
 
-        return MockResponse(str(best))
+        return self._answer(*self._scorer.best(input_name, threshold=self.similarity_threshold))
+
+    def invoke(self, messages):
+        input_name = (messages[-1].content or "").strip()
+        return MockResponse(self._best(input_name))
+
+    async def ainvoke(self, messages):
+        abest = getattr(self._scorer, "abest", None)
+        if abest is None or not self.candidates:
+            # In-process scoring is CPU-bound: run it in a thread rather than on the event loop
+            return await asyncio.to_thread(self.invoke, messages)
+        # Scored in the process pool (parallel_scoring): await its futures instead
+        input_name = (messages[-1].content or "").strip()
+        return MockResponse(self._answer(*await abest(input_name, threshold=self.similarity_threshold)))
@@ -1,39 +1,62 @@
+"""
+Chat model backends.
+
+Each backend is a module with a build_chat_model(candidates) function, registered here by name
+and imported on first use only. A process therefore only pays for the libraries of the backend
+it uses: in mock mode langchain_openai and the openai SDK are never imported.
+"""
+
 from __future__ import annotations
 
+import importlib
+import sys
 from functools import lru_cache
-from typing import List, Optional
+from types import ModuleType
+from typing import Dict, List, Optional
+
+from app.config import get_settings
+
+# Backend name -> module implementing it
+_BACKENDS: Dict[str, str] = {
+    "mock": "app.services.mock_backend",
+    "azure": "app.services.azure_backend",
+}
+
 
-from langchain_openai import AzureChatOpenAI
+def register_backend(name: str, module: str) -> None:
+    """Add (or replace) a backend. `module` must define build_chat_model(candidates)."""
+    _BACKENDS[name] = module
+    load_backend.cache_clear()
 
-from app.config import get_settings, missing_azure_vars
 
+@lru_cache(maxsize=None)
+def load_backend(name: str) -> ModuleType:
+    try:
+        module = _BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown model backend: {name!r} (expected one of {sorted(_BACKENDS)})") from None
+    return importlib.import_module(module)
 
-def _build_mock_model(candidates: List[str]):
-    # Local import so the repo doesn't break if mock file isn't used in Azure mode
-    from app.services.mock_langchain_model import MockChatModelWithCandidates
 
+def _loaded_backend(name: str) -> Optional[ModuleType]:
+    """The backend's module if something has already imported it, without importing it."""
+    return sys.modules.get(_BACKENDS[name])
 
-    settings = get_settings()
-    return MockChatModelWithCandidates(
-        candidates=candidates,
-        similarity_threshold=settings.mock_similarity_threshold,
-    )
 
+def selected_backend() -> str:
+    return "mock" if get_settings().use_mock_llm else "azure"
 
-@lru_cache(maxsize=1)
-def _get_azure_model_cached():
-    settings = get_settings()
-    missing = missing_azure_vars(settings)
-    if missing:
-        raise RuntimeError("Missing required env vars: " + ", ".join(missing))
 
-    return AzureChatOpenAI(
-        azure_endpoint=settings.azure_openai_endpoint,
-        openai_api_key=settings.azure_openai_key,
-        azure_deployment=settings.azure_openai_deployment_name,
-        openai_api_version=settings.azure_openai_api_version,
-        temperature=1.0,
-    )
+def azure_rate_limit_stats() -> Optional[dict]:
+    """Limiter stats for the Azure model, or None if it hasn't been built or isn't rate limited."""
+    backend = _loaded_backend("azure")
+    return backend.rate_limit_stats() if backend is not None else None
+
+
+def azure_pool_stats() -> Optional[dict]:
+    """Per-deployment stats for the Azure deployment pool, or None if there isn't one (yet)."""
+    backend = _loaded_backend("azure")
+    return backend.pool_stats() if backend is not None else None
 
 
 def get_chat_model(candidates: Optional[List[str]] = None):
@@ -41,11 +64,7 @@ def get_chat_model(candidates: Optional[List[str]] = None):
     Returns a chat model that supports: model.invoke(messages)
 
     - If USE_MOCK_LLM=true (default), returns a mock model that matches against `candidates`.
-    - If USE_MOCK_LLM=false, returns AzureChatOpenAI.
+    - If USE_MOCK_LLM=false, returns AzureChatOpenAI, or a DeploymentPool over the deployments
+      in AZURE_DEPLOYMENTS.
     """
-    settings = get_settings()
-
-    if settings.use_mock_llm:
-        return _build_mock_model(candidates or [])
-
-    return _get_azure_model_cached()
+    return load_backend(selected_backend()).build_chat_model(candidates)
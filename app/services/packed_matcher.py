@@ -0,0 +1,271 @@
+"""
+Packed matching: several input names resolved against one candidate list in a single model call.
+
+Matching inputs one at a time repeats the whole candidate JSON in every prompt. Here, inputs
+that need the model are grouped into packs of Settings.pack_size and sent as one numbered JSON
+object with the packed prompt (Settings.packed_prompt_path); the model answers with a JSON object
+keyed the same way. Any input whose answer is missing, malformed or not one of the candidates
+falls back to ordinary single-input matching.
+
+Pre-matching, the result cache and shortlisting work as for single matches: each pack is sent
+the union of its inputs' shortlists. Inputs that may be packed are only pre-matched and
+shortlisted up front; the single-match prompt and cache lookup are done only for those that end
+up matched on their own.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+from typing import Container, Dict, List, Optional, Sequence, Union
+
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from app.config import get_settings
+from app.services.candidate_sets import CandidateSet
+from app.services.chunked_matcher import plan_chunks
+from app.services.langchain_matcher import (
+    MatchTrace,
+    _PreparedMatch,
+    _ainvoke,
+    _amatch_prepared,
+    _complete_prepared,
+    _llm_semaphore,
+    _normalize_output,
+    _note_usage,
+    _prepare_candidates,
+    _prepare_match,
+    _prompt_usage,
+    _record_result,
+)
+from app.services.match_cache import candidates_fingerprint, get_match_cache, make_cache_key, model_cache_id
+from app.services.metrics import get_metrics
+from app.services.prompt_registry import get_packed_prompt_registry
+
+logger = logging.getLogger(__name__)
+
+
+def parse_packed_output(raw: str, n_inputs: int, candidates: Container[str]) -> Dict[int, str]:
+    """
+    Map a packed answer back to its inputs.
+
+    Returns {input position: answer} for the answers that are usable: a candidate from the pack's
+    list, or "None". Inputs that are missing from the answer, or whose answer isn't a candidate,
+    are left out so the caller can match them individually.
+    """
+    text = (raw or "").strip()
+    if text.startswith("```"):
+        # Tolerate a markdown code fence around the JSON
+        text = text.strip("`").strip()
+        if text.lower().startswith("json"):
+            text = text[4:]
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return {}
+    if not isinstance(data, dict):
+        return {}
+
+    answers = {}
+    for i in range(n_inputs):
+        key = str(i + 1)
+        if key not in data:
+            continue
+        value = data[key]
+        if value is None:
+            answers[i] = "None"
+        elif isinstance(value, str):
+            match = _normalize_output(value)
+            if match is None:
+                answers[i] = "None"
+            elif match in candidates:
+                answers[i] = match
+    return answers
+
+
+def _pack_candidates(pack: List[_PreparedMatch], list_of_strings: Union[List[str], CandidateSet]):
+    """Candidate list and JSON for a pack: the union of the shortlists, or the full list."""
+    if all(p.shortlist is not None for p in pack):
+        candidates = list(dict.fromkeys(c for p in pack for c, _ in p.shortlist))
+    elif isinstance(list_of_strings, CandidateSet):
+        return list_of_strings.candidates, list_of_strings.candidates_json
+    else:
+        candidates = list(list_of_strings)
+    if get_settings().prompt_sort_candidates:
+        # Same candidates, same prompt prefix (see langchain_matcher._prepare_match)
+        candidates = sorted(candidates)
+    return candidates, json.dumps(candidates, ensure_ascii=False)
+
+
+def _fits_one_prompt(list_of_strings: Union[List[str], CandidateSet]) -> bool:
+    """Whether the full list fits in one prompt, i.e. an input without a shortlist needn't be chunked."""
+    max_tokens = get_settings().chunk_max_tokens
+    if isinstance(list_of_strings, CandidateSet):
+        if len(list_of_strings.candidates_json) / 4 <= max_tokens:
+            return True
+        return plan_chunks(list_of_strings.candidates, max_tokens) is None
+    return plan_chunks(list_of_strings, max_tokens) is None
+
+
+def _prepare_all(
+    input_strings: Sequence[str],
+    list_of_strings: Union[List[str], CandidateSet],
+    model,
+    prompt_path: Optional[str],
+    traces: List[Optional[MatchTrace]],
+    pack: bool,
+) -> List[_PreparedMatch]:
+    members = list_of_strings if isinstance(list_of_strings, CandidateSet) else frozenset(list_of_strings)
+    prepared = []
+    fits = None
+    for input_string, trace in zip(input_strings, traces):
+        # Inputs that are themselves candidates need their own list without them, so are matched alone
+        if pack and input_string not in members:
+            p = _prepare_candidates(input_string, list_of_strings, trace)
+            if p.answer is None and p.shortlist is None:
+                if fits is None:
+                    fits = _fits_one_prompt(list_of_strings)
+                if not fits:
+                    # Too long for one prompt: matched alone, in chunks
+                    _complete_prepared(p, list_of_strings, model, prompt_path)
+        else:
+            p = _prepare_match(input_string, list_of_strings, model, prompt_path, trace)
+        prepared.append(p)
+    return prepared
+
+
+async def amatch_many_with_langchain(
+    input_strings: Sequence[str],
+    list_of_strings: Union[List[str], CandidateSet],
+    model,
+    prompt_path: Optional[str] = None,
+    traces: Optional[List[MatchTrace]] = None,
+    return_exceptions: bool = False,
+) -> List[Union[str, BaseException]]:
+    """
+    Match many inputs against one candidate list, packing up to Settings.pack_size inputs per call.
+
+    Args:
+        input_strings: The strings to match.
+        list_of_strings: A list of strings to match against, or a registered CandidateSet.
+        model: The LangChain model object (e.g., AzureChatOpenAI or mock).
+        prompt_path: Prompt for inputs matched individually (see match_string_with_langchain).
+        traces: Optional MatchTrace per input, filled in as for single matches.
+        return_exceptions: As for asyncio.gather: return a failed input's exception in its place
+            instead of raising it.
+
+    Returns:
+        The raw answer for each input, in input order.
+    """
+    settings = get_settings()
+    if traces is None:
+        traces = [None] * len(input_strings)
+    results: List[Union[str, BaseException, None]] = [None] * len(input_strings)
+
+    # Models that answer one input per call (the mock) are never sent packed prompts
+    pack = settings.pack_size > 1 and getattr(model, "supports_packed_prompts", True)
+    # Blocking work (index builds, SQLite cache reads), see amatch_string_with_langchain
+    prepared = await asyncio.to_thread(_prepare_all, input_strings, list_of_strings, model, prompt_path, traces, pack)
+
+    single: List[int] = []
+    packable: List[int] = []
+    for i, p in enumerate(prepared):
+        if p.answer is not None:
+            results[i] = _record_result(p, p.answer)
+        elif p.messages is None and p.chunked is None:
+            packable.append(i)
+        else:
+            single.append(i)
+
+    packed_prompt = get_packed_prompt_registry().get(settings.packed_prompt_path) if packable else None
+    cache = get_match_cache()
+    model_id = model_cache_id(model) if cache is not None and packable else None
+    if model_id is not None:
+        if isinstance(list_of_strings, CandidateSet):
+            fingerprint = list_of_strings.fingerprint
+        else:
+            fingerprint = candidates_fingerprint(list_of_strings)
+
+    # Packed answers are cached under their own key: they come from a different prompt
+    packed_keys: Dict[int, str] = {}
+    if model_id is not None:
+        for i in list(packable):
+            packed_keys[i] = make_cache_key(input_strings[i], fingerprint, packed_prompt.sha256, model_id)
+            cached = await cache.aget(packed_keys[i])
+            if traces[i] is not None:
+                traces[i].cache = "hit" if cached is not None else "miss"
+            if cached is not None:
+                packable.remove(i)
+                prepared[i].tier = "cache"
+                if traces[i] is not None:
+                    traces[i].tier = "cache"
+                prepared[i].clock.lap("cache")
+                results[i] = _record_result(prepared[i], cached["raw"])
+
+    # Packed calls and inputs matched on their own (at the start or after an unusable packed answer)
+    # share the same per-batch limit as /match/batch without packing
+    batch_slots = asyncio.Semaphore(max(1, settings.batch_max_concurrency))
+
+    async def _single(i: int) -> None:
+        p = prepared[i]
+        try:
+            async with batch_slots:
+                if p.answer is None and p.messages is None and p.chunked is None:
+                    # Prepared for packing only: its own cache lookup and prompt
+                    await asyncio.to_thread(_complete_prepared, p, list_of_strings, model, prompt_path)
+                results[i] = await _amatch_prepared(p, model)
+        except Exception as e:
+            if not return_exceptions:
+                raise
+            results[i] = e
+
+    async def _pack(indices: List[int]) -> None:
+        pack = [prepared[i] for i in indices]
+        candidates, candidates_json = _pack_candidates(pack, list_of_strings)
+        messages = [
+            SystemMessage(content=packed_prompt.render(candidates=candidates_json)),
+            HumanMessage(
+                content=json.dumps({str(n + 1): p.input_string for n, p in enumerate(pack)}, ensure_ascii=False)
+            ),
+        ]
+        logger.info("Using LLM to match a pack of %d inputs", len(pack))
+        call_failed = False
+        try:
+            async with batch_slots, _llm_semaphore():
+                get_metrics().inc("name_matcher_model_calls_total", mode="packed")
+                response = await _ainvoke(model, messages)
+            # Counted once in the metrics, and reported for every input in the pack
+            _note_usage(None, [response])
+            usage = _prompt_usage(response)
+            for i in indices:
+                prepared[i].usage = usage
+            answers = parse_packed_output(getattr(response, "content", ""), len(pack), frozenset(candidates))
+        except Exception as e:
+            logger.warning("Packed match failed, matching %d inputs individually: %s", len(pack), e)
+            get_metrics().inc("name_matcher_errors_total", stage="model")
+            call_failed = True
+            answers = {}
+
+        for n, i in enumerate(indices):
+            if n in answers:
+                trace = traces[i]
+                if trace is not None and prepared[i].usage is not None:
+                    trace.prompt_tokens, trace.cached_prompt_tokens = prepared[i].usage
+                prepared[i].clock.lap("model")
+                if i in packed_keys:
+                    await cache.aset(packed_keys[i], {"raw": answers[n], "shortlist": prepared[i].shortlist})
+                    prepared[i].clock.lap("cache")
+                results[i] = _record_result(prepared[i], answers[n])
+
+        missing = [i for n, i in enumerate(indices) if n not in answers]
+        if missing:
+            if not call_failed:
+                get_metrics().inc("name_matcher_errors_total", len(missing), stage="packed_parse")
+            logger.info("Packed answer unusable for %d of %d inputs, matching them individually", len(missing), len(pack))
+            await asyncio.gather(*(_single(i) for i in missing))
+
+    size = max(1, settings.pack_size)
+    packs = [packable[k : k + size] for k in range(0, len(packable), size)]
+    await asyncio.gather(*(_pack(indices) for indices in packs), *(_single(i) for i in single))
+    return results
@@ -0,0 +1,216 @@
+"""
+Process-pool scoring for the mock model's large candidate lists.
+
+Scoring a query (scoring.py) is CPU-bound and mostly holds the GIL: SequenceMatcher runs in
+pure Python, so one large request stalls every other request in the worker. ParallelScorer
+splits the list into one slice per scoring process instead:
+
+- At construction, the per-slice scorer arrays and the candidate strings are copied once into a
+  single multiprocessing.shared_memory block.
+- Scoring processes attach to the block by name and score their slice with zero-copy numpy views.
+  Each query sends only the block name, its layout and the query.
+- The per-slice bests are merged into the same answer as scoring.py would give for the whole list:
+  the highest score, with ties going to the earliest candidate.
+
+Async callers use abest(), which awaits the pool's futures on the event loop rather than
+blocking a thread on them. The block is freed when the ParallelScorer is garbage collected. Lists shorter than
+MOCK_SCORING_PARALLEL_MIN_CANDIDATES are scored in-process, since the round trip to the pool
+would cost more than the scoring (see mock_backend.build_chat_model).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import multiprocessing
+import threading
+import weakref
+from collections import OrderedDict
+from collections.abc import Sequence as SequenceABC
+from concurrent.futures import Future, ProcessPoolExecutor
+from functools import lru_cache
+from multiprocessing import shared_memory
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from app.services.match_cache import candidates_fingerprint
+from app.services.scoring import SCORERS
+
+# (offset, dtype, shape) of each array in a shared block
+Layout = Dict[str, Tuple[int, str, Tuple[int, ...]]]
+
+_ALIGN = 64
+
+
+class _SharedStrings(SequenceABC):
+    """Candidates lo..hi of a UTF-8 blob + offsets, decoded on access."""
+
+    def __init__(self, offsets: np.ndarray, blob: np.ndarray, lo: int, hi: int):
+        self._offsets, self._blob, self._lo, self._hi = offsets, blob, lo, hi
+
+    def __len__(self) -> int:
+        return self._hi - self._lo
+
+    def __getitem__(self, i: int) -> str:
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        start, end = self._offsets[self._lo + i], self._offsets[self._lo + i + 1]
+        return self._blob[int(start) : int(end)].tobytes().decode("utf-8")
+
+
+def _views(buf, layout: Layout) -> Dict[str, np.ndarray]:
+    return {
+        name: np.ndarray(shape, dtype=np.dtype(dtype), buffer=buf, offset=offset)
+        for name, (offset, dtype, shape) in layout.items()
+    }
+
+
+# ---------------------------------------------------------------------------------------------
+# Scoring processes
+
+# Blocks this process is attached to, most recently used last: name -> (block, scorers by slice)
+_attached: "OrderedDict[str, Tuple[shared_memory.SharedMemory, Dict[int, object]]]" = OrderedDict()
+_MAX_ATTACHED = 8
+
+
+def _slice_scorer(block: str, layout: Layout, engine: str, k: int, lo: int, hi: int):
+    if block in _attached:
+        _attached.move_to_end(block)
+    else:
+        # Spawned workers share the parent's resource tracker, so attaching doesn't add a second owner
+        shm = shared_memory.SharedMemory(name=block)
+        _attached[block] = (shm, {})
+        while len(_attached) > _MAX_ATTACHED:
+            _, (old, _) = _attached.popitem(last=False)
+            old.close()
+
+    shm, scorers = _attached[block]
+    if k not in scorers:
+        views = _views(shm.buf, layout)
+        candidates = _SharedStrings(views["offsets"], views["blob"], lo, hi)
+        prefix = f"{k}."
+        arrays = {name[len(prefix) :]: v for name, v in views.items() if name.startswith(prefix)}
+        scorers[k] = SCORERS[engine].from_arrays(candidates, **arrays)
+    return scorers[k]
+
+
+def _score_slice(
+    block: str, layout: Layout, engine: str, k: int, lo: int, hi: int, query: str, threshold: float
+) -> Tuple[int, float]:
+    best, score = _slice_scorer(block, layout, engine, k, lo, hi).best(query, threshold=threshold)
+    return (lo + best if best >= 0 else -1), score
+
+
+@lru_cache(maxsize=1)
+def get_scoring_pool(workers: int) -> ProcessPoolExecutor:
+    # spawn: forking a process that runs server threads isn't safe
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+# ---------------------------------------------------------------------------------------------
+# Parent side
+
+
+def _release(shm: shared_memory.SharedMemory) -> None:
+    shm.close()
+    shm.unlink()
+
+
+class ParallelScorer:
+    """Same best() as the scoring.py engine it wraps, computed slice by slice in a process pool."""
+
+    def __init__(self, engine: str, candidates: Sequence[str], workers: int):
+        if engine not in SCORERS:
+            raise ValueError(f"Unknown scoring engine: {engine!r} (expected one of {sorted(SCORERS)})")
+        self.name = engine
+        self.candidates: List[str] = [str(c) for c in candidates]
+        self.workers = max(1, workers)
+
+        n = len(self.candidates)
+        bounds = np.linspace(0, n, min(self.workers, max(n, 1)) + 1).astype(int)
+        self._slices = [(int(lo), int(hi)) for lo, hi in zip(bounds, bounds[1:])]
+
+        encoded = [c.encode("utf-8") for c in self.candidates]
+        offsets = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        arrays: Dict[str, np.ndarray] = {
+            "offsets": offsets,
+            "blob": np.frombuffer(b"".join(encoded) or b"\0", dtype=np.uint8),
+        }
+        for k, (lo, hi) in enumerate(self._slices):
+            for name, array in SCORERS[engine](self.candidates[lo:hi]).arrays().items():
+                arrays[f"{k}.{name}"] = np.ascontiguousarray(array)
+
+        self._layout: Layout = {}
+        size = 0
+        for name, array in arrays.items():
+            size += -size % _ALIGN
+            self._layout[name] = (size, array.dtype.str, array.shape)
+            size += array.nbytes
+        self._shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        for name, view in _views(self._shm.buf, self._layout).items():
+            view[...] = arrays[name]
+        self._finalizer = weakref.finalize(self, _release, self._shm)
+
+    @property
+    def nbytes(self) -> int:
+        return self._shm.size
+
+    def close(self) -> None:
+        self._finalizer()
+
+    def _submit(self, query: str, threshold: float) -> List[Future]:
+        pool = get_scoring_pool(self.workers)
+        return [
+            pool.submit(_score_slice, self._shm.name, self._layout, self.name, k, lo, hi, query, threshold)
+            for k, (lo, hi) in enumerate(self._slices)
+        ]
+
+    @staticmethod
+    def _merge(results: List[Tuple[int, float]]) -> Tuple[int, float]:
+        best_idx, best_score = -1, 0.0
+        for i, score in results:
+            # Slices are in list order, so a tie keeps the earlier candidate
+            if i >= 0 and score > best_score:
+                best_idx, best_score = i, score
+        return best_idx, best_score
+
+    def best(self, query: str, threshold: float = 0.0) -> Tuple[int, float]:
+        """(index, score) of the first candidate with the highest score, or (-1, 0.0)."""
+        if not self.candidates:
+            return -1, 0.0
+        return self._merge([future.result() for future in self._submit(query, threshold)])
+
+    async def abest(self, query: str, threshold: float = 0.0) -> Tuple[int, float]:
+        """best() for async callers: awaits the slices without blocking the event loop or a thread."""
+        if not self.candidates:
+            return -1, 0.0
+        futures = self._submit(query, threshold)
+        return self._merge(await asyncio.gather(*(asyncio.wrap_future(f) for f in futures)))
+
+
+_scorers: "OrderedDict[Tuple[str, str, int], ParallelScorer]" = OrderedDict()
+_scorers_lock = threading.Lock()
+_MAX_SCORERS = 4
+
+
+def get_parallel_scorer(engine: str, candidates: Sequence[str], workers: int) -> ParallelScorer:
+    """
+    A ParallelScorer for the list, reused while it is one of the few most recently used lists.
+
+    Mock models are built per request for ad-hoc candidate lists; this keeps a repeated list from
+    being copied into shared memory again every time.
+    """
+    key = (engine, candidates_fingerprint(candidates), workers)
+    with _scorers_lock:
+        scorer = _scorers.get(key)
+        if scorer is not None:
+            _scorers.move_to_end(key)
+            return scorer
+    scorer = ParallelScorer(engine, candidates, workers)
+    with _scorers_lock:
+        _scorers[key] = scorer
+        while len(_scorers) > _MAX_SCORERS:
+            # Evicted scorers are freed once no model uses them any more
+            _scorers.popitem(last=False)
+    return scorer
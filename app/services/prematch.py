@@ -0,0 +1,113 @@
+"""
+Deterministic pre-match tier.
+
+Resolves the easy cases without a model call:
+- "normalized": the input equals one candidate after casefolding, dropping bracketed text and
+  punctuation, "&" -> "and" and stripping legal suffixes (Ltd, Limited, PLC, ...)
+- "acronym": the input is an acronym (HMRC, DWP, TfL) of exactly one candidate, either by its
+  initials or because the candidate spells it out in brackets ("Transport for London (TfL)")
+
+Anything ambiguous (several candidates share the key) is left to the model.
+"""
+
+from __future__ import annotations
+
+import re
+from collections import defaultdict
+from functools import lru_cache
+from typing import Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+from app.config import get_settings
+
+_BRACKETED_RE = re.compile(r"[\(\[\{]([^\)\]\}]*)[\)\]\}]")
+_NON_ALNUM_RE = re.compile(r"[^\w]+|_")
+_ACRONYM_INPUT_RE = re.compile(r"^[A-Za-z](?:\.?[A-Za-z]){1,7}\.?$")
+
+_ACRONYM_STOPWORDS = frozenset({"a", "an", "and", "at", "for", "in", "of", "on", "the", "to"})
+
+
+@lru_cache(maxsize=1)
+def legal_suffixes() -> FrozenSet[str]:
+    return frozenset(s.strip().casefold() for s in get_settings().prematch_legal_suffixes.split(",") if s.strip())
+
+
+@lru_cache(maxsize=65536)
+def normalise_name(name: str, suffixes: FrozenSet[str] = frozenset()) -> str:
+    """Casefolded, bracket/punctuation-free form of a name with trailing legal suffixes removed."""
+    s = _BRACKETED_RE.sub(" ", name.casefold()).replace("&", " and ")
+    words = _NON_ALNUM_RE.sub(" ", s).split()
+    if words and words[0] == "the":
+        words = words[1:]
+    while len(words) > 1 and words[-1] in suffixes:
+        words.pop()
+    return " ".join(words)
+
+
+def _initials(words: List[str]) -> List[str]:
+    if len(words) < 2:
+        return []
+    full = "".join(w[0] for w in words)
+    short = "".join(w[0] for w in words if w not in _ACRONYM_STOPWORDS)
+    return [a for a in {full, short} if len(a) >= 2]
+
+
+def _as_acronym(text: str) -> Optional[str]:
+    """The acronym key for text that looks like one ("DWP", "H.M.R.C.", "TfL"), else None."""
+    s = text.strip()
+    if not _ACRONYM_INPUT_RE.match(s) or sum(ch.isupper() for ch in s) < 2:
+        return None
+    return s.replace(".", "").casefold()
+
+
+def _candidate_acronyms(candidate: str, normalized: str) -> List[str]:
+    acronyms = _initials(normalized.split())
+    for bracketed in _BRACKETED_RE.findall(candidate):
+        acronyms.append(_as_acronym(bracketed))
+    # The candidate may itself be an acronym, e.g. "HMRC"
+    acronyms.append(_as_acronym(candidate))
+    return [a for a in acronyms if a]
+
+
+class PrematchIndex:
+    """Normalized-name and acronym lookup tables for one candidate list."""
+
+    def __init__(self, candidates: Sequence[str], suffixes: FrozenSet[str]):
+        self.suffixes = suffixes
+        names: Dict[str, List[str]] = defaultdict(list)
+        acronyms: Dict[str, List[str]] = defaultdict(list)
+        for candidate in dict.fromkeys(str(c) for c in candidates):
+            normalized = normalise_name(candidate, suffixes)
+            if not normalized:
+                continue
+            names[normalized].append(candidate)
+            for acronym in _candidate_acronyms(candidate, normalized):
+                if candidate not in acronyms[acronym]:
+                    acronyms[acronym].append(candidate)
+        self._names = {k: tuple(v) for k, v in names.items()}
+        self._acronyms = {k: tuple(v) for k, v in acronyms.items()}
+
+    @staticmethod
+    def _unique(matches: Tuple[str, ...], input_string: str) -> Optional[str]:
+        # The input itself is never a valid answer (see _remove_input_from_candidates)
+        remaining = [c for c in matches if c != input_string]
+        return remaining[0] if len(remaining) == 1 else None
+
+    def lookup(self, input_string: str) -> Optional[Tuple[str, str]]:
+        """Returns (candidate, tier) if the input resolves to exactly one candidate, else None."""
+        normalized = normalise_name(input_string, self.suffixes)
+        if normalized in self._names:
+            found = self._unique(self._names[normalized], input_string)
+            if found is not None:
+                return found, "normalized"
+
+        acronym = _as_acronym(input_string)
+        if acronym is not None and acronym in self._acronyms:
+            found = self._unique(self._acronyms[acronym], input_string)
+            if found is not None:
+                return found, "acronym"
+        return None
+
+
+@lru_cache(maxsize=16)
+def get_prematch_index(candidates: Tuple[str, ...], suffixes: FrozenSet[str]) -> PrematchIndex:
+    return PrematchIndex(candidates, suffixes)
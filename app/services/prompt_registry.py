@@ -0,0 +1,168 @@
+"""
+Registry of prompt templates.
+
+Prompt files are read once, parsed into literal/field segments and kept in memory. A file is
+only re-read when its mtime or size changes (checked at most every
+PROMPT_RELOAD_INTERVAL_SECONDS), and only recompiled if its content hash changed.
+
+Only prompts found in PROMPT_DIR (buyer_match_v*.txt) or configured via PROMPT_PATH can be
+used, so client-supplied prompt paths never reach the filesystem. The packed prompt
+(PACKED_PROMPT_PATH) has a registry of its own: it expects numbered inputs, so clients can't
+select it.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+import time
+from dataclasses import dataclass, replace
+from functools import lru_cache
+from pathlib import Path
+from string import Formatter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.config import get_settings
+
+
+class UnknownPromptError(FileNotFoundError):
+    """Raised for prompt paths that aren't registered (or whose file has disappeared)."""
+
+
+@dataclass(frozen=True)
+class CompiledPrompt:
+    path: str
+    version: str
+    text: str
+    sha256: str
+    mtime_ns: int
+    size: int
+    # (literal text, field name or None) pairs, or None if the template needs full str.format
+    segments: Optional[Tuple[Tuple[str, Optional[str]], ...]]
+
+    def render(self, **values) -> str:
+        if self.segments is None:
+            return self.text.format(**values)
+        return "".join(literal + (values[name] if name is not None else "") for literal, name in self.segments)
+
+
+def compile_prompt(path: str, text: str, mtime_ns: int = 0, size: int = 0) -> CompiledPrompt:
+    segments: Optional[List[Tuple[str, Optional[str]]]] = []
+    for literal, name, spec, conversion in Formatter().parse(text):
+        if name is not None and (spec or conversion or not name.isidentifier()):
+            # Format specs, conversions, indexing etc: leave those to str.format
+            segments = None
+            break
+        segments.append((literal, name))
+
+    return CompiledPrompt(
+        path=path,
+        version=Path(path).stem,
+        text=text,
+        sha256=hashlib.sha256(text.encode("utf-8")).hexdigest(),
+        mtime_ns=mtime_ns,
+        size=size,
+        segments=tuple(segments) if segments is not None else None,
+    )
+
+
+def _key(prompt_path: str) -> str:
+    # Pure string normalisation: doesn't touch the filesystem
+    return os.path.normcase(os.path.abspath(prompt_path))
+
+
+class PromptRegistry:
+    def __init__(
+        self,
+        prompt_dir: str = "prompts",
+        pattern: str = "buyer_match_v*.txt",
+        extra_paths: Iterable[str] = (),
+        reload_interval_seconds: float = 1.0,
+    ):
+        self.prompt_dir = prompt_dir
+        self.pattern = pattern
+        self.extra_paths = [p for p in extra_paths if p]
+        self.reload_interval_seconds = reload_interval_seconds
+
+        self._lock = threading.Lock()
+        self._paths: Dict[str, str] = {}  # alias (abs path or version) -> abs path
+        self._compiled: Dict[str, CompiledPrompt] = {}
+        self._checked_at: Dict[str, float] = {}
+        self._scanned_at = 0.0
+        self._scan()
+
+    def _scan(self) -> None:
+        paths = sorted(Path(self.prompt_dir).glob(self.pattern)) + [Path(p) for p in self.extra_paths]
+        aliases = {}
+        for p in paths:
+            aliases[_key(str(p))] = _key(str(p))
+            aliases.setdefault(p.stem, _key(str(p)))
+        self._paths = aliases
+        self._scanned_at = time.monotonic()
+
+    def known_prompts(self) -> List[str]:
+        return sorted(k for k in self._paths if not os.path.isabs(k))
+
+    def _resolve(self, prompt_path: str) -> str:
+        key = self._paths.get(prompt_path) or self._paths.get(_key(prompt_path))
+        if key is None and time.monotonic() - self._scanned_at >= self.reload_interval_seconds:
+            # Pick up prompt files added to the prompt directory since the last scan
+            with self._lock:
+                self._scan()
+            key = self._paths.get(prompt_path) or self._paths.get(_key(prompt_path))
+        if key is None:
+            raise UnknownPromptError(
+                f"Prompt file not found: {prompt_path} (known prompts: {', '.join(self.known_prompts())})"
+            )
+        return key
+
+    def get(self, prompt_path: str) -> CompiledPrompt:
+        """Returns the compiled prompt for a registered path or version name (e.g. buyer_match_v4)."""
+        key = self._resolve(prompt_path)
+        compiled = self._compiled.get(key)
+        now = time.monotonic()
+        if compiled is not None and now - self._checked_at.get(key, 0.0) < self.reload_interval_seconds:
+            return compiled
+
+        with self._lock:
+            compiled = self._compiled.get(key)
+            try:
+                st = os.stat(key)
+            except FileNotFoundError:
+                self._compiled.pop(key, None)
+                raise UnknownPromptError(f"Prompt file not found: {prompt_path}") from None
+
+            if compiled is None or (st.st_mtime_ns, st.st_size) != (compiled.mtime_ns, compiled.size):
+                text = Path(key).read_text(encoding="utf-8")
+                if compiled is not None and hashlib.sha256(text.encode("utf-8")).hexdigest() == compiled.sha256:
+                    # Touched but unchanged: keep the parsed template, just note the new stat
+                    compiled = replace(compiled, mtime_ns=st.st_mtime_ns, size=st.st_size)
+                else:
+                    compiled = compile_prompt(key, text, st.st_mtime_ns, st.st_size)
+                self._compiled[key] = compiled
+
+            self._checked_at[key] = now
+            return compiled
+
+
+@lru_cache(maxsize=1)
+def get_prompt_registry() -> PromptRegistry:
+    settings = get_settings()
+    return PromptRegistry(
+        prompt_dir=settings.prompt_dir,
+        extra_paths=[settings.prompt_path.strip()],
+        reload_interval_seconds=settings.prompt_reload_interval_seconds,
+    )
+
+
+@lru_cache(maxsize=1)
+def get_packed_prompt_registry() -> PromptRegistry:
+    """Registry holding only the packed prompt, for packed_matcher (not client-selectable)."""
+    settings = get_settings()
+    path = Path(settings.packed_prompt_path.strip())
+    return PromptRegistry(
+        prompt_dir=str(path.parent),
+        pattern=path.name,
+        reload_interval_seconds=settings.prompt_reload_interval_seconds,
+    )
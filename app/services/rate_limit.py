@@ -0,0 +1,274 @@
+"""
+Client-side rate limiting and adaptive concurrency for the Azure OpenAI backend.
+
+- TokenBucket: keeps us under the deployment's requests-per-minute and tokens-per-minute quota.
+  Each call takes 1 request token plus an estimate of its prompt + completion tokens.
+- AdaptiveConcurrency: AIMD limit on concurrent calls. Every successful call that finishes under
+  the latency target raises the limit additively (by about 1 per limit's worth of calls);
+  a 429 or a latency spike cuts it multiplicatively, at most once per round trip: calls that
+  were already in flight when the limit was cut report the same congestion, so their 429s
+  don't cut it again.
+- RateLimitedChatModel: wraps a chat model with both, and retries 429s after the server's
+  Retry-After instead of letting the OpenAI client hammer the deployment.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+
+def estimate_tokens(messages, completion_tokens: int = 0) -> int:
+    """Rough token count for a chat request: ~4 characters per token plus per-message overhead."""
+    chars = sum(len(str(getattr(m, "content", "") or "")) for m in messages)
+    return chars // 4 + 4 * len(messages) + completion_tokens
+
+
+def is_rate_limit_error(exc: BaseException) -> bool:
+    return getattr(exc, "status_code", None) == 429 or type(exc).__name__ == "RateLimitError"
+
+
+def retry_after_seconds(exc: BaseException, default: float) -> float:
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return default
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at `per_minute / 60` tokens per second."""
+
+    def __init__(self, per_minute: float, burst: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = burst if burst is not None else per_minute
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self, amount: float) -> float:
+        """Take `amount` tokens (possibly going negative) and return how long to wait for them."""
+        # Requests bigger than the whole bucket would never fit; let them through at a full bucket
+        amount = min(amount, self.capacity)
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= amount
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def acquire(self, amount: float = 1.0) -> float:
+        wait = self._reserve(amount)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    async def aacquire(self, amount: float = 1.0) -> float:
+        wait = self._reserve(amount)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+
+class AdaptiveConcurrency:
+    """AIMD concurrency limit shared by sync (threads) and async (any event loop) callers."""
+
+    def __init__(
+        self,
+        initial: int = 8,
+        minimum: int = 1,
+        maximum: int = 64,
+        latency_target_seconds: float = 10.0,
+        backoff: float = 0.5,
+    ):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.latency_target_seconds = latency_target_seconds
+        self.backoff = backoff
+
+        self.in_flight = 0
+        self.increases = 0
+        self.decreases = 0
+        self._last_decrease = float("-inf")
+        self._lock = threading.Lock()
+        self._sync_cond = threading.Condition(self._lock)
+        self._async_waiters: Deque[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = deque()
+
+    def _has_room(self) -> bool:
+        return self.in_flight < int(self.limit)
+
+    def acquire(self) -> float:
+        """Take a slot. Returns the start time to pass back to release()."""
+        with self._sync_cond:
+            while not self._has_room():
+                self._sync_cond.wait()
+            self.in_flight += 1
+        return time.monotonic()
+
+    async def aacquire(self) -> float:
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._lock:
+                if self._has_room():
+                    self.in_flight += 1
+                    return time.monotonic()
+                fut = loop.create_future()
+                self._async_waiters.append((loop, fut))
+            try:
+                await fut
+            except asyncio.CancelledError:
+                with self._lock:
+                    try:
+                        self._async_waiters.remove((loop, fut))
+                    except ValueError:
+                        pass
+                raise
+
+    def _wake(self) -> None:
+        # Caller holds self._lock
+        self._sync_cond.notify_all()
+        while self._async_waiters:
+            loop, fut = self._async_waiters.popleft()
+            # Waiters re-check for room themselves, so waking all of them is safe
+            loop.call_soon_threadsafe(lambda f=fut: f.done() or f.set_result(None))
+
+    def release(
+        self, latency: Optional[float] = None, overloaded: bool = False, started: Optional[float] = None
+    ) -> None:
+        """
+        Free a slot and adjust the limit.
+
+        overloaded: the call got a 429. latency: seconds the call took, if it succeeded.
+        started: what acquire() returned; an overload from a call started before the last cut
+        is ignored, since that cut already responded to it.
+        """
+        with self._lock:
+            self.in_flight -= 1
+            if overloaded or (latency is not None and latency > self.latency_target_seconds):
+                if started is None or started >= self._last_decrease:
+                    self.limit = max(self.minimum, self.limit * self.backoff)
+                    self.decreases += 1
+                    self._last_decrease = time.monotonic()
+            elif latency is not None and self.limit < self.maximum:
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+                self.increases += 1
+            self._wake()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "limit": round(self.limit, 2),
+                "in_flight": self.in_flight,
+                "increases": self.increases,
+                "decreases": self.decreases,
+            }
+
+
+class RateLimitedChatModel:
+    """Wraps a chat model (invoke / ainvoke) with quota buckets, AIMD concurrency and 429 retries."""
+
+    def __init__(
+        self,
+        model,
+        requests_per_minute: int = 0,
+        tokens_per_minute: int = 0,
+        concurrency: Optional[AdaptiveConcurrency] = None,
+        max_retries: int = 2,
+        completion_tokens: int = 50,
+        default_retry_after_seconds: float = 1.0,
+    ):
+        self.model = model
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self.concurrency = concurrency or AdaptiveConcurrency()
+        self.max_retries = max_retries
+        self.completion_tokens = completion_tokens
+        self.default_retry_after_seconds = default_retry_after_seconds
+
+        self._lock = threading.Lock()
+        self.attempts = 0
+        self.throttled = 0
+        self.throttle_wait_seconds = 0.0
+
+    def __getattr__(self, name):
+        # Everything else (deployment_name, azure_endpoint, cache_id, ...) comes from the wrapped model
+        if name == "model":
+            raise AttributeError(name)
+        return getattr(self.model, name)
+
+    def _note(self, throttled: bool = False, waited: float = 0.0) -> None:
+        with self._lock:
+            if throttled:
+                self.throttled += 1
+            else:
+                self.attempts += 1
+            self.throttle_wait_seconds += waited
+
+    def invoke(self, messages, **kwargs):
+        cost = estimate_tokens(messages, self.completion_tokens)
+        for attempt in range(self.max_retries + 1):
+            waited = self.requests.acquire() if self.requests else 0.0
+            waited += self.tokens.acquire(cost) if self.tokens else 0.0
+            self._note(waited=waited)
+
+            started = self.concurrency.acquire()
+            start = time.perf_counter()
+            try:
+                response = self.model.invoke(messages, **kwargs)
+            except Exception as e:
+                overloaded = is_rate_limit_error(e)
+                self.concurrency.release(overloaded=overloaded, started=started)
+                if not overloaded or attempt == self.max_retries:
+                    raise
+                self._note(throttled=True)
+                time.sleep(retry_after_seconds(e, self.default_retry_after_seconds))
+                continue
+            except BaseException:
+                self.concurrency.release()
+                raise
+            self.concurrency.release(latency=time.perf_counter() - start, started=started)
+            return response
+
+    async def ainvoke(self, messages, **kwargs):
+        cost = estimate_tokens(messages, self.completion_tokens)
+        for attempt in range(self.max_retries + 1):
+            waited = await self.requests.aacquire() if self.requests else 0.0
+            waited += await self.tokens.aacquire(cost) if self.tokens else 0.0
+            self._note(waited=waited)
+
+            started = await self.concurrency.aacquire()
+            start = time.perf_counter()
+            try:
+                response = await self.model.ainvoke(messages, **kwargs)
+            except Exception as e:
+                overloaded = is_rate_limit_error(e)
+                self.concurrency.release(overloaded=overloaded, started=started)
+                if not overloaded or attempt == self.max_retries:
+                    raise
+                self._note(throttled=True)
+                await asyncio.sleep(retry_after_seconds(e, self.default_retry_after_seconds))
+                continue
+            except BaseException:
+                # Cancelled: free the slot without counting it as a success or an overload
+                self.concurrency.release()
+                raise
+            self.concurrency.release(latency=time.perf_counter() - start, started=started)
+            return response
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = {
+                "attempts": self.attempts,
+                "throttled": self.throttled,
+                "throttle_wait_seconds": round(self.throttle_wait_seconds, 3),
+            }
+        stats["concurrency"] = self.concurrency.stats()
+        return stats
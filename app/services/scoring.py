@@ -0,0 +1,215 @@
+"""
+Scoring engines used by the mock model to find the closest candidate to an input.
+
+Each engine precomputes a representation of the candidate list once, at construction, and
+scores a query against every candidate with NumPy array operations instead of a per-candidate
+Python loop.
+
+- "sequence" (default): exact `difflib.SequenceMatcher.ratio()` semantics. A vectorized upper
+  bound on the ratio (from character counts) orders and prunes the candidates, so the expensive
+  ratio is only computed for the few that could still beat the best score so far.
+- "trigram": Dice coefficient over character trigrams, computed for all candidates in a single
+  sparse dot product. Much faster for large lists but its scores are on a different scale to
+  SequenceMatcher, so `similarity_threshold` may need retuning.
+"""
+
+from __future__ import annotations
+
+from difflib import SequenceMatcher
+from typing import Dict, List, Sequence, Tuple, Type
+
+import numpy as np
+
+# Character counts are folded into this many buckets. Folding can only increase the
+# min(count_a, count_b) sum, so the bound stays a valid upper bound on the ratio.
+_CHAR_BUCKETS = 64
+
+
+def _codepoints(strings: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Returns (concatenated code points, per-string lengths) for a list of strings."""
+    lengths = np.fromiter((len(s) for s in strings), dtype=np.int64, count=len(strings))
+    codes = np.frombuffer("".join(strings).encode("utf-32-le"), dtype=np.uint32)
+    return codes, lengths
+
+
+def _trigrams(strings: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns (trigram ids, owning string index) for every padded character trigram.
+
+    Each trigram id packs three 21-bit code points into one uint64, so ids are exact (no hash
+    collisions) and stable across processes.
+    """
+    padded = [" " + s + " " for s in strings]
+    codes, lengths = _codepoints(padded)
+    codes = codes.astype(np.uint64)
+    owner = np.repeat(np.arange(len(padded), dtype=np.int64), lengths)
+
+    if len(codes) < 3:
+        return np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.int64)
+
+    ids = (codes[:-2] << np.uint64(42)) | (codes[1:-1] << np.uint64(21)) | codes[2:]
+    # A trigram is only valid if all three characters come from the same string
+    valid = owner[:-2] == owner[2:]
+    return ids[valid], owner[:-2][valid]
+
+
+class _Lowered:
+    """Lower-cased view of a candidate sequence, computed per item on access."""
+
+    def __init__(self, candidates: Sequence[str]):
+        self._candidates = candidates
+
+    def __len__(self) -> int:
+        return len(self._candidates)
+
+    def __getitem__(self, i: int) -> str:
+        return self._candidates[i].lower()
+
+
+class SequenceScorer:
+    """Exact SequenceMatcher ratio, with vectorized pruning of hopeless candidates."""
+
+    name = "sequence"
+
+    def __init__(self, candidates: Sequence[str]):
+        self.candidates: List[str] = [str(c) for c in candidates]
+        self._lowered: List[str] = [c.lower() for c in self.candidates]
+
+        codes, lengths = _codepoints(self._lowered)
+        owner = np.repeat(np.arange(len(self._lowered), dtype=np.int64), lengths)
+        flat = owner * _CHAR_BUCKETS + (codes % _CHAR_BUCKETS)
+        self._counts = np.bincount(flat, minlength=len(self._lowered) * _CHAR_BUCKETS).reshape(
+            len(self._lowered), _CHAR_BUCKETS
+        )
+        self._lengths = lengths
+
+    @classmethod
+    def from_arrays(cls, candidates: Sequence[str], counts: np.ndarray, lengths: np.ndarray) -> "SequenceScorer":
+        """A scorer over precomputed character counts (see candidate_index_file.py)."""
+        scorer = cls.__new__(cls)
+        scorer.candidates = candidates
+        # Only the few candidates that survive pruning are ever lowered
+        scorer._lowered = _Lowered(candidates)
+        scorer._counts = counts
+        scorer._lengths = lengths
+        return scorer
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        """The precomputed arrays, as accepted by from_arrays()."""
+        return {"counts": self._counts, "lengths": self._lengths}
+
+    def _upper_bounds(self, query: str) -> np.ndarray:
+        codes, _ = _codepoints([query])
+        query_counts = np.bincount(codes % _CHAR_BUCKETS, minlength=_CHAR_BUCKETS)
+        shared = np.minimum(self._counts, query_counts).sum(axis=1)
+        total = self._lengths + len(query)
+        return np.where(total > 0, 2.0 * shared / np.maximum(total, 1), 1.0)
+
+    def best(self, query: str, threshold: float = 0.0) -> Tuple[int, float]:
+        """
+        Returns (index, ratio) of the first candidate with the highest ratio, or (-1, 0.0).
+
+        Same result as looping over every candidate with SequenceMatcher, keeping the first
+        strictly better score. Candidates whose upper bound is below `threshold` are skipped,
+        since they could never be accepted.
+        """
+        if not self.candidates:
+            return -1, 0.0
+
+        query = query.lower()
+        bounds = self._upper_bounds(query)
+        best_idx, best_score = -1, 0.0
+
+        for i in np.argsort(-bounds, kind="stable"):
+            bound = bounds[i]
+            if bound < best_score or bound < threshold or bound == 0.0:
+                break
+            if bound == best_score and i > best_idx:
+                # Could at best tie, and ties go to the earlier candidate
+                continue
+            score = SequenceMatcher(None, query, self._lowered[i]).ratio()
+            if score > best_score or (score == best_score and best_idx != -1 and i < best_idx):
+                best_idx, best_score = int(i), score
+
+        return best_idx, best_score
+
+
+class TrigramScorer:
+    """Dice coefficient over character trigram sets, scored for all candidates at once."""
+
+    name = "trigram"
+
+    def __init__(self, candidates: Sequence[str]):
+        self.candidates: List[str] = [str(c) for c in candidates]
+        ids, owner = _trigrams([c.lower() for c in self.candidates])
+
+        # Sort by (trigram, candidate) and drop duplicate pairs: a CSR posting list per trigram
+        order = np.lexsort((owner, ids))
+        ids, owner = ids[order], owner[order]
+        keep = np.ones(len(ids), dtype=bool)
+        keep[1:] = (ids[1:] != ids[:-1]) | (owner[1:] != owner[:-1])
+        ids, owner = ids[keep], owner[keep]
+
+        self._postings = owner
+        self._terms, starts = np.unique(ids, return_index=True)
+        self._indptr = np.append(starts, len(ids))
+        self._sizes = np.bincount(owner, minlength=len(self.candidates))
+
+    @classmethod
+    def from_arrays(
+        cls,
+        candidates: Sequence[str],
+        terms: np.ndarray,
+        indptr: np.ndarray,
+        postings: np.ndarray,
+        sizes: np.ndarray,
+    ) -> "TrigramScorer":
+        """A scorer over a precomputed posting list (see candidate_index_file.py)."""
+        scorer = cls.__new__(cls)
+        scorer.candidates = candidates
+        scorer._terms, scorer._indptr, scorer._postings, scorer._sizes = terms, indptr, postings, sizes
+        return scorer
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        """The precomputed arrays, as accepted by from_arrays()."""
+        return {"terms": self._terms, "indptr": self._indptr, "postings": self._postings, "sizes": self._sizes}
+
+    def scores(self, query: str) -> np.ndarray:
+        """Dice similarity of `query` against every candidate."""
+        query_ids = np.unique(_trigrams([query.lower()])[0])
+        pos = np.searchsorted(self._terms, query_ids)
+        found = pos < len(self._terms)
+        found[found] = self._terms[pos[found]] == query_ids[found]
+        pos = pos[found]
+
+        if len(pos):
+            hits = np.concatenate([self._postings[self._indptr[p]:self._indptr[p + 1]] for p in pos])
+            shared = np.bincount(hits, minlength=len(self.candidates))
+        else:
+            shared = np.zeros(len(self.candidates), dtype=np.int64)
+
+        return 2.0 * shared / np.maximum(self._sizes + len(query_ids), 1)
+
+    def best(self, query: str, threshold: float = 0.0) -> Tuple[int, float]:
+        """Returns (index, score) of the first candidate with the highest score, or (-1, 0.0)."""
+        if not self.candidates:
+            return -1, 0.0
+        scores = self.scores(query)
+        i = int(np.argmax(scores))
+        if scores[i] <= 0.0:
+            return -1, 0.0
+        return i, float(scores[i])
+
+
+SCORERS: Dict[str, Type] = {
+    SequenceScorer.name: SequenceScorer,
+    TrigramScorer.name: TrigramScorer,
+}
+
+
+def build_scorer(engine: str, candidates: Sequence[str]):
+    try:
+        scorer_cls = SCORERS[engine]
+    except KeyError:
+        raise ValueError(f"Unknown scoring engine: {engine!r} (expected one of {sorted(SCORERS)})") from None
+    return scorer_cls(candidates)
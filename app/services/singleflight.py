@@ -0,0 +1,105 @@
+"""
+Single-flight coalescing of identical in-flight model calls.
+
+When several requests with the same key (same normalized input, candidates, prompt and model,
+see match_cache.make_cache_key) arrive while a model call for that key is still running, they
+wait for that call and share its result instead of making their own.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException = None
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sync_calls: Dict[Hashable, _Call] = {}
+        self._async_calls: Dict[Tuple[asyncio.AbstractEventLoop, Hashable], asyncio.Task] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Run fn() unless an identical call is already running in another thread.
+
+        Returns (result, shared) where shared is True if the result came from another caller's
+        call. Exceptions are shared the same way.
+        """
+        with self._lock:
+            call = self._sync_calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._sync_calls[key] = _Call()
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._sync_calls[key]
+            call.done.set()
+        return call.result, False
+
+    async def ado(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Async version of do(): await fn() unless an identical call is already in flight.
+
+        The call runs as its own task, so a caller that is cancelled (e.g. client disconnect)
+        doesn't cancel it for the others waiting on it.
+        """
+        loop = asyncio.get_running_loop()
+        task_key = (loop, key)
+        with self._lock:
+            task = self._async_calls.get(task_key)
+            shared = task is not None
+            if shared:
+                self.coalesced += 1
+            else:
+                task = loop.create_task(fn())
+                self._async_calls[task_key] = task
+                self.leaders += 1
+                task.add_done_callback(lambda t: self._forget(task_key, t))
+
+        return await asyncio.shield(task), shared
+
+    def _forget(self, task_key, task: asyncio.Task) -> None:
+        with self._lock:
+            self._async_calls.pop(task_key, None)
+        if not task.cancelled():
+            # Mark the exception as retrieved even if every waiter has gone away
+            task.exception()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "model_calls": self.leaders,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._sync_calls) + len(self._async_calls),
+            }
+
+
+@lru_cache(maxsize=1)
+def get_singleflight() -> SingleFlight:
+    return SingleFlight()
@@ -0,0 +1,168 @@
+"""
+Startup warm-up, reported by GET /ready.
+
+Without it, the first requests after a deploy pay for everything that is built lazily: prompt
+files, candidate set indexes, the model backend import and client construction, and the TLS
+handshake and connection pool of the model's HTTP client. run_warmup does that work once at
+startup, as a background task so /health answers straight away:
+
+1. settings: parse the environment
+2. prompts: read and compile every registered prompt (PROMPT_DIR, PROMPT_PATH, PACKED_PROMPT_PATH)
+3. candidate_sets: map the CANDIDATE_INDEX_FILES sets and build their indexes and models
+4. model: import the model backend and construct its client(s)
+5. connections: one tiny model call per client (per deployment for a DeploymentPool), which
+   opens and primes its connection pool
+6. synthetic_match: one match through the full amatch_string_with_langchain pipeline
+
+Steps 1-4 are configuration: if one fails, warm-up has failed and /ready stays 503. Steps 5-6 need
+the model service; if they fail the error is recorded but the worker is still ready, since
+requests have their own retries, failover and deadline fallback. Steps 5-6 run only with
+WARMUP_MODEL_CALLS=true; with Azure they cost one small request per client per worker start.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional
+
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+PENDING, RUNNING, READY, FAILED = "pending", "running", "ready", "failed"
+
+_SYNTHETIC_INPUT = "Warm-up Check Council"
+_SYNTHETIC_CANDIDATES = ["Warm-up Check Council", "Warm-up Check Trust", "Warm-up Check College"]
+
+
+class _RequiredStepFailed(Exception):
+    pass
+
+
+@dataclass
+class WarmupStep:
+    name: str
+    seconds: float
+    ok: bool
+    # Whether a failure of this step keeps the worker not-ready
+    required: bool
+    error: Optional[str] = None
+
+
+@dataclass
+class WarmupState:
+    status: str = PENDING
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    steps: List[WarmupStep] = field(default_factory=list)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    @property
+    def ready(self) -> bool:
+        return self.status == READY
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            seconds = None
+            if self.started_at is not None:
+                seconds = round((self.finished_at or time.time()) - self.started_at, 4)
+            return {"status": self.status, "seconds": seconds, "steps": [asdict(s) for s in self.steps]}
+
+
+@lru_cache(maxsize=1)
+def get_warmup_state() -> WarmupState:
+    return WarmupState()
+
+
+def _warm_prompts() -> None:
+    from app.services.prompt_registry import get_packed_prompt_registry, get_prompt_registry
+
+    registry = get_prompt_registry()
+    for prompt in registry.known_prompts():
+        registry.get(prompt)
+    settings = get_settings()
+    if settings.prompt_path.strip():
+        registry.get(settings.prompt_path.strip())
+    if settings.packed_prompt_path.strip():
+        get_packed_prompt_registry().get(settings.packed_prompt_path)
+
+
+def _warm_candidate_sets() -> None:
+    from app.services.candidate_sets import get_candidate_set_registry
+
+    registry = get_candidate_set_registry()
+    for name in registry.names():
+        cset = registry.get(name)
+        # Everything a request against the set would otherwise build on first use
+        _ = (cset.index, cset.prematch, cset.model)
+
+
+def _build_model():
+    from app.services.model_factory import get_chat_model
+
+    return get_chat_model(candidates=_SYNTHETIC_CANDIDATES)
+
+
+async def _prime_connections(model) -> None:
+    from app.services.langchain_matcher import _ainvoke_once
+
+    messages = [SystemMessage(content="Reply with OK."), HumanMessage(content="OK")]
+    # A DeploymentPool has one client (and connection pool) per deployment
+    clients = [member.model for member in getattr(model, "members", [])] or [model]
+    await asyncio.gather(*(_ainvoke_once(client, messages) for client in clients))
+
+
+async def _synthetic_match(model) -> None:
+    from app.services.langchain_matcher import amatch_string_with_langchain
+
+    await amatch_string_with_langchain(_SYNTHETIC_INPUT, _SYNTHETIC_CANDIDATES, model)
+
+
+async def _step(state: WarmupState, name: str, required: bool, fn: Callable[[], Any]) -> Any:
+    started = time.perf_counter()
+    error = None
+    result = None
+    try:
+        result = fn()
+        if asyncio.iscoroutine(result):
+            result = await result
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        logger.warning("Warm-up step %s failed: %s", name, error)
+    with state._lock:
+        state.steps.append(WarmupStep(name, round(time.perf_counter() - started, 4), error is None, required, error))
+    if error is not None and required:
+        raise _RequiredStepFailed(name)
+    return result
+
+
+async def run_warmup(state: Optional[WarmupState] = None) -> WarmupState:
+    """Run the warm-up steps, updating `state` (by default the process-wide one) as they finish."""
+    state = state or get_warmup_state()
+    with state._lock:
+        state.status, state.started_at, state.finished_at, state.steps = RUNNING, time.time(), None, []
+
+    try:
+        # Blocking steps run in a thread so the event loop keeps serving /health and /ready
+        await _step(state, "settings", True, lambda: asyncio.to_thread(get_settings))
+        await _step(state, "prompts", True, lambda: asyncio.to_thread(_warm_prompts))
+        await _step(state, "candidate_sets", True, lambda: asyncio.to_thread(_warm_candidate_sets))
+        model = await _step(state, "model", True, lambda: asyncio.to_thread(_build_model))
+        if get_settings().warmup_model_calls:
+            await _step(state, "connections", False, lambda: _prime_connections(model))
+            await _step(state, "synthetic_match", False, lambda: _synthetic_match(model))
+        status = READY
+    except _RequiredStepFailed:
+        status = FAILED
+
+    with state._lock:
+        state.status, state.finished_at = status, time.time()
+    logger.info("Warm-up %s in %.2fs", status, state.finished_at - state.started_at)
+    return state
@@ -0,0 +1,107 @@
+"""
+Content negotiation for the match endpoints: JSON (default) or MessagePack.
+
+Requests are decoded according to their Content-Type and responses encoded according to the
+Accept header. MessagePack (application/msgpack, also accepted as application/x-msgpack and
+application/vnd.msgpack) is a compact binary encoding of the same objects as the JSON bodies,
+and is cheaper to decode than JSON for large candidate lists.
+
+JSON responses are serialized by pydantic-core (model_dump_json) rather than through FastAPI's
+response_model path, which re-validates the response and walks it with jsonable_encoder
+before json.dumps. `python -m benchmarks.wire` compares payload sizes and encode/decode times.
+"""
+
+from __future__ import annotations
+
+from typing import Dict, Optional, Type, TypeVar
+
+import msgpack
+from fastapi import Request, Response
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel, ValidationError
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+_MSGPACK_TYPES = {MSGPACK, "application/x-msgpack", "application/vnd.msgpack"}
+
+M = TypeVar("M", bound=BaseModel)
+
+
+def _media_type(header: str) -> str:
+    return header.split(";", 1)[0].strip().lower()
+
+
+def is_msgpack(content_type: Optional[str]) -> bool:
+    return _media_type(content_type or "") in _MSGPACK_TYPES
+
+
+def accepts_msgpack(accept: Optional[str]) -> bool:
+    """Whether the Accept header ranks MessagePack above JSON (explicit ties go to JSON)."""
+    msgpack_q = json_q = 0.0
+    for item in (accept or "").split(","):
+        media_type, *params = (part.strip() for part in item.split(";"))
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        media_type = media_type.lower()
+        if media_type in _MSGPACK_TYPES:
+            msgpack_q = max(msgpack_q, q)
+        elif media_type == JSON:
+            json_q = max(json_q, q)
+    return msgpack_q > json_q
+
+
+def _body_error(error_type: str, message: str) -> RequestValidationError:
+    return RequestValidationError([{"type": error_type, "loc": ("body",), "msg": message, "input": None}])
+
+
+async def parse_body(request: Request, model: Type[M]) -> M:
+    """
+    The request body decoded per its Content-Type and validated as `model`.
+
+    Errors are raised as RequestValidationError, so they get FastAPI's usual 422 response.
+    """
+    body = await request.body()
+    binary = is_msgpack(request.headers.get("content-type"))
+    try:
+        if not binary:
+            # pydantic-core validates the JSON bytes directly, without building a dict first
+            return model.model_validate_json(body)
+        try:
+            data = msgpack.unpackb(body, raw=False)
+        except (ValueError, msgpack.UnpackException) as e:
+            detail = f": {e}" if str(e) else ""
+            raise _body_error("body_invalid", f"Invalid MessagePack body{detail}")
+        return model.model_validate(data)
+    except ValidationError as e:
+        errors = e.errors(include_url=False, include_context=False)
+        if errors[0]["type"] == "json_invalid":
+            raise _body_error("body_invalid", f"Invalid JSON body: {errors[0]['msg']}")
+        raise RequestValidationError([{**error, "loc": ("body", *error["loc"])} for error in errors])
+
+
+def encode_response(request: Request, content: BaseModel, headers: Optional[Dict[str, str]] = None) -> Response:
+    """`content` as MessagePack if the client asks for it, else JSON."""
+    if accepts_msgpack(request.headers.get("accept")):
+        return Response(msgpack.packb(content.model_dump(), use_bin_type=True), media_type=MSGPACK, headers=headers)
+    return Response(content.model_dump_json(), media_type=JSON, headers=headers)
+
+
+def openapi_body(model: Type[BaseModel]) -> dict:
+    """openapi_extra documenting a request body that parse_body reads in either encoding."""
+    schema = model.model_json_schema()
+    return {
+        "requestBody": {
+            "required": True,
+            "content": {JSON: {"schema": schema}, MSGPACK: {"schema": schema}},
+        }
+    }
+
+
+# responses= entry documenting the MessagePack alternative of a JSON response
+MSGPACK_RESPONSE = {200: {"content": {MSGPACK: {}}}}
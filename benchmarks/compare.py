@@ -0,0 +1,72 @@
+"""
+Compare two benchmark JSON files written by benchmarks.run.
+
+    python -m benchmarks.compare baseline.json candidate.json
+
+Prints, for every candidate list size and benchmark, the baseline and new value of each metric
+and the ratio new / baseline (above 1 means slower or bigger, except for throughput).
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+from typing import Dict, List, Optional
+
+METRICS = ("p50_ms", "p95_ms", "p99_ms", "throughput_per_s", "setup_ms", "overhead_p50_ms", "peak_memory_bytes")
+
+
+def _by_size(report: dict) -> Dict[int, dict]:
+    return {r["candidates"]: r for r in report["results"]}
+
+
+def compare(baseline: dict, candidate: dict) -> List[dict]:
+    rows = []
+    old_sizes, new_sizes = _by_size(baseline), _by_size(candidate)
+    for size in sorted(set(old_sizes) & set(new_sizes)):
+        for bench in ("mock_model", "pipeline"):
+            old, new = old_sizes[size].get(bench, {}), new_sizes[size].get(bench, {})
+            for metric in METRICS:
+                if metric not in old or metric not in new:
+                    continue
+                ratio = new[metric] / old[metric] if old[metric] else None
+                rows.append(
+                    {
+                        "candidates": size,
+                        "bench": bench,
+                        "metric": metric,
+                        "old": old[metric],
+                        "new": new[metric],
+                        "ratio": ratio,
+                    }
+                )
+    return rows
+
+
+def _fmt(value: Optional[float]) -> str:
+    if value is None:
+        return "-"
+    return f"{value:,.3f}" if abs(value) < 1000 else f"{value:,.0f}"
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files.")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    args = parser.parse_args(argv)
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.candidate, encoding="utf-8") as f:
+        candidate = json.load(f)
+
+    print(f"{'candidates':>10}  {'bench':<10}  {'metric':<18}  {'old':>14}  {'new':>14}  {'ratio':>7}")
+    for row in compare(baseline, candidate):
+        print(
+            f"{row['candidates']:>10}  {row['bench']:<10}  {row['metric']:<18}  "
+            f"{_fmt(row['old']):>14}  {_fmt(row['new']):>14}  {_fmt(row['ratio']):>7}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+"""
+Local stand-in for an Azure OpenAI chat-completions deployment.
+
+Speaks enough of the Azure REST API for AzureChatOpenAI to use it
+(POST /openai/deployments/{deployment}/chat/completions), with configurable latency and a
+configurable share of 429 responses, so rate limiting, failover and load behaviour can be
+exercised offline.
+
+With prefix_cache=True it also imitates Azure's prompt caching in its usage reports: a prompt of
+1024+ tokens whose first 1024 + n*128 tokens were seen in an earlier request reports those as
+prompt_tokens_details.cached_tokens. Tokens are estimated at 4 characters each.
+
+In tests:
+
+    with FakeAzureOpenAIServer(latency_seconds=0.05, rate_429=0.2) as server:
+        model = AzureChatOpenAI(azure_endpoint=server.url, ...)
+
+From the command line:
+
+    python -m benchmarks.fake_azure_openai --port 8100 --latency-ms 300 --rate-429 0.05
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional
+
+_PATH_RE = re.compile(r"^/openai/deployments/(?P<deployment>[^/]+)/chat/completions")
+
+# Azure caches prompts of at least 1024 tokens, in 128-token increments
+_CACHE_MIN_TOKENS = 1024
+_CACHE_BLOCK_TOKENS = 128
+_MAX_CACHED_PREFIXES = 100_000
+
+
+def echo_answer(messages: List[dict]) -> str:
+    """Default answer: the last user message, i.e. the input name matches itself."""
+    for message in reversed(messages):
+        if message.get("role") == "user":
+            return str(message.get("content", ""))
+    return "None"
+
+
+class FakeAzureOpenAIServer:
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency_seconds: float = 0.0,
+        latency_jitter_seconds: float = 0.0,
+        rate_429: float = 0.0,
+        retry_after_seconds: float = 0.05,
+        rate_500: float = 0.0,
+        answer: Callable[[List[dict]], str] = echo_answer,
+        seed: Optional[int] = None,
+        prefix_cache: bool = False,
+    ):
+        self.latency_seconds = latency_seconds
+        self.latency_jitter_seconds = latency_jitter_seconds
+        self.rate_429 = rate_429
+        self.retry_after_seconds = retry_after_seconds
+        self.rate_500 = rate_500
+        self.answer = answer
+        # Fixed cached_tokens for every response; prefix_cache computes them instead
+        self.cached_prompt_tokens = 0
+        self.prefix_cache = prefix_cache
+        self._prefixes: set = set()
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.throttled = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "throttled": self.throttled,
+                "errors": self.errors,
+                "max_in_flight": self.max_in_flight,
+            }
+
+    def _draw(self) -> float:
+        with self._lock:
+            return self._random.random()
+
+    def _cached_tokens(self, prompt: str, prompt_tokens: int) -> int:
+        """Tokens of `prompt` a provider prefix cache would have served (see the module docstring)."""
+        if not self.prefix_cache:
+            return min(self.cached_prompt_tokens, prompt_tokens)
+        block = _CACHE_BLOCK_TOKENS * 4
+        # A hash chain over the blocks: one digest per prefix, without rehashing the prefix each time
+        digests, digest = [], b""
+        for end in range(block, len(prompt) + 1, block):
+            digest = hashlib.sha1(digest + prompt[end - block : end].encode("utf-8")).digest()
+            digests.append(digest)
+        with self._lock:
+            seen = 0
+            while seen < len(digests) and digests[seen] in self._prefixes:
+                seen += 1
+            if len(self._prefixes) > _MAX_CACHED_PREFIXES:
+                self._prefixes.clear()
+            self._prefixes.update(digests)
+        cached = seen * _CACHE_BLOCK_TOKENS
+        return cached if cached >= _CACHE_MIN_TOKENS else 0
+
+    def _latency(self) -> float:
+        with self._lock:
+            jitter = self._random.expovariate(1 / self.latency_jitter_seconds) if self.latency_jitter_seconds else 0.0
+        return self.latency_seconds + jitter
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):  # noqa: A002 - silence per-request logging
+                pass
+
+            def _send_json(self, status: int, body: dict, headers: Optional[Dict[str, str]] = None):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                payload = json.loads(self.rfile.read(length) or b"{}")
+
+                match = _PATH_RE.match(self.path)
+                if match is None:
+                    self._send_json(404, {"error": {"code": "404", "message": "Resource not found"}})
+                    return
+
+                with fake._lock:
+                    fake.requests += 1
+                    fake.in_flight += 1
+                    fake.max_in_flight = max(fake.max_in_flight, fake.in_flight)
+                try:
+                    self._complete(match.group("deployment"), payload)
+                finally:
+                    with fake._lock:
+                        fake.in_flight -= 1
+
+            def _complete(self, deployment: str, payload: dict):
+                if fake.rate_429 and fake._draw() < fake.rate_429:
+                    with fake._lock:
+                        fake.throttled += 1
+                    self._send_json(
+                        429,
+                        {"error": {"code": "429", "message": "Requests to the deployment have exceeded the rate limit."}},
+                        headers={
+                            "retry-after-ms": str(int(fake.retry_after_seconds * 1000)),
+                            "retry-after": str(max(1, int(round(fake.retry_after_seconds)))),
+                        },
+                    )
+                    return
+
+                time.sleep(fake._latency())
+
+                if fake.rate_500 and fake._draw() < fake.rate_500:
+                    with fake._lock:
+                        fake.errors += 1
+                    self._send_json(500, {"error": {"code": "500", "message": "Internal server error"}})
+                    return
+
+                messages = payload.get("messages", [])
+                content = fake.answer(messages)
+                prompt = "".join(str(m.get("content", "")) for m in messages)
+                prompt_tokens = len(prompt) // 4 + 1
+                completion_tokens = len(content) // 4 + 1
+                self._send_json(
+                    200,
+                    {
+                        "id": f"chatcmpl-{uuid.uuid4().hex}",
+                        "object": "chat.completion",
+                        "created": int(time.time()),
+                        "model": deployment,
+                        "choices": [
+                            {
+                                "index": 0,
+                                "message": {"role": "assistant", "content": content},
+                                "finish_reason": "stop",
+                            }
+                        ],
+                        "usage": {
+                            "prompt_tokens": prompt_tokens,
+                            "completion_tokens": completion_tokens,
+                            "total_tokens": prompt_tokens + completion_tokens,
+                            "prompt_tokens_details": {
+                                "cached_tokens": fake._cached_tokens(prompt, prompt_tokens)
+                            },
+                        },
+                    },
+                )
+
+        return Handler
+
+    def start(self) -> "FakeAzureOpenAIServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> "FakeAzureOpenAIServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Fixed latency per completion.")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Mean of extra exponential latency.")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Share of requests answered with 429.")
+    parser.add_argument("--rate-500", type=float, default=0.0, help="Share of requests answered with 500.")
+    parser.add_argument("--prefix-cache", action="store_true", help="Report cached tokens for repeated prefixes.")
+    args = parser.parse_args(argv)
+
+    server = FakeAzureOpenAIServer(
+        host=args.host,
+        port=args.port,
+        latency_seconds=args.latency_ms / 1000,
+        latency_jitter_seconds=args.jitter_ms / 1000,
+        rate_429=args.rate_429,
+        rate_500=args.rate_500,
+        prefix_cache=args.prefix_cache,
+    )
+    print(f"Fake Azure OpenAI listening on {server.url}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+"""
+Load test: /match at a series of target request rates, against a real uvicorn worker.
+
+For each backend (--backends mock,azure) the harness starts one uvicorn worker in a child
+process; for azure the worker talks to an in-process FakeAzureOpenAIServer with the given
+latency (fixed + exponential jitter) and 429 / 500 rates, so the Azure client path (LangChain,
+openai SDK, rate limiter, retries) is exercised without a real deployment. It waits for
+/ready, then drives POST /match at each rate in --rates for --duration seconds.
+
+The load is closed-loop: --concurrency clients each send a request and wait for its answer
+before sending the next, paced so that together they send at the target rate. Once the worker
+can't keep up every client is waiting on a response, requests fall behind schedule and the
+achieved rate drops below the target: that's the saturation point. Latency is measured from
+the scheduled send time, so time spent waiting for a free client counts against the worker
+rather than disappearing from the percentiles.
+
+Each request draws a candidate list size from --candidates (e.g. 20,50,200) and a
+supplier-style query from benchmarks/names.py whose source is in the list. Per step it reports
+achieved throughput, p50/p95/p99 latency, errors by HTTP status or exception, answer tiers and
+degraded (deadline fallback) answers, prompt tokens and how many of them the fake server's
+imitation of prefix caching reported as cached, plus the fake server's request and 429 counts:
+
+    python -m benchmarks.load --backends mock,azure --rates 10,25,50,100 --duration 20 \\
+        --latency-ms 300 --jitter-ms 200 --rate-429 0.02 --out load.json
+
+max_sustained_rps is the highest target rate achieved to within 5% with under 1% errors (and
+p99 under --max-p99-ms, if given). The result cache and single-flight are switched off in the
+worker (unless set in the environment) so every request does the work. --url targets an
+already running server instead of starting workers.
+
+The load generator shares the machine with the worker, so compare runs on the same host.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional, Sequence
+
+import httpx
+
+from benchmarks.fake_azure_openai import FakeAzureOpenAIServer
+from benchmarks.names import generate_candidates, generate_queries
+from benchmarks.run import _git_commit, _percentile
+
+DEFAULT_RATES = (10, 25, 50, 100)
+DEFAULT_CANDIDATES = (20, 50, 200)
+BACKENDS = ("mock", "azure")
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def build_requests(candidate_sizes: Sequence[int], n: int, seed: int = 0) -> List[bytes]:
+    """`n` encoded /match bodies with candidate lists drawn from `candidate_sizes`."""
+    rng = random.Random(seed)
+    pool = generate_candidates(max(candidate_sizes) * 4, seed=seed)
+    bodies = []
+    for query, _, source in generate_queries(pool, n, seed=seed):
+        others = rng.sample([c for c in pool if c != source], rng.choice(candidate_sizes) - 1)
+        candidates = others + [source]
+        rng.shuffle(candidates)
+        bodies.append(json.dumps({"input_string": query, "candidates": candidates}).encode("utf-8"))
+    return bodies
+
+
+async def run_step(
+    client: httpx.AsyncClient, bodies: Sequence[bytes], rate: float, duration: float, concurrency: int
+) -> Dict[str, object]:
+    """Send POST /match at `rate` per second for `duration` seconds from `concurrency` clients."""
+    total = max(1, int(rate * duration))
+    interval = 1 / rate
+    latencies: List[float] = []
+    errors: Counter = Counter()
+    tiers: Counter = Counter()
+    degraded = 0
+    prompt_tokens = cached_prompt_tokens = 0
+    next_index = 0
+    last_send = 0.0
+    start = time.perf_counter()
+
+    async def user() -> None:
+        nonlocal next_index, last_send, degraded, prompt_tokens, cached_prompt_tokens
+        while next_index < total:
+            i = next_index
+            next_index += 1
+            scheduled = start + i * interval
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            last_send = time.perf_counter()
+            try:
+                response = await client.post(
+                    "/match", content=bodies[i % len(bodies)], headers={"Content-Type": "application/json"}
+                )
+            except httpx.HTTPError as e:
+                errors[type(e).__name__] += 1
+                continue
+            if response.status_code != 200:
+                errors[str(response.status_code)] += 1
+                continue
+            latencies.append(time.perf_counter() - scheduled)
+            body = response.json()
+            tiers[body.get("tier") or "unknown"] += 1
+            degraded += bool(body.get("degraded"))
+            prompt_tokens += body.get("prompt_tokens") or 0
+            cached_prompt_tokens += body.get("cached_prompt_tokens") or 0
+
+    await asyncio.gather(*(user() for _ in range(min(concurrency, total))))
+    elapsed = time.perf_counter() - start
+    # Over the sending window: a worker that keeps up sends on schedule, one that doesn't falls behind
+    window = max(last_send - start + interval, total * interval)
+
+    ordered = sorted(latencies)
+    failed = sum(errors.values())
+    return {
+        "target_rps": rate,
+        "requests": total,
+        "seconds": round(elapsed, 3),
+        "achieved_rps": round(len(latencies) / window, 2),
+        "ok": len(latencies),
+        "error_rate": round(failed / total, 4),
+        "errors": dict(errors),
+        "p50_ms": round(_percentile(ordered, 0.50) * 1000, 2) if ordered else None,
+        "p95_ms": round(_percentile(ordered, 0.95) * 1000, 2) if ordered else None,
+        "p99_ms": round(_percentile(ordered, 0.99) * 1000, 2) if ordered else None,
+        "max_ms": round(ordered[-1] * 1000, 2) if ordered else None,
+        "tiers": dict(tiers),
+        "degraded": degraded,
+        "prompt_tokens": prompt_tokens,
+        "cached_prompt_tokens": cached_prompt_tokens,
+    }
+
+
+def sustained(step: Dict[str, object], max_p99_ms: Optional[float] = None) -> bool:
+    """Whether the worker kept up with the step's target rate."""
+    if step["achieved_rps"] < 0.95 * step["target_rps"] or step["error_rate"] > 0.01:
+        return False
+    return max_p99_ms is None or (step["p99_ms"] is not None and step["p99_ms"] <= max_p99_ms)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@contextmanager
+def start_worker(env: Dict[str, str], timeout: float = 60.0) -> Iterator[str]:
+    """One uvicorn worker for app.main:app with `env` added to the environment; yields its URL."""
+    port = _free_port()
+    worker_env = {**os.environ, **env}
+    worker_env.setdefault("MATCH_CACHE_ENABLED", "false")
+    worker_env.setdefault("SINGLEFLIGHT_ENABLED", "false")
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning",
+         "--no-access-log"],
+        cwd=_ROOT,
+        env=worker_env,
+    )
+    url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + timeout
+        while True:
+            if proc.poll() is not None:
+                raise RuntimeError(f"Worker exited with status {proc.returncode}")
+            try:
+                if httpx.get(f"{url}/ready", timeout=1.0).status_code == 200:
+                    break
+            except httpx.HTTPError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"Worker not ready after {timeout}s")
+            time.sleep(0.1)
+        yield url
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def _backend_env(backend: str, fake: Optional[FakeAzureOpenAIServer]) -> Dict[str, str]:
+    if backend == "mock":
+        return {"USE_MOCK_LLM": "true"}
+    return {
+        "USE_MOCK_LLM": "false",
+        "AZURE_OPENAI_ENDPOINT": fake.url,
+        "AZURE_OPENAI_KEY": "load-test",
+        "AZURE_OPENAI_DEPLOYMENT_NAME": "load-test",
+        "AZURE_OPENAI_API_VERSION": "2024-02-15-preview",
+        "AZURE_DEPLOYMENTS": "",
+    }
+
+
+async def _run_steps(
+    url: str, bodies: Sequence[bytes], rates: Sequence[float], duration: float, concurrency: int, timeout: float,
+    fake: Optional[FakeAzureOpenAIServer] = None,
+) -> List[Dict[str, object]]:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    steps = []
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=timeout) as client:
+        for rate in rates:
+            before = fake.stats() if fake is not None else None
+            print(f"{url}: {rate} req/s for {duration}s...", file=sys.stderr)
+            step = await run_step(client, bodies, rate, duration, concurrency)
+            if fake is not None:
+                after = fake.stats()
+                step["model_calls"] = after["requests"] - before["requests"]
+                step["model_throttled"] = after["throttled"] - before["throttled"]
+            steps.append(step)
+    return steps
+
+
+def _summary(steps: List[Dict[str, object]], max_p99_ms: Optional[float]) -> Dict[str, object]:
+    kept_up = [s["target_rps"] for s in steps if sustained(s, max_p99_ms)]
+    return {
+        "max_sustained_rps": max(kept_up) if kept_up else None,
+        "peak_achieved_rps": max((s["achieved_rps"] for s in steps), default=None),
+        "steps": steps,
+    }
+
+
+def run(
+    backends: Sequence[str] = BACKENDS,
+    rates: Sequence[float] = DEFAULT_RATES,
+    duration: float = 10.0,
+    concurrency: int = 500,
+    candidate_sizes: Sequence[int] = DEFAULT_CANDIDATES,
+    latency_ms: float = 300.0,
+    jitter_ms: float = 100.0,
+    rate_429: float = 0.0,
+    rate_500: float = 0.0,
+    timeout: float = 30.0,
+    max_p99_ms: Optional[float] = None,
+    url: Optional[str] = None,
+    seed: int = 0,
+) -> Dict[str, object]:
+    bodies = build_requests(candidate_sizes, n=max(200, int(max(rates) * duration)), seed=seed)
+    results: Dict[str, object] = {}
+    if url is not None:
+        results["external"] = _summary(asyncio.run(_run_steps(url, bodies, rates, duration, concurrency, timeout)), max_p99_ms)
+
+    for backend in backends if url is None else ():
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend {backend!r}, expected one of {', '.join(BACKENDS)}")
+        with ExitStack() as stack:
+            fake = None
+            if backend == "azure":
+                fake = stack.enter_context(
+                    FakeAzureOpenAIServer(
+                        latency_seconds=latency_ms / 1000,
+                        latency_jitter_seconds=jitter_ms / 1000,
+                        rate_429=rate_429,
+                        rate_500=rate_500,
+                        seed=seed,
+                        prefix_cache=True,
+                    )
+                )
+            worker_url = stack.enter_context(start_worker(_backend_env(backend, fake)))
+            steps = asyncio.run(_run_steps(worker_url, bodies, rates, duration, concurrency, timeout, fake))
+            results[backend] = _summary(steps, max_p99_ms)
+
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "seed": seed,
+            "duration_s": duration,
+            "concurrency": concurrency,
+            "candidate_sizes": list(candidate_sizes),
+            "fake_model": {
+                "latency_ms": latency_ms, "jitter_ms": jitter_ms, "rate_429": rate_429, "rate_500": rate_500,
+            },
+        },
+        "results": results,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Load test POST /match at increasing request rates.")
+    parser.add_argument("--backends", default=",".join(BACKENDS), help="Model backends to start workers for.")
+    parser.add_argument("--rates", default=",".join(str(r) for r in DEFAULT_RATES), help="Target requests/s.")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per rate.")
+    parser.add_argument("--concurrency", type=int, default=500, help="Concurrent clients.")
+    parser.add_argument(
+        "--candidates", default=",".join(str(c) for c in DEFAULT_CANDIDATES), help="Candidate list sizes to draw from."
+    )
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="Fixed latency of the fake model.")
+    parser.add_argument("--jitter-ms", type=float, default=100.0, help="Mean of extra exponential latency.")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Share of model calls answered with 429.")
+    parser.add_argument("--rate-500", type=float, default=0.0, help="Share of model calls answered with 500.")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Client timeout per request.")
+    parser.add_argument("--max-p99-ms", type=float, default=None, help="p99 above this counts as not sustained.")
+    parser.add_argument("--url", default=None, help="Load an already running server instead of starting workers.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="-", help="Output JSON file, or - for stdout.")
+    args = parser.parse_args(argv)
+
+    report = run(
+        backends=[b.strip() for b in args.backends.split(",") if b.strip()],
+        rates=[float(r) for r in args.rates.split(",") if r.strip()],
+        duration=args.duration,
+        concurrency=args.concurrency,
+        candidate_sizes=[int(c) for c in args.candidates.split(",") if c.strip()],
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        rate_429=args.rate_429,
+        rate_500=args.rate_500,
+        timeout=args.timeout,
+        max_p99_ms=args.max_p99_ms,
+        url=args.url,
+        seed=args.seed,
+    )
+    text = json.dumps(report, indent=2)
+    if args.out == "-":
+        print(text)
+    else:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Synthetic UK public-sector organisation names for benchmarks.
+
+generate_candidates() builds a deduplicated canonical buyer list of any size from templates
+(councils, NHS trusts, departments, universities, police forces, schools...), and
+generate_queries() derives supplier-style inputs from it: exact copies, typos, acronyms,
+legal-suffix and case variants, plus unrelated names that should match nothing.
+
+Everything is driven by a seeded random.Random, so a given (size, seed) always produces the
+same names.
+"""
+
+from __future__ import annotations
+
+import random
+from typing import List, Tuple
+
+_PLACES = [
+    "Aberdeen", "Barnsley", "Bath", "Bedford", "Birmingham", "Blackpool", "Bolton", "Bradford",
+    "Brighton", "Bristol", "Bromley", "Cambridge", "Cardiff", "Carlisle", "Chelmsford", "Chester",
+    "Colchester", "Coventry", "Croydon", "Derby", "Doncaster", "Dorset", "Dundee", "Durham",
+    "Ealing", "Edinburgh", "Enfield", "Exeter", "Gateshead", "Glasgow", "Gloucester", "Hackney",
+    "Halton", "Harrow", "Hereford", "Hull", "Ipswich", "Kent", "Kirklees", "Lambeth", "Lancaster",
+    "Leeds", "Leicester", "Lincoln", "Liverpool", "Luton", "Manchester", "Medway", "Merton",
+    "Middlesbrough", "Newcastle", "Newport", "Norfolk", "Northampton", "Norwich", "Nottingham",
+    "Oldham", "Oxford", "Peterborough", "Plymouth", "Poole", "Portsmouth", "Preston", "Reading",
+    "Rochdale", "Rotherham", "Rutland", "Salford", "Sheffield", "Slough", "Solihull", "Southampton",
+    "Southwark", "Stockport", "Sunderland", "Surrey", "Swansea", "Swindon", "Telford", "Wakefield",
+    "Walsall", "Warrington", "Wigan", "Wirral", "Wolverhampton", "Worcester", "Wrexham", "York",
+]
+_DIRECTIONS = ["", "North ", "South ", "East ", "West ", "Central ", "Greater ", "Mid "]
+_TOPICS = [
+    "Education", "Transport", "Health and Social Care", "Work and Pensions", "Culture, Media and Sport",
+    "Environment, Food and Rural Affairs", "Business and Trade", "Energy Security and Net Zero",
+    "Levelling Up, Housing and Communities", "Science, Innovation and Technology", "Justice",
+    "International Development", "Digital Services", "Public Procurement", "Estates and Facilities",
+]
+_TEMPLATES = [
+    "{place} City Council",
+    "{place} County Council",
+    "{place} Borough Council",
+    "{place} District Council",
+    "London Borough of {place}",
+    "{place} Metropolitan Borough Council",
+    "{place} Teaching Hospitals NHS Foundation Trust",
+    "{place} and District NHS Trust",
+    "{place} Integrated Care Board",
+    "{place} Clinical Commissioning Group",
+    "University of {place}",
+    "{place} College",
+    "{place} Academy Trust",
+    "{place} Primary School",
+    "{place} Police",
+    "{place} Fire and Rescue Service",
+    "{place} Housing Association",
+    "{place} Community Interest Company",
+    "Department for {topic}",
+    "Office for {topic}",
+    "{place} Office for {topic}",
+    "{topic} Agency",
+    "{place} {topic} Partnership",
+]
+_SUFFIXES = ["Ltd", "Limited", "PLC", "LLP", "CIC"]
+_UNRELATED = [
+    "Acme Widgets", "Quantum Bakery", "Loch Ness Monster Society", "Random Organization XYZ",
+    "Blue Sky Consulting", "Northern Lights Trading", "N/A", "Unknown Buyer",
+]
+_SMALL_WORDS = {"of", "and", "for", "the", "&"}
+
+
+def generate_candidates(size: int, seed: int = 0) -> List[str]:
+    """`size` distinct canonical organisation names."""
+    rng = random.Random(seed)
+    names = {}
+    while len(names) < size:
+        template = rng.choice(_TEMPLATES)
+        place = rng.choice(_DIRECTIONS) + rng.choice(_PLACES)
+        name = template.format(place=place, topic=rng.choice(_TOPICS))
+        if name in names:
+            # The templates give ~35k distinct names; regional offices extend that for large sizes
+            name = f"{name} ({rng.choice(_PLACES)} Office)"
+        names[name] = None
+    return list(names)
+
+
+def typo(name: str, rng: random.Random) -> str:
+    """One random character-level edit: drop, duplicate, swap or substitute."""
+    if len(name) < 4:
+        return name
+    i = rng.randrange(1, len(name) - 1)
+    kind = rng.randrange(4)
+    if kind == 0:
+        return name[:i] + name[i + 1 :]
+    if kind == 1:
+        return name[:i] + name[i] + name[i:]
+    if kind == 2:
+        return name[: i - 1] + name[i] + name[i - 1] + name[i + 1 :]
+    return name[:i] + rng.choice("abcdefghijklmnopqrstuvwxyz") + name[i + 1 :]
+
+
+def acronym(name: str) -> str:
+    """Initials of the significant words: "Department for Education" -> "DE"."""
+    base = name.split(" (")[0].replace(",", "")
+    return "".join(w[0].upper() for w in base.split() if w.lower() not in _SMALL_WORDS)
+
+
+VARIANTS = ("exact", "typo", "acronym", "suffix", "case", "unrelated")
+
+
+def make_query(name: str, variant: str, rng: random.Random) -> str:
+    if variant == "exact":
+        return name
+    if variant == "typo":
+        return typo(name, rng)
+    if variant == "acronym":
+        return acronym(name)
+    if variant == "suffix":
+        return f"{name} {rng.choice(_SUFFIXES)}"
+    if variant == "case":
+        return name.upper() if rng.random() < 0.5 else name.lower()
+    if variant == "unrelated":
+        return f"{rng.choice(_UNRELATED)} {rng.randrange(10_000)}"
+    raise ValueError(f"Unknown variant: {variant}")
+
+
+def generate_queries(candidates: List[str], n: int, seed: int = 0) -> List[Tuple[str, str, str]]:
+    """
+    `n` (query, variant, source candidate) triples, cycling through VARIANTS.
+
+    For "unrelated" queries the source is the candidate the variant was drawn for, not a
+    correct answer.
+    """
+    rng = random.Random(seed + 1)
+    queries = []
+    for i in range(n):
+        variant = VARIANTS[i % len(VARIANTS)]
+        source = rng.choice(candidates)
+        queries.append((make_query(source, variant, rng), variant, source))
+    return queries
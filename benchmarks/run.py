@@ -0,0 +1,275 @@
+"""
+Micro-benchmarks for the matching pipeline.
+
+For each candidate list size, measures:
+
+- mock_model: MockChatModelWithCandidates.invoke (the scorer) on its own
+- pipeline: the full match_string_with_langchain path (pre-match, input removal, shortlisting,
+  prompt formatting, output) with a fake model that sleeps for a fixed latency
+
+reporting per-call latency (mean/p50/p95/p99), throughput, setup time and peak memory. Peak
+memory is traced with tracemalloc in a fresh child process doing the setup and a few calls, so
+tracing doesn't distort the timings. Results are written as JSON:
+
+    python -m benchmarks.run --sizes 10,1000,10000,100000 --out bench.json
+    python -m benchmarks.compare baseline.json bench.json
+
+The result cache and single-flight are switched off (unless set in the environment) so every
+query exercises the pipeline.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Sequence
+
+from langchain_core.messages import HumanMessage
+
+from app.config import get_settings
+from app.services.candidate_index import get_candidate_index
+from app.services.langchain_matcher import MatchTrace, match_string_with_langchain
+from app.services.mock_langchain_model import MockChatModelWithCandidates, MockResponse
+from app.services.prematch import get_prematch_index
+from benchmarks.names import generate_candidates, generate_queries
+
+DEFAULT_SIZES = (10, 1_000, 10_000, 100_000)
+
+
+class FixedLatencyModel:
+    """Fake chat model: sleeps for a fixed time and answers "None"."""
+
+    def __init__(self, latency_seconds: float):
+        self.latency_seconds = latency_seconds
+        self.cache_id = "fixed-latency"
+
+    def invoke(self, messages):
+        time.sleep(self.latency_seconds)
+        return MockResponse("None")
+
+
+def _percentile(sorted_values: Sequence[float], q: float) -> float:
+    index = min(len(sorted_values) - 1, max(0, int(round(q * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+def _latency_stats(latencies: List[float]) -> Dict[str, float]:
+    ordered = sorted(latencies)
+    total = sum(latencies)
+    return {
+        "calls": len(latencies),
+        "mean_ms": statistics.fmean(latencies) * 1000,
+        "p50_ms": _percentile(ordered, 0.50) * 1000,
+        "p95_ms": _percentile(ordered, 0.95) * 1000,
+        "p99_ms": _percentile(ordered, 0.99) * 1000,
+        "throughput_per_s": len(latencies) / total if total else float("inf"),
+    }
+
+
+def _memory_worker(bench: str, size: int, seed: int, n_queries: int, latency_seconds: float) -> int:
+    """Runs in a fresh process: peak bytes allocated setting up `bench` and making a few calls."""
+    _disable_result_reuse()
+    candidates = generate_candidates(size, seed=seed)
+    queries = [q for q, _, _ in generate_queries(candidates, n_queries, seed=seed)]
+    if bench == "mock_model":
+        setup, call = _mock_model_bench(candidates)
+    else:
+        setup, call, _ = _pipeline_bench(candidates, latency_seconds)
+    tracemalloc.start()
+    try:
+        subject = setup()
+        for query in queries:
+            call(subject, query)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def _peak_memory(bench: str, size: int, seed: int, n_queries: int, latency_seconds: float) -> int:
+    import multiprocessing
+
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return pool.submit(_memory_worker, bench, size, seed, n_queries, latency_seconds).result()
+
+
+def _measure(setup: Callable[[], object], call: Callable[[object, str], object], queries: List[str]) -> Dict[str, float]:
+    """Setup time and per-call latencies."""
+    start = time.perf_counter()
+    subject = setup()
+    setup_seconds = time.perf_counter() - start
+
+    latencies = []
+    for query in queries:
+        t0 = time.perf_counter()
+        call(subject, query)
+        latencies.append(time.perf_counter() - t0)
+
+    result = _latency_stats(latencies)
+    result["setup_ms"] = setup_seconds * 1000
+    return result
+
+
+def _mock_model_bench(candidates: List[str]):
+    settings = get_settings()
+
+    def setup():
+        return MockChatModelWithCandidates(
+            candidates=candidates,
+            similarity_threshold=settings.mock_similarity_threshold,
+            scoring_engine=settings.mock_scoring_engine,
+        )
+
+    def call(model, query):
+        return model.invoke([HumanMessage(content=query)])
+
+    return setup, call
+
+
+def _pipeline_bench(candidates: List[str], latency_seconds: float):
+    tiers: Dict[str, int] = {}
+    overheads: List[float] = []
+
+    def setup():
+        tiers.clear()
+        overheads.clear()
+        # Start from cold per-list indexes (shortlisting and pre-match) and build them here, as
+        # the first request for a candidate list would
+        get_candidate_index.cache_clear()
+        get_prematch_index.cache_clear()
+        model = FixedLatencyModel(0.0)
+        match_string_with_langchain("warm-up", candidates, model)
+        model.latency_seconds = latency_seconds
+        return model
+
+    def call(model, query):
+        trace = MatchTrace()
+        match_string_with_langchain(query, candidates, model, trace=trace)
+        tiers[trace.tier] = tiers.get(trace.tier, 0) + 1
+        # Time spent outside the model call (see MatchTrace.timings)
+        overheads.append(trace.timings["total"] - trace.timings.get("model", 0.0))
+
+    return setup, call, (tiers, overheads)
+
+
+def bench_mock_model(candidates: List[str], queries: List[str]) -> Dict[str, float]:
+    setup, call = _mock_model_bench(candidates)
+    return _measure(setup, call, queries)
+
+
+def bench_pipeline(candidates: List[str], queries: List[str], latency_seconds: float) -> Dict[str, object]:
+    setup, call, (tiers, overheads) = _pipeline_bench(candidates, latency_seconds)
+    try:
+        result = _measure(setup, call, queries)
+    finally:
+        # Don't keep this size's indexes alive into the next one
+        get_candidate_index.cache_clear()
+        get_prematch_index.cache_clear()
+
+    ordered = sorted(overheads)
+    result["model_latency_ms"] = latency_seconds * 1000
+    result["overhead_p50_ms"] = _percentile(ordered, 0.50) * 1000
+    result["overhead_p95_ms"] = _percentile(ordered, 0.95) * 1000
+    result["tiers"] = dict(tiers)
+    return result
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5, check=True
+        )
+        return out.stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run(
+    sizes: Sequence[int] = DEFAULT_SIZES,
+    queries: int = 200,
+    pipeline_queries: int = 100,
+    latency_ms: float = 2.0,
+    memory_queries: int = 20,
+    seed: int = 0,
+) -> Dict[str, object]:
+    settings = get_settings()
+    results = []
+    for size in sizes:
+        candidates = generate_candidates(size, seed=seed)
+        triples = generate_queries(candidates, max(queries, pipeline_queries), seed=seed)
+        names = [q for q, _, _ in triples]
+        print(f"size={size}: mock model...", file=sys.stderr)
+        mock = bench_mock_model(candidates, names[:queries])
+        print(f"size={size}: pipeline...", file=sys.stderr)
+        pipeline = bench_pipeline(candidates, names[:pipeline_queries], latency_ms / 1000)
+        if memory_queries > 0:
+            print(f"size={size}: peak memory...", file=sys.stderr)
+            mock["peak_memory_bytes"] = _peak_memory("mock_model", size, seed, memory_queries, 0.0)
+            pipeline["peak_memory_bytes"] = _peak_memory("pipeline", size, seed, memory_queries, 0.0)
+        results.append({"candidates": size, "mock_model": mock, "pipeline": pipeline})
+
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": seed,
+            "settings": {
+                "mock_scoring_engine": settings.mock_scoring_engine,
+                "mock_similarity_threshold": settings.mock_similarity_threshold,
+                "shortlist_top_k": settings.shortlist_top_k,
+                "prematch_enabled": settings.prematch_enabled,
+                "prompt_path": settings.prompt_path,
+            },
+        },
+        "results": results,
+    }
+
+
+def _disable_result_reuse() -> None:
+    # Must happen before the first get_settings() call, which caches the settings
+    os.environ.setdefault("MATCH_CACHE_ENABLED", "false")
+    os.environ.setdefault("SINGLEFLIGHT_ENABLED", "false")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    _disable_result_reuse()
+    parser = argparse.ArgumentParser(description="Benchmark the matching pipeline.")
+    parser.add_argument("--sizes", default=",".join(str(s) for s in DEFAULT_SIZES), help="Candidate list sizes.")
+    parser.add_argument("--queries", type=int, default=200, help="Queries per size for the mock model.")
+    parser.add_argument("--pipeline-queries", type=int, default=100, help="Queries per size for the pipeline.")
+    parser.add_argument("--latency-ms", type=float, default=2.0, help="Latency of the fake model in the pipeline.")
+    parser.add_argument(
+        "--memory-queries", type=int, default=20, help="Queries in the peak-memory pass (0 to skip it)."
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="-", help="Output JSON file, or - for stdout.")
+    args = parser.parse_args(argv)
+
+    report = run(
+        sizes=[int(s) for s in args.sizes.split(",") if s.strip()],
+        queries=args.queries,
+        pipeline_queries=args.pipeline_queries,
+        latency_ms=args.latency_ms,
+        memory_queries=args.memory_queries,
+        seed=args.seed,
+    )
+    text = json.dumps(report, indent=2)
+    if args.out == "-":
+        print(text)
+    else:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
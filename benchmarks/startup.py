@@ -0,0 +1,128 @@
+"""
+Startup benchmark: import time and memory of the API process.
+
+Each run is a fresh interpreter that imports app.main and, with --first-model, builds the
+configured chat model (which imports its backend), then reports:
+
+- import_ms: wall time of `import app.main`
+- first_model_ms: wall time of the first get_chat_model, plus one match for the mock backend
+  (the Azure backend isn't called, so no network is needed)
+- max_rss_mb: peak resident memory of the child process
+- backend: the model backend selected by the settings
+- loaded (loaded_after_first_model): whether the heavy optional libraries (langchain_openai,
+  openai, numpy...) ended up imported
+
+The median and worst run are reported as JSON. --max-import-ms and --max-rss-mb turn it into a
+regression check that exits with status 1 when the median exceeds them:
+
+    python -m benchmarks.startup --runs 5 --max-import-ms 1500 --max-rss-mb 120
+
+Settings come from the environment as usual, so USE_MOCK_LLM=false measures the Azure backend.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Optional
+
+WATCHED_MODULES = ("langchain_openai", "openai", "numpy", "msgpack")
+
+_CHILD = """
+import json, resource, sys, time
+
+start = time.perf_counter()
+import app.main
+import_ms = (time.perf_counter() - start) * 1000
+
+from app.services.model_factory import get_chat_model, selected_backend
+
+first_model_ms = None
+if {first_model!r}:
+    from langchain_core.messages import HumanMessage, SystemMessage
+
+    start = time.perf_counter()
+    model = get_chat_model(["Home Office", "HM Revenue and Customs"])
+    if selected_backend() == "mock":
+        model.invoke([SystemMessage(content=""), HumanMessage(content="Home Ofice")])
+    first_model_ms = (time.perf_counter() - start) * 1000
+
+print(json.dumps({{
+    "import_ms": import_ms,
+    "first_model_ms": first_model_ms,
+    # ru_maxrss is in kilobytes on Linux (bytes on macOS)
+    "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024),
+    "backend": selected_backend(),
+    "loaded": {{name: name in sys.modules for name in {watched!r}}},
+}}))
+"""
+
+
+def measure_once(first_model: bool = False) -> Dict[str, object]:
+    """Import app.main in a fresh interpreter and return its measurements."""
+    code = _CHILD.format(first_model=first_model, watched=WATCHED_MODULES)
+    proc = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        text=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"Startup run failed:\n{proc.stderr}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def _summary(values: List[float]) -> Dict[str, float]:
+    return {"median": round(statistics.median(values), 2), "max": round(max(values), 2)}
+
+
+def run(runs: int = 5, first_model: bool = False) -> Dict[str, object]:
+    samples = [measure_once(first_model) for _ in range(max(1, runs))]
+    report: Dict[str, object] = {
+        "meta": {"python": platform.python_version(), "platform": platform.platform(), "runs": len(samples)},
+        "backend": samples[0]["backend"],
+        "import_ms": _summary([s["import_ms"] for s in samples]),
+        "max_rss_mb": _summary([s["max_rss_mb"] for s in samples]),
+    }
+    if first_model:
+        report["first_model_ms"] = _summary([s["first_model_ms"] for s in samples])
+        report["loaded_after_first_model"] = samples[0]["loaded"]
+    else:
+        report["loaded"] = samples[0]["loaded"]
+    return report
+
+
+def check(report: Dict[str, object], max_import_ms: Optional[float], max_rss_mb: Optional[float]) -> List[str]:
+    """Threshold violations in the report, as messages."""
+    failures = []
+    if max_import_ms is not None and report["import_ms"]["median"] > max_import_ms:
+        failures.append(f"import time {report['import_ms']['median']}ms > {max_import_ms}ms")
+    if max_rss_mb is not None and report["max_rss_mb"]["median"] > max_rss_mb:
+        failures.append(f"peak RSS {report['max_rss_mb']['median']}MB > {max_rss_mb}MB")
+    return failures
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Measure API startup time and memory.")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters to measure.")
+    parser.add_argument("--first-model", action="store_true", help="Also time building the chat model.")
+    parser.add_argument("--max-import-ms", type=float, default=None, help="Fail if the median import time is above.")
+    parser.add_argument("--max-rss-mb", type=float, default=None, help="Fail if the median peak RSS is above.")
+    args = parser.parse_args(argv)
+
+    report = run(runs=args.runs, first_model=args.first_model)
+    print(json.dumps(report, indent=2))
+    failures = check(report, args.max_import_ms, args.max_rss_mb)
+    for failure in failures:
+        print(f"startup regression: {failure}", file=sys.stderr)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
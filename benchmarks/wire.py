@@ -0,0 +1,114 @@
+"""
+Wire-format benchmark for the match endpoints.
+
+For each size it measures, without any matching:
+
+- request: payload size and decode + validate time of a MatchRequest with that many candidates,
+  as JSON and as MessagePack (app/services/wire_format.parse_body)
+- response: payload size and encode time of a BatchMatchResponse with that many results, through
+  FastAPI's response_model path (what the endpoints used before), as JSON via model_dump_json,
+  and as MessagePack (app/services/wire_format.encode_response)
+
+    python -m benchmarks.wire --sizes 1000,10000,100000
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from typing import Callable, Dict, List, Optional, Sequence
+
+import msgpack
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+
+from app.main import BatchMatchResponse, MatchRequest, MatchResponse, app
+from benchmarks.names import generate_candidates
+
+DEFAULT_SIZES = (1_000, 10_000, 100_000)
+
+
+def _time_ms(fn: Callable[[], object], repeat: int) -> float:
+    """Median wall time of fn() in milliseconds."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(times), 3)
+
+
+def bench_request(candidates: Sequence[str], repeat: int) -> Dict[str, Dict[str, float]]:
+    payload = {"input_string": "Home Ofice", "candidates": list(candidates)}
+    as_json = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    as_msgpack = msgpack.packb(payload, use_bin_type=True)
+    return {
+        "json": {
+            "bytes": len(as_json),
+            # As parse_body decodes it: straight from bytes, no intermediate dict
+            "decode_ms": _time_ms(lambda: MatchRequest.model_validate_json(as_json), repeat),
+        },
+        "msgpack": {
+            "bytes": len(as_msgpack),
+            "decode_ms": _time_ms(lambda: MatchRequest.model_validate(msgpack.unpackb(as_msgpack, raw=False)), repeat),
+        },
+    }
+
+
+def bench_response(candidates: Sequence[str], repeat: int) -> Dict[str, Dict[str, float]]:
+    response = BatchMatchResponse(
+        results=[
+            MatchResponse(input_string=f"{c} Ltd", match=c, raw=c, cache="miss", tier="model") for c in candidates
+        ]
+    )
+    route = next(r for r in app.routes if getattr(r, "path", None) == "/match/batch")
+
+    def fastapi_default() -> bytes:
+        content = asyncio.run(
+            serialize_response(field=route.response_field, response_content=response, is_coroutine=True)
+        )
+        return JSONResponse(content).body
+
+    return {
+        "fastapi_json": {"bytes": len(fastapi_default()), "encode_ms": _time_ms(fastapi_default, repeat)},
+        "json": {
+            "bytes": len(response.model_dump_json()),
+            "encode_ms": _time_ms(response.model_dump_json, repeat),
+        },
+        "msgpack": {
+            "bytes": len(msgpack.packb(response.model_dump(), use_bin_type=True)),
+            "encode_ms": _time_ms(lambda: msgpack.packb(response.model_dump(), use_bin_type=True), repeat),
+        },
+    }
+
+
+def run(sizes: Sequence[int], repeat: int = 5, seed: int = 0) -> Dict[str, object]:
+    results = []
+    for size in sizes:
+        candidates = generate_candidates(size, seed=seed)
+        results.append(
+            {
+                "size": size,
+                "request": bench_request(candidates, repeat),
+                "response": bench_response(candidates, repeat),
+            }
+        )
+    return {"repeat": repeat, "seed": seed, "results": results}
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark JSON vs MessagePack for the match endpoints.")
+    parser.add_argument("--sizes", default=",".join(str(s) for s in DEFAULT_SIZES), help="Candidates / results.")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed repetitions per measurement.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    report = run([int(s) for s in args.sizes.split(",") if s.strip()], repeat=args.repeat, seed=args.seed)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
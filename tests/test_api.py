@@ -129,6 +129,44 @@ class TestMatchEndpoint:
             assert data["match"] == data["match"].strip()
 
 
+class TestBatchMatchEndpoint:
+    """Tests for /match/batch endpoint."""
+
+    def test_batch_returns_results_in_input_order(self, client, sample_candidates):
+        """Test that one result is returned per input, in input order."""
+        payload = {
+            "input_strings": ["Home Ofice", "Random Organization XYZ", "hmrc", "Cabinet Office"],
+            "candidates": sample_candidates,
+        }
+        response = client.post("/match/batch", json=payload)
+
+        assert response.status_code == status.HTTP_200_OK
+        results = response.json()["results"]
+        assert [r["input_string"] for r in results] == payload["input_strings"]
+        assert [r["match"] for r in results] == ["Home Office", None, "HMRC", "Cabinet Office"]
+
+    def test_batch_many_inputs(self, client, sample_candidates):
+        """Test a batch larger than the concurrency limit."""
+        inputs = sample_candidates * 10
+        payload = {"input_strings": inputs, "candidates": sample_candidates}
+        response = client.post("/match/batch", json=payload)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [r["match"] for r in response.json()["results"]] == inputs
+
+    def test_batch_empty_inputs_fails(self, client, sample_candidates):
+        """Test that an empty input list is rejected."""
+        payload = {"input_strings": [], "candidates": sample_candidates}
+        response = client.post("/match/batch", json=payload)
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    def test_batch_empty_input_string_fails(self, client, sample_candidates):
+        """Test that an empty string inside the batch is rejected."""
+        payload = {"input_strings": ["Home Office", ""], "candidates": sample_candidates}
+        response = client.post("/match/batch", json=payload)
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
 class TestRealWorldScenarios:
     """Tests based on actual UK procurement use cases."""
 
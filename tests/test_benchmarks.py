@@ -0,0 +1,88 @@
+"""Smoke tests for the benchmark suite and its synthetic name generator."""
+
+import asyncio
+import json
+import random
+
+import httpx
+
+from app.main import app
+from benchmarks.compare import compare
+from benchmarks.load import build_requests, run_step, sustained
+from benchmarks.load import run as run_load
+from benchmarks.names import VARIANTS, acronym, generate_candidates, generate_queries, typo
+from benchmarks.run import run
+
+
+class TestNameGenerator:
+    """Tests for the synthetic organisation names."""
+
+    def test_candidates_are_distinct_and_reproducible(self):
+        first = generate_candidates(500, seed=3)
+
+        assert len(first) == len(set(first)) == 500
+        assert generate_candidates(500, seed=3) == first
+        assert generate_candidates(500, seed=4) != first
+
+    def test_queries_cover_every_variant(self):
+        candidates = generate_candidates(50)
+        queries = generate_queries(candidates, 60)
+
+        assert {variant for _, variant, _ in queries} == set(VARIANTS)
+        assert all(source in candidates for _, _, source in queries)
+
+    def test_variants(self):
+        assert acronym("Department for Work and Pensions") == "DWP"
+        assert acronym("Leeds City Council (York Office)") == "LCC"
+        assert typo("Home Office", random.Random(1)) != "Home Office"
+
+
+def test_run_and_compare():
+    report = run(sizes=[10], queries=5, pipeline_queries=5, latency_ms=0.0, memory_queries=0)
+
+    result = report["results"][0]
+    assert result["candidates"] == 10
+    assert result["mock_model"]["calls"] == 5
+    assert sum(result["pipeline"]["tiers"].values()) == 5
+
+    rows = compare(report, report)
+    assert rows
+    assert all(row["ratio"] in (1.0, None) for row in rows)
+
+
+class TestLoad:
+    """Tests for the /match load test harness."""
+
+    def test_requests_have_the_source_candidate(self):
+        bodies = [json.loads(b) for b in build_requests([5, 10], 30)]
+
+        assert {len(b["candidates"]) for b in bodies} == {5, 10}
+        assert build_requests([5, 10], 30) == build_requests([5, 10], 30)
+
+    def test_step_against_the_app(self):
+        async def step():
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                return await run_step(client, build_requests([5], 10), rate=50, duration=0.2, concurrency=4)
+
+        result = asyncio.run(step())
+
+        assert (result["requests"], result["ok"], result["errors"]) == (10, 10, {})
+        assert sum(result["tiers"].values()) == 10
+        assert result["p50_ms"] <= result["p99_ms"]
+
+    def test_sustained(self):
+        step = {"target_rps": 100, "achieved_rps": 97, "error_rate": 0.0, "p99_ms": 250.0}
+
+        assert sustained(step)
+        assert not sustained(step, max_p99_ms=200)
+        assert not sustained({**step, "achieved_rps": 80})
+        assert not sustained({**step, "error_rate": 0.05})
+
+    def test_run_against_a_fake_azure_worker(self):
+        report = run_load(backends=["azure"], rates=[10], duration=0.5, concurrency=5, candidate_sizes=[10],
+                          latency_ms=5, jitter_ms=0)
+
+        step = report["results"]["azure"]["steps"][0]
+        assert step["ok"] == 5
+        assert step["model_calls"] == step["tiers"].get("model", 0)
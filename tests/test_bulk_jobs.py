@@ -0,0 +1,195 @@
+"""Tests for bulk CSV/NDJSON matching jobs."""
+
+import asyncio
+import json
+import time
+
+import pytest
+from fastapi import status
+
+import app.main as main
+from app.services import bulk_jobs
+from app.services.bulk_jobs import JobStore, ingest, iter_csv_inputs, iter_ndjson_inputs, stream_results
+
+
+async def _chunks(data: bytes, size: int):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+
+async def _collect(agen):
+    return [item async for item in agen]
+
+
+def _parse(fn, text: str, size: int = 3):
+    return asyncio.run(_collect(fn(_chunks(text.encode("utf-8"), size))))
+
+
+@pytest.fixture
+def job_store(tmp_path, monkeypatch):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    monkeypatch.setattr(main, "get_job_store", lambda: store)
+    return store
+
+
+class TestInputParsing:
+    """Tests for streaming CSV/NDJSON input parsing."""
+
+    def test_csv_with_header_column(self):
+        text = "id,input_string\n1,Home Ofice\n2,HMRC\n"
+        assert _parse(iter_csv_inputs, text) == ["Home Ofice", "HMRC"]
+
+    def test_csv_without_header_uses_first_column(self):
+        assert _parse(iter_csv_inputs, "Home Ofice,x\r\nHMRC,y") == ["Home Ofice", "HMRC"]
+
+    def test_csv_quoted_field_across_lines(self):
+        text = 'input_string\n"Ministry of\nDefence"\n"Smith, Jones & Co"\n'
+        assert _parse(iter_csv_inputs, text) == ["Ministry of\nDefence", "Smith, Jones & Co"]
+
+    def test_multibyte_characters_split_across_chunks(self):
+        assert _parse(iter_csv_inputs, "Caerdydd Cyngor Dinas – Cardiff\n", size=1) == [
+            "Caerdydd Cyngor Dinas – Cardiff"
+        ]
+
+    def test_ndjson_strings_and_objects(self):
+        text = '"Home Ofice"\n\n{"input_string": "HMRC", "id": 2}\n'
+        assert _parse(iter_ndjson_inputs, text) == ["Home Ofice", "HMRC"]
+
+
+def test_job_resumes_without_rematching_done_rows(job_store, monkeypatch):
+    calls = []
+    real_match = bulk_jobs.amatch_many_with_langchain
+
+    async def counting_match(**kwargs):
+        calls.extend(kwargs["input_strings"])
+        return await real_match(**kwargs)
+
+    monkeypatch.setattr(bulk_jobs, "amatch_many_with_langchain", counting_match)
+    inputs = [f"Org {i}" for i in range(10)]
+
+    async def run():
+        job_id = job_store.create_job(["Org 1", "Org 2"], None, None)
+        await ingest(job_store, job_id, _chunks_of(inputs), chunk_size=4)
+
+        # First run stops after one chunk of 4 rows, as if the client disconnected
+        stream = stream_results(job_store, job_id, chunk_size=4)
+        first = [await stream.__anext__() for _ in range(4)]
+        await stream.aclose()
+        assert job_store.status(job_id).status == "incomplete"
+
+        resumed = await _collect(stream_results(job_store, job_id, chunk_size=4))
+        return job_id, first, resumed
+
+    job_id, first, resumed = asyncio.run(run())
+
+    assert len(first) == 4
+    assert [json.loads(line)["row"] for line in resumed] == list(range(10))
+    assert sorted(calls) == sorted(inputs)  # every row matched exactly once
+    assert job_store.status(job_id).status == "completed"
+
+
+async def _chunks_of(items):
+    for item in items:
+        yield item
+
+
+async def _cut_off(items):
+    for item in items:
+        yield item
+    raise ConnectionResetError("client went away")
+
+
+def test_cut_off_upload_is_never_matched(job_store, monkeypatch):
+    async def no_match(**kwargs):
+        raise AssertionError("a partial upload must not be matched")
+
+    monkeypatch.setattr(bulk_jobs, "amatch_many_with_langchain", no_match)
+
+    async def run():
+        job_id = job_store.create_job(["Org 1"], None, None)
+        with pytest.raises(ConnectionResetError):
+            await ingest(job_store, job_id, _cut_off(["Org 1", "Org 2", "Org 3"]), chunk_size=2)
+        with pytest.raises(bulk_jobs.JobNotIngestedError):
+            await _collect(stream_results(job_store, job_id, chunk_size=2))
+        return job_id
+
+    job_id = asyncio.run(run())
+
+    job = job_store.status(job_id)
+    assert (job.status, job.total_rows, job.done_rows) == ("failed", 2, 0)
+
+
+def test_a_job_runs_on_one_worker_at_a_time(tmp_path):
+    # Two stores on one file, as two worker processes would have
+    path = str(tmp_path / "jobs.sqlite3")
+    first, second = JobStore(path), JobStore(path)
+    job_id = first.create_job(["Org 1"], None, None)
+    asyncio.run(ingest(first, job_id, _chunks_of(["Org 1"]), chunk_size=2))
+
+    bulk_jobs.claim_job(first, job_id)
+    with pytest.raises(bulk_jobs.JobAlreadyRunningError):
+        bulk_jobs.claim_job(second, job_id)
+    with pytest.raises(bulk_jobs.JobAlreadyRunningError):
+        asyncio.run(_collect(stream_results(second, job_id, chunk_size=2)))
+
+    # Once the first run has gone quiet for job_stale_seconds, it can be taken over
+    assert second.claim(job_id, stale_before=time.time() + 1)
+
+
+class TestJobEndpoints:
+    """Tests for /jobs endpoints."""
+
+    def test_csv_upload_streams_ndjson(self, client, job_store, sample_candidates):
+        body = "input_string\nHome Ofice\nRandom Organization XYZ\nhmrc\n"
+        response = client.post(
+            "/jobs",
+            params={"candidates": sample_candidates},
+            content=body,
+            headers={"Content-Type": "text/csv"},
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert [line["match"] for line in lines] == ["Home Office", None, "HMRC"]
+
+        job_id = response.headers["X-Job-Id"]
+        job = client.get(f"/jobs/{job_id}").json()
+        assert (job["status"], job["total_rows"], job["done_rows"]) == ("completed", 3, 3)
+
+        replay = client.get(f"/jobs/{job_id}/results")
+        assert [json.loads(line) for line in replay.text.splitlines()] == lines
+
+    def test_ndjson_upload_with_candidate_set(self, client, job_store, sample_candidates):
+        client.put("/candidate-sets/job-buyers", json={"candidates": sample_candidates})
+
+        response = client.post(
+            "/jobs",
+            params={"candidate_set": "job-buyers"},
+            content='{"input_string": "Cabinet Ofice"}\n',
+            headers={"Content-Type": "application/x-ndjson"},
+        )
+
+        assert json.loads(response.text)["match"] == "Cabinet Office"
+
+    def test_results_of_failed_or_unfinished_upload(self, client, job_store):
+        failed = job_store.create_job(["Org 1"], None, None)
+        job_store.set_status(failed, "failed")
+        ingesting = job_store.create_job(["Org 1"], None, None)
+
+        for job_id in (failed, ingesting):
+            assert client.get(f"/jobs/{job_id}/results").status_code == status.HTTP_409_CONFLICT
+        assert client.get(f"/jobs/{failed}").json()["status"] == "failed"
+
+    def test_results_of_a_running_job(self, client, job_store):
+        job_id = job_store.create_job(["Org 1"], None, None)
+        asyncio.run(ingest(job_store, job_id, _chunks_of(["Org 1"]), chunk_size=2))
+        bulk_jobs.claim_job(job_store, job_id)
+
+        response = client.get(f"/jobs/{job_id}/results")
+
+        assert response.status_code == status.HTTP_409_CONFLICT
+        assert "already running" in response.json()["detail"]
+
+    def test_unknown_job(self, client, job_store):
+        assert client.get("/jobs/nope").status_code == status.HTTP_404_NOT_FOUND
+        assert client.get("/jobs/nope/results").status_code == status.HTTP_404_NOT_FOUND
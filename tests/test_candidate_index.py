@@ -0,0 +1,112 @@
+"""Tests for the BM25 candidate shortlisting index."""
+
+from app.services.candidate_index import CandidateIndex, get_candidate_index
+from app.services.langchain_matcher import MatchTrace, match_string_with_langchain
+from app.services.mock_langchain_model import MockResponse
+
+
+def _filler(n):
+    return [f"Regional Office Number {i}" for i in range(n)]
+
+
+class RecordingModel:
+    """Fake chat model that records the messages it was sent."""
+
+    def __init__(self):
+        self.messages = None
+
+    def invoke(self, messages):
+        self.messages = messages
+        return MockResponse("None")
+
+
+class TestCandidateIndex:
+    """Tests for CandidateIndex.search."""
+
+    def test_typo_ranks_first(self):
+        index = CandidateIndex(["Cabinet Office", "Home Office", "HMRC", "Ministry of Defence"])
+
+        out = index.search("Home Ofice", top_k=2)
+
+        assert out[0][0] == "Home Office"
+        assert len(out) == 2
+
+    def test_acronym_finds_full_name(self):
+        index = CandidateIndex(
+            ["Department for Education", "Department for Work and Pensions", "Home Office"]
+        )
+
+        out = index.search("DWP", top_k=1)
+
+        assert out[0][0] == "Department for Work and Pensions"
+
+    def test_no_shared_terms_returns_nothing(self):
+        index = CandidateIndex(["HMRC"])
+
+        assert index.search("Zzz", top_k=5) == []
+
+    def test_scores_are_descending(self):
+        index = CandidateIndex(["Leeds City Council", "Birmingham City Council", "Manchester City Council"])
+
+        scores = [score for _, score in index.search("Birmingham Council", top_k=3)]
+
+        assert scores == sorted(scores, reverse=True)
+
+
+class TestShortlistInMatcher:
+    """Tests for shortlisting inside match_string_with_langchain."""
+
+    def test_large_list_is_shortlisted_in_prompt(self):
+        candidates = _filler(1000) + ["Home Office"]
+        model = RecordingModel()
+        trace = MatchTrace()
+
+        match_string_with_langchain("Home Ofice", candidates, model, trace=trace)
+
+        assert trace.shortlist is not None
+        assert len(trace.shortlist) == 50
+        assert trace.shortlist[0][0] == "Home Office"
+        assert "Regional Office Number 999" not in model.messages[0].content
+
+    def test_input_that_is_a_candidate_shares_the_list_index(self):
+        candidates = _filler(1000) + ["Home Office", "Home Office HQ"]
+        misses = get_candidate_index.cache_info().misses
+        own, other = MatchTrace(), MatchTrace()
+
+        match_string_with_langchain("Home Office", candidates, RecordingModel(), trace=own)
+        match_string_with_langchain("Home Ofice", candidates, RecordingModel(), trace=other)
+
+        assert get_candidate_index.cache_info().misses == misses + 1
+        assert len(own.shortlist) == 50
+        assert "Home Office" not in [c for c, _ in own.shortlist]
+        assert own.shortlist[0][0] == "Home Office HQ"
+        assert other.shortlist[0][0] == "Home Office"
+
+    def test_small_list_is_not_shortlisted(self):
+        model = RecordingModel()
+        trace = MatchTrace()
+
+        match_string_with_langchain("Home Ofice", ["Home Office", "HMRC"], model, trace=trace)
+
+        assert trace.shortlist is None
+
+    def test_list_within_the_prompt_cache_budget_is_sent_whole(self):
+        # ~1500 tokens: over shortlist_top_k candidates, but cacheable as one shared prefix
+        candidates = _filler(200) + ["Home Office"]
+        model = RecordingModel()
+        trace = MatchTrace()
+
+        match_string_with_langchain("Home Ofice", candidates, model, trace=trace)
+
+        assert trace.shortlist is None
+        assert "Regional Office Number 199" in model.messages[0].content
+
+
+def test_api_reports_shortlist(client):
+    candidates = _filler(1000) + ["Home Office"]
+    response = client.post("/match", json={"input_string": "Home Ofice", "candidates": candidates})
+
+    data = response.json()
+    assert data["match"] == "Home Office"
+    assert data["shortlist"][0]["candidate"] == "Home Office"
+    assert data["shortlist"][0]["score"] > 0
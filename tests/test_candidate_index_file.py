@@ -0,0 +1,142 @@
+"""Tests for memory-mapped candidate index files."""
+
+import pytest
+
+from app.config import Settings
+from app.services import candidate_sets
+from app.services.candidate_index import CandidateIndex
+from app.services.candidate_index_file import (
+    CandidateIndexFile,
+    IndexFileError,
+    build_index_file,
+    main,
+    parse_index_files,
+)
+from app.services.candidate_sets import CandidateSet, get_candidate_set_registry
+from app.services.langchain_matcher import MatchTrace, match_string_with_langchain
+from app.services.model_factory import get_chat_model
+from app.services.prematch import PrematchIndex, legal_suffixes
+from app.services.scoring import SequenceScorer, TrigramScorer
+from benchmarks.names import generate_candidates, generate_queries
+
+
+@pytest.fixture(scope="module")
+def candidates():
+    return generate_candidates(500, seed=3) + ["HMRC", "Home Office", "Ministry of Defence"]
+
+
+@pytest.fixture(scope="module")
+def queries(candidates):
+    return [q for q, _, _ in generate_queries(candidates, 60, seed=3)] + ["Home Ofice", "MOD", "", "zzz"]
+
+
+@pytest.fixture(scope="module")
+def index_file(candidates, tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("index") / "buyers.nmidx")
+    build_index_file(candidates, path)
+    return CandidateIndexFile(path)
+
+
+class TestCandidateIndexFile:
+    """The mapped file gives the same answers as the in-memory structures."""
+
+    def test_string_table(self, candidates, index_file):
+        table = index_file.candidates
+
+        assert len(table) == len(index_file) == len(candidates)
+        assert list(table) == candidates
+        assert table[0] == candidates[0] and table[-1] == candidates[-1]
+        assert table[1:3] == candidates[1:3]
+        assert "HMRC" in table
+        assert "Not A Buyer" not in table
+        assert index_file.position("Home Office") == candidates.index("Home Office")
+
+    def test_search_matches_in_memory_index(self, candidates, queries, index_file):
+        expected = CandidateIndex(candidates)
+
+        for query in queries:
+            assert index_file.bm25.search(query, 10) == expected.search(query, 10), query
+
+    def test_prematch_matches_in_memory_index(self, candidates, queries, index_file):
+        expected = PrematchIndex(candidates, legal_suffixes())
+
+        for query in queries + ["HMRC Ltd", "home office", "HMRC"]:
+            assert index_file.prematch.lookup(query) == expected.lookup(query), query
+
+    @pytest.mark.parametrize("scorer_cls", [SequenceScorer, TrigramScorer])
+    def test_scorers_match_in_memory_scorers(self, candidates, queries, index_file, scorer_cls):
+        expected = scorer_cls(candidates)
+        mapped = index_file.scorer(scorer_cls.name)
+
+        for query in queries:
+            assert mapped.best(query, threshold=0.5) == expected.best(query, threshold=0.5), query
+
+    def test_fingerprint_matches_in_memory_set(self, candidates, index_file):
+        assert index_file.fingerprint == CandidateSet("buyers", candidates).fingerprint
+
+    def test_rejects_other_files(self, tmp_path):
+        path = tmp_path / "not-an-index.txt"
+        path.write_text("Home Office\nHMRC\n")
+
+        with pytest.raises(IndexFileError):
+            CandidateIndexFile(str(path))
+
+
+class TestIndexFileCandidateSet:
+    """Candidate sets backed by an index file."""
+
+    def test_matches_like_in_memory_set(self, candidates, queries, index_file):
+        mapped = CandidateSet.from_index_file("buyers", index_file)
+        in_memory = CandidateSet("buyers", candidates)
+
+        for query in queries:
+            mapped_trace, memory_trace = MatchTrace(), MatchTrace()
+            result = match_string_with_langchain(query, mapped, mapped.model, trace=mapped_trace)
+            assert result == match_string_with_langchain(query, in_memory, in_memory.model, trace=memory_trace)
+            assert mapped_trace.shortlist == memory_trace.shortlist
+
+    def test_mock_model_uses_file_vectors(self, index_file):
+        model = get_chat_model(candidates=index_file.candidates)
+
+        assert model._scorer.candidates is index_file.candidates
+        assert model.cache_id.endswith(index_file.fingerprint)
+
+    def test_input_in_set_is_removed(self, index_file):
+        cset = CandidateSet.from_index_file("buyers", index_file)
+
+        candidates, candidates_json = cset.without("HMRC")
+
+        assert "HMRC" in cset
+        assert "HMRC" not in candidates
+        assert len(candidates) == len(cset) - 1
+        assert '"HMRC"' not in candidates_json
+
+
+class TestIndexFileConfig:
+    def test_parse_index_files(self):
+        assert parse_index_files(" buyers = a.nmidx,suppliers=/data/b.nmidx, ") == [
+            ("buyers", "a.nmidx"),
+            ("suppliers", "/data/b.nmidx"),
+        ]
+        with pytest.raises(ValueError):
+            parse_index_files("buyers")
+
+    def test_cli_build_and_registry_load(self, tmp_path, monkeypatch, capsys):
+        source = tmp_path / "buyers.csv"
+        source.write_text("name,region\nHome Office,UK\nHMRC,UK\nHome Office,UK\n")
+        path = tmp_path / "buyers.nmidx"
+
+        main(["build", str(source), "-o", str(path), "--column", "name"])
+        main(["info", str(path)])
+        assert '"n_candidates": 2' in capsys.readouterr().out
+
+        monkeypatch.setattr(
+            candidate_sets, "get_settings", lambda: Settings(candidate_index_files=f"buyers={path}")
+        )
+        get_candidate_set_registry.cache_clear()
+        try:
+            cset = get_candidate_set_registry().get("buyers")
+            assert list(cset.candidates) == ["Home Office", "HMRC"]
+            assert match_string_with_langchain("HMRC Ltd", cset, cset.model) == "HMRC"
+        finally:
+            get_candidate_set_registry.cache_clear()
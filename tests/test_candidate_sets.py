@@ -0,0 +1,103 @@
+"""Tests for server-side named candidate sets."""
+
+import pytest
+from fastapi import status
+
+from app.services.candidate_sets import CandidateSet, CandidateSetNotFoundError, CandidateSetRegistry
+from app.services.langchain_matcher import MatchTrace, match_string_with_langchain
+from app.services.mock_langchain_model import MockResponse
+
+
+class RecordingModel:
+    def __init__(self):
+        self.messages = None
+
+    def invoke(self, messages):
+        self.messages = messages
+        return MockResponse("None")
+
+
+class TestCandidateSet:
+    """Tests for CandidateSet precomputation."""
+
+    def test_deduplicates_keeping_order(self):
+        cset = CandidateSet("buyers", ["HMRC", "Home Office", "HMRC"])
+
+        assert cset.candidates == ["HMRC", "Home Office"]
+        assert len(cset) == 2
+
+    def test_without_reuses_precomputed_json(self):
+        cset = CandidateSet("buyers", ["HMRC", "Home Office"])
+
+        candidates, candidates_json = cset.without("Cabinet Office")
+
+        assert candidates is cset.candidates
+        assert candidates_json is cset.candidates_json
+
+    def test_without_removes_input(self):
+        cset = CandidateSet("buyers", ["DWP", "HMRC"])
+
+        candidates, candidates_json = cset.without("DWP")
+
+        assert candidates == ["HMRC"]
+        assert candidates_json == '["HMRC"]'
+
+    def test_model_is_built_once(self):
+        cset = CandidateSet("buyers", ["HMRC"])
+
+        assert cset.model is cset.model
+
+    def test_registry_unknown_name(self):
+        registry = CandidateSetRegistry()
+
+        with pytest.raises(CandidateSetNotFoundError):
+            registry.get("missing")
+
+
+def test_matcher_with_candidate_set_removes_input_and_shortlists():
+    cset = CandidateSet("buyers", ["DWP"] + [f"Regional Office Number {i}" for i in range(1000)] + ["Home Office"])
+    model = RecordingModel()
+    trace = MatchTrace()
+
+    match_string_with_langchain("DWP", cset, model, prompt_path="prompts/buyer_match_v1.txt", trace=trace)
+
+    assert all(c != "DWP" for c, _ in trace.shortlist)
+    assert '"DWP"' not in model.messages[0].content
+
+
+class TestCandidateSetEndpoints:
+    """Tests for /candidate-sets and matching by candidate_set."""
+
+    def test_register_and_match(self, client, sample_candidates):
+        response = client.put("/candidate-sets/test-buyers", json={"candidates": sample_candidates})
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["size"] == len(sample_candidates)
+
+        response = client.post("/match", json={"input_string": "Home Ofice", "candidate_set": "test-buyers"})
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["match"] == "Home Office"
+
+        response = client.get("/match", params={"input_string": "hmrc", "candidate_set": "test-buyers"})
+        assert response.json()["match"] == "HMRC"
+
+        response = client.post(
+            "/match/batch", json={"input_strings": ["Cabinet Ofice", "HMRC"], "candidate_set": "test-buyers"}
+        )
+        assert [r["match"] for r in response.json()["results"]] == ["Cabinet Office", "HMRC"]
+
+        assert "test-buyers" in client.get("/candidate-sets").json()
+        assert client.delete("/candidate-sets/test-buyers").status_code == status.HTTP_204_NO_CONTENT
+        assert client.get("/candidate-sets/test-buyers").status_code == status.HTTP_404_NOT_FOUND
+
+    def test_unknown_candidate_set(self, client):
+        response = client.post("/match", json={"input_string": "HMRC", "candidate_set": "nope"})
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_candidates_and_candidate_set_are_exclusive(self, client):
+        payload = {"input_string": "HMRC", "candidates": ["HMRC"], "candidate_set": "x"}
+        response = client.post("/match", json=payload)
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    def test_no_candidate_source(self, client):
+        response = client.post("/match", json={"input_string": "HMRC"})
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
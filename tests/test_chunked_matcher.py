@@ -0,0 +1,148 @@
+"""Tests for tournament matching of candidate lists too long for one prompt."""
+
+import ast
+import asyncio
+import math
+import threading
+import time
+from difflib import SequenceMatcher
+
+import pytest
+
+from app.config import Settings
+from app.services import langchain_matcher
+from app.services.chunked_matcher import estimate_candidate_tokens, plan_chunks
+from app.services.langchain_matcher import MatchTrace, amatch_string_with_langchain, match_string_with_langchain
+from app.services.mock_langchain_model import MockResponse
+
+CANDIDATES = [f"{place} {kind}" for place in ("Leeds", "York", "Bath", "Hull", "Derby") for kind in (
+    "City Council", "College", "Police", "Academy Trust", "Housing Association", "Primary School",
+)]
+
+
+class PromptModel:
+    """Answers with the closest candidate from the list in its system prompt (the default prompt)."""
+
+    def __init__(self, latency: float = 0.0, threshold: float = 0.8):
+        self.latency = latency
+        self.threshold = threshold
+        self.prompts = []
+        self._lock = threading.Lock()
+
+    def _answer(self, messages) -> MockResponse:
+        system = messages[0].content
+        candidates = ast.literal_eval(system[system.index("[") : system.rindex("]") + 1])
+        with self._lock:
+            self.prompts.append(candidates)
+        query = messages[-1].content.lower()
+        score, best = max((SequenceMatcher(None, query, c.lower()).ratio(), c) for c in candidates)
+        return MockResponse(best if score >= self.threshold else "None")
+
+    def invoke(self, messages):
+        time.sleep(self.latency)
+        return self._answer(messages)
+
+    async def ainvoke(self, messages):
+        await asyncio.sleep(self.latency)
+        return self._answer(messages)
+
+
+@pytest.fixture
+def chunk_settings(monkeypatch):
+    settings = Settings(
+        chunk_max_tokens=40, shortlist_top_k=0, prematch_enabled=False, singleflight_enabled=False, prompt_path=""
+    )
+    monkeypatch.setattr(langchain_matcher, "get_settings", lambda: settings)
+    return settings
+
+
+class TestPlanChunks:
+    def test_no_chunks_when_list_fits(self):
+        assert plan_chunks(CANDIDATES, 10_000) is None
+        assert plan_chunks(CANDIDATES, 0) is None
+
+    def test_chunks_are_balanced_and_cover_the_list(self):
+        chunks = plan_chunks(CANDIDATES, 40)
+
+        assert [c for chunk in chunks for c in chunk] == CANDIDATES
+        sizes = [sum(estimate_candidate_tokens(c) for c in chunk) for chunk in chunks]
+        largest = max(estimate_candidate_tokens(c) for c in CANDIDATES)
+        assert len(chunks) == math.ceil(sum(sizes) / 40)
+        assert max(sizes) <= 40 + largest
+        assert max(sizes) - min(sizes) <= 2 * largest
+
+
+class TestTournament:
+    def test_final_round_over_chunk_winners(self, chunk_settings):
+        # Lenient enough that every chunk has a winner
+        model = PromptModel(threshold=0.3)
+        trace = MatchTrace()
+
+        raw = match_string_with_langchain("Leeds City Counci", CANDIDATES, model, trace=trace)
+
+        n_chunks = len(plan_chunks(CANDIDATES, 40))
+        assert raw == "Leeds City Council"
+        assert trace.chunks == n_chunks > 1
+        assert trace.tier == "model"
+        # Every chunk once, then one final call over the winners only
+        assert len(model.prompts) == n_chunks + 1
+        final = model.prompts[-1]
+        assert "Leeds City Council" in final
+        assert len(final) == n_chunks
+
+    def test_single_winner_needs_no_final_round(self, chunk_settings):
+        model = PromptModel()
+
+        raw = match_string_with_langchain("Leeds City Counci", CANDIDATES, model)
+
+        assert raw == "Leeds City Council"
+        assert len(model.prompts) == len(plan_chunks(CANDIDATES, 40))
+
+    def test_no_winners_is_none_without_final_round(self, chunk_settings):
+        model = PromptModel()
+
+        raw = match_string_with_langchain("Acme Widgets Ltd", CANDIDATES, model)
+
+        assert raw == "None"
+        assert len(model.prompts) == len(plan_chunks(CANDIDATES, 40))
+
+    def test_candidates_longer_than_the_budget_end_in_one_final_call(self, monkeypatch):
+        settings = Settings(
+            chunk_max_tokens=20, shortlist_top_k=0, prematch_enabled=False, singleflight_enabled=False, prompt_path=""
+        )
+        monkeypatch.setattr(langchain_matcher, "get_settings", lambda: settings)
+        # Each name alone is over the budget, so the winners can never be split into fewer chunks
+        candidates = ["Leeds City Council Adult Social Care Directorate", "Leeds City Council Children Services Dept"]
+        model = PromptModel(threshold=0.3)
+
+        raw = match_string_with_langchain("Leeds City Council Adult Social Care", candidates, model)
+        araw = asyncio.run(amatch_string_with_langchain("Leeds City Council Adult Social Care", candidates, model))
+
+        assert raw == araw == "Leeds City Council Adult Social Care Directorate"
+        # Two chunks, then one final call over both winners
+        assert [len(prompt) for prompt in model.prompts] == [1, 1, 2, 1, 1, 2]
+
+    def test_input_in_list_is_excluded_from_chunks(self, chunk_settings):
+        model = PromptModel()
+
+        match_string_with_langchain("York College", CANDIDATES, model)
+
+        assert all("York College" not in prompt for prompt in model.prompts)
+
+    def test_async_chunks_run_concurrently(self, chunk_settings):
+        model = PromptModel(latency=0.1)
+
+        start = time.perf_counter()
+        raw = asyncio.run(amatch_string_with_langchain("Bath Colege", CANDIDATES, model))
+        elapsed = time.perf_counter() - start
+
+        assert raw == "Bath College"
+        assert len(model.prompts) > 3
+        # Two round trips, not one per chunk
+        assert elapsed < 0.1 * (len(model.prompts) - 1)
+
+    def test_sync_and_async_agree(self, chunk_settings):
+        sync_raw = match_string_with_langchain("Hull Polise", CANDIDATES, PromptModel())
+        async_raw = asyncio.run(amatch_string_with_langchain("Hull Polise", CANDIDATES, PromptModel()))
+
+        assert sync_raw == async_raw == "Hull Police"
@@ -0,0 +1,263 @@
+"""Tests for load balancing, circuit breaking and failover across Azure deployments."""
+
+import asyncio
+import json
+
+import httpx
+import openai
+import pytest
+from langchain_core.messages import HumanMessage
+from langchain_openai import AzureChatOpenAI
+
+from app.config import Settings, parse_azure_deployments
+from app.services import azure_backend, model_factory
+from app.services.deployment_pool import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, DeploymentPool, is_failover_error
+from app.services.mock_langchain_model import MockResponse
+from benchmarks.fake_azure_openai import FakeAzureOpenAIServer
+
+MESSAGES = [HumanMessage(content="Home Office")]
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+class StubModel:
+    def __init__(self, name, error=None):
+        self.name = name
+        self.error = error
+        self.calls = 0
+        self.gate = None
+
+    def invoke(self, messages):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        return MockResponse(self.name)
+
+    async def ainvoke(self, messages):
+        if self.gate is not None:
+            await self.gate.wait()
+        return self.invoke(messages)
+
+
+def _azure_model(server, deployment="test-deployment"):
+    return AzureChatOpenAI(
+        azure_endpoint=server.url,
+        openai_api_key="test-key",
+        azure_deployment=deployment,
+        openai_api_version="2024-02-15-preview",
+        max_retries=0,
+    )
+
+
+class TestCircuitBreaker:
+    def test_opens_after_consecutive_failures(self):
+        breaker = CircuitBreaker(failure_threshold=3, cooldown_seconds=10, clock=FakeClock())
+
+        breaker.record_failure()
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        breaker.record_failure()
+        assert breaker.state == CLOSED
+
+        breaker.record_failure()
+        assert breaker.state == OPEN
+        assert not breaker.available()
+
+    def test_half_open_lets_one_trial_through(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=1, cooldown_seconds=10, clock=clock)
+        breaker.record_failure()
+
+        clock.now = 10
+        assert breaker.available()
+        assert breaker.state == HALF_OPEN
+        breaker.on_pick()
+        assert not breaker.available()
+
+        breaker.record_failure()
+        assert breaker.state == OPEN
+        clock.now = 20
+        assert breaker.available()
+        breaker.on_pick()
+        breaker.record_success()
+        assert breaker.state == CLOSED
+        assert breaker.times_opened == 2
+
+
+class TestDeploymentPool:
+    def test_idle_deployments_share_calls_round_robin(self):
+        a, b = StubModel("a"), StubModel("b")
+        pool = DeploymentPool([("a", a), ("b", b)])
+
+        answers = [pool.invoke(MESSAGES).content for _ in range(4)]
+
+        assert answers == ["a", "b", "a", "b"]
+
+    def test_least_outstanding_requests(self):
+        a, b = StubModel("a"), StubModel("b")
+        pool = DeploymentPool([("a", a), ("b", b)])
+
+        async def run():
+            a.gate = asyncio.Event()
+            slow = asyncio.create_task(pool.ainvoke(MESSAGES))
+            await asyncio.sleep(0)
+            # "a" has a call outstanding, so both of these go to "b"
+            first = await pool.ainvoke(MESSAGES)
+            second = await pool.ainvoke(MESSAGES)
+            a.gate.set()
+            return (await slow).content, first.content, second.content
+
+        assert asyncio.run(run()) == ("a", "b", "b")
+
+    def test_fails_over_and_opens_the_circuit(self):
+        clock = FakeClock()
+        bad, good = StubModel("bad", error=StatusError(500)), StubModel("good")
+        pool = DeploymentPool([("bad", bad), ("good", good)], failure_threshold=2, cooldown_seconds=30, clock=clock)
+
+        answers = [pool.invoke(MESSAGES).content for _ in range(6)]
+
+        assert answers == ["good"] * 6
+        assert bad.calls == 2
+        stats = pool.stats()["deployments"]
+        assert stats["bad"]["state"] == OPEN
+        assert stats["bad"]["failovers"] == 2
+        assert stats["good"]["calls"] == 6
+
+        # After the cooldown a recovered deployment is let back in
+        clock.now = 30
+        bad.error = None
+        answers = [pool.invoke(MESSAGES).content for _ in range(4)]
+        assert "bad" in answers
+        assert pool.stats()["deployments"]["bad"]["state"] == CLOSED
+
+    def test_request_errors_are_not_failed_over(self):
+        a, b = StubModel("a", error=StatusError(400)), StubModel("b", error=StatusError(400))
+        pool = DeploymentPool([("a", a), ("b", b)], failure_threshold=1)
+
+        with pytest.raises(StatusError):
+            pool.invoke(MESSAGES)
+
+        assert a.calls + b.calls == 1
+        assert all(s["state"] == CLOSED for s in pool.stats()["deployments"].values())
+
+    @pytest.mark.parametrize(
+        "error, failover",
+        [
+            (StatusError(429), True),
+            (StatusError(503), True),
+            (StatusError(401), False),
+            (TimeoutError(), True),
+            (ConnectionResetError(), True),
+            (TypeError("bad argument"), False),
+            (AttributeError("no such attribute"), False),
+        ],
+    )
+    def test_failover_errors(self, error, failover):
+        assert is_failover_error(error) is failover
+
+    def test_sdk_transport_errors_fail_over(self):
+        request = httpx.Request("POST", "https://example.test")
+        assert is_failover_error(openai.APITimeoutError(request=request))
+        assert is_failover_error(openai.APIConnectionError(request=request))
+        assert is_failover_error(httpx.ConnectError("refused", request=request))
+
+    def test_raises_last_error_when_every_deployment_fails(self):
+        a, b = StubModel("a", error=StatusError(503)), StubModel("b", error=StatusError(429))
+        pool = DeploymentPool([("a", a), ("b", b)], failover_retries=5)
+
+        with pytest.raises(StatusError) as exc_info:
+            pool.invoke(MESSAGES)
+
+        assert exc_info.value.status_code == 429
+        assert a.calls == b.calls == 1
+
+    def test_against_fake_deployments(self):
+        with FakeAzureOpenAIServer(rate_500=1.0) as failing, FakeAzureOpenAIServer(latency_seconds=0.01) as healthy:
+            pool = DeploymentPool(
+                [("failing", _azure_model(failing)), ("healthy", _azure_model(healthy))], failure_threshold=3
+            )
+
+            async def run():
+                return await asyncio.gather(*(pool.ainvoke([HumanMessage(content=f"Buyer {i}")]) for i in range(12)))
+
+            responses = asyncio.run(run())
+            failing_requests = failing.stats()["requests"]
+
+        assert [r.content for r in responses] == [f"Buyer {i}" for i in range(12)]
+        stats = pool.stats()["deployments"]
+        assert stats["failing"]["state"] == OPEN
+        assert stats["failing"]["errors"] == failing_requests
+        assert stats["healthy"]["calls"] == 12
+        assert stats["healthy"]["latency_p50_seconds"] >= 0.01
+
+
+class TestPoolConfig:
+    def test_parse_azure_deployments(self):
+        settings = Settings(
+            azure_openai_key="default-key",
+            azure_openai_api_version="2024-02-15-preview",
+            azure_deployments=json.dumps(
+                [
+                    {"endpoint": "https://uks.example.com", "deployment": "gpt-4o"},
+                    {"name": "swe", "endpoint": "https://swe.example.com", "deployment": "gpt-4o", "key": "k2"},
+                ]
+            ),
+        )
+
+        first, second = parse_azure_deployments(settings)
+
+        assert first.name == "gpt-4o@https://uks.example.com"
+        assert first.key == "default-key"
+        assert (second.name, second.key, second.api_version) == ("swe", "k2", "2024-02-15-preview")
+
+    @pytest.mark.parametrize(
+        "value",
+        ["not json", "[]", '[{"endpoint": "https://a"}]', '[{"endpoint": "https://a", "deployment": "d", "key": "k"}]'],
+    )
+    def test_invalid_azure_deployments(self, value):
+        with pytest.raises(ValueError):
+            parse_azure_deployments(Settings(azure_deployments=value))
+
+    def test_model_factory_builds_a_pool(self, monkeypatch):
+        with FakeAzureOpenAIServer() as one, FakeAzureOpenAIServer() as two:
+            settings = Settings(
+                use_mock_llm=False,
+                azure_openai_key="test-key",
+                azure_openai_api_version="2024-02-15-preview",
+                azure_deployments=json.dumps(
+                    [
+                        {"name": "one", "endpoint": one.url, "deployment": "d"},
+                        {"name": "two", "endpoint": two.url, "deployment": "d"},
+                    ]
+                ),
+            )
+            monkeypatch.setattr(model_factory, "get_settings", lambda: settings)
+            monkeypatch.setattr(azure_backend, "get_settings", lambda: settings)
+            azure_backend.get_azure_model.cache_clear()
+            try:
+                model = model_factory.get_chat_model()
+                answers = [model.invoke([HumanMessage(content=f"Buyer {i}")]).content for i in range(4)]
+                stats = model_factory.azure_pool_stats()
+            finally:
+                azure_backend.get_azure_model.cache_clear()
+
+            assert one.stats()["requests"] == two.stats()["requests"] == 2
+
+        assert isinstance(model, DeploymentPool)
+        assert answers == [f"Buyer {i}" for i in range(4)]
+        assert set(stats["deployments"]) == {"one", "two"}
+        assert stats["deployments"]["one"]["rate_limit"]["attempts"] == 2
+        assert model.cache_id.startswith("azure-pool:")
@@ -0,0 +1,168 @@
+"""Tests for the prompt evaluation runner and its response replay store."""
+
+import asyncio
+import json
+import time
+
+import pytest
+from langchain_core.messages import AIMessage
+
+from app.config import Settings
+from app.services import evaluation, langchain_matcher, match_cache
+from app.services.evaluation import (
+    LabelledExample,
+    ReplayStore,
+    aevaluate,
+    default_prompts,
+    load_labelled_csv,
+    main,
+    summarize,
+)
+from app.services.mock_langchain_model import MockChatModelWithCandidates
+from app.services.prompt_registry import PromptRegistry
+
+CANDIDATES = ["Home Office", "HMRC", "Cabinet Office", "Ministry of Defence"]
+EXAMPLES = [
+    LabelledExample("Home Ofice", "Home Office", CANDIDATES),
+    LabelledExample("Cabinet Offce", "Cabinet Office", CANDIDATES),
+    LabelledExample("Ministry of Defense", "Ministry of Defence", CANDIDATES),
+    LabelledExample("Acme Widgets Ltd", None, CANDIDATES),
+]
+PROMPTS = ["buyer_match_v1", "buyer_match_v4"]
+
+
+class CountingModel:
+    """The mock model, counting calls, with optional latency and reported token usage."""
+
+    def __init__(self, candidates, latency=0.0, usage=None):
+        self.inner = MockChatModelWithCandidates(candidates=candidates)
+        self.latency = latency
+        self.usage = usage
+        self.calls = 0
+        self.cache_id = self.inner.cache_id
+
+    async def ainvoke(self, messages):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        content = self.inner.invoke(messages).content
+        return AIMessage(content=content, usage_metadata=self.usage) if self.usage else AIMessage(content=content)
+
+
+@pytest.fixture(autouse=True)
+def eval_settings(monkeypatch):
+    settings = Settings(match_cache_enabled=False, singleflight_enabled=False, prematch_enabled=False)
+    monkeypatch.setattr(langchain_matcher, "get_settings", lambda: settings)
+    monkeypatch.setattr(match_cache, "get_settings", lambda: settings)
+    match_cache.get_match_cache.cache_clear()
+    yield settings
+    match_cache.get_match_cache.cache_clear()
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ReplayStore(str(tmp_path / "replay.sqlite3"))
+    yield store
+    store.close()
+
+
+def _run(store, model, **kwargs):
+    return asyncio.run(aevaluate(EXAMPLES, PROMPTS, store, model_factory=lambda candidates: model, **kwargs))
+
+
+def test_load_labelled_csv(tmp_path):
+    path = tmp_path / "labelled.csv"
+    path.write_text(
+        "input_string,expected,candidates\n"
+        "Home Ofice,Home Office,\n"
+        "Acme Ltd,None,\n"
+        'HMRC,HM Revenue and Customs,"[""HM Revenue and Customs"", ""HM Treasury""]"\n',
+        encoding="utf-8",
+    )
+
+    first, second, third = load_labelled_csv(str(path))
+
+    # Rows without candidates match against every labelled answer
+    assert first.candidates == second.candidates == ["Home Office", "HM Revenue and Customs"]
+    assert second.expected is None
+    assert third.candidates == ["HM Revenue and Customs", "HM Treasury"]
+
+
+def test_scores_every_prompt_version(store):
+    rows = _run(store, CountingModel(CANDIDATES))
+    report = summarize(rows)
+
+    assert set(report) == set(PROMPTS)
+    for summary in report.values():
+        assert summary["examples"] == 4
+        assert summary["accuracy"] == 1.0
+        assert summary["none_precision"] == summary["none_recall"] == 1.0
+        assert summary["model_calls"] == 4
+        assert summary["tokens"]["estimated"] is True
+
+
+def test_second_run_is_replayed_without_model_calls(store):
+    model = CountingModel(CANDIDATES, usage={"input_tokens": 100, "output_tokens": 3, "total_tokens": 103})
+    first = summarize(_run(store, model), input_cost_per_1k=0.01)
+    calls = model.calls
+
+    second = summarize(_run(store, model, replay_only=True), input_cost_per_1k=0.01)
+
+    assert calls == len(EXAMPLES) * len(PROMPTS)
+    assert model.calls == calls
+    for prompt in PROMPTS:
+        assert second[prompt]["replayed_calls"] == 4
+        assert second[prompt]["tokens"] == first[prompt]["tokens"] == {
+            "input": 400, "output": 12, "per_example": 103.0, "estimated": False
+        }
+        assert second[prompt]["cost"] == pytest.approx(0.004)
+        # Latency is the recorded latency of the original call
+        assert second[prompt]["latency_seconds"] == first[prompt]["latency_seconds"]
+
+
+def test_replay_only_miss_is_an_error(store):
+    rows = _run(store, CountingModel(CANDIDATES), replay_only=True)
+
+    assert all(row.error.startswith("ReplayMissError") for row in rows)
+    assert summarize(rows)["buyer_match_v1"]["errors"] == 4
+
+
+def test_versions_and_rows_run_concurrently(store):
+    model = CountingModel(CANDIDATES, latency=0.05)
+
+    start = time.perf_counter()
+    _run(store, model)
+    elapsed = time.perf_counter() - start
+
+    assert model.calls == 8
+    assert elapsed < 0.05 * 4
+
+
+def test_cli_report_and_details(tmp_path, capsys, monkeypatch):
+    # main() defaults these in os.environ; set them here so they are restored afterwards
+    monkeypatch.setenv("MATCH_CACHE_ENABLED", "false")
+    monkeypatch.setenv("SINGLEFLIGHT_ENABLED", "false")
+    dataset = tmp_path / "labelled.csv"
+    dataset.write_text("input_string,expected\nHome Ofice,Home Office\nAcme Ltd,\n", encoding="utf-8")
+    details = tmp_path / "rows.ndjson"
+
+    main([
+        str(dataset), "--prompts", "buyer_match_v2", "--replay-db", str(tmp_path / "r.sqlite3"),
+        "--details", str(details),
+    ])
+
+    report = json.loads(capsys.readouterr().out)
+    assert report["prompts"]["buyer_match_v2"]["accuracy"] == 1.0
+    lines = [json.loads(line) for line in details.read_text(encoding="utf-8").splitlines()]
+    assert [(line["input_string"], line["predicted"], line["correct"]) for line in lines] == [
+        ("Home Ofice", "Home Office", True),
+        ("Acme Ltd", None, True),
+    ]
+
+
+def test_default_prompts_leave_out_the_packed_prompt(monkeypatch):
+    assert default_prompts() == ["buyer_match_v1", "buyer_match_v2", "buyer_match_v3", "buyer_match_v4"]
+
+    # Even if a registry has it, e.g. as PROMPT_PATH
+    registry = PromptRegistry(extra_paths=["prompts/buyer_match_packed_v1.txt"])
+    monkeypatch.setattr(evaluation, "get_prompt_registry", lambda: registry)
+    assert "buyer_match_packed_v1" not in default_prompts()
@@ -0,0 +1,237 @@
+"""Tests for hedged model calls and the deadline fallback."""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.config import Settings
+from app.main import _build_response
+from app.services import hedging, langchain_matcher, match_cache
+from app.services.deployment_pool import DeploymentPool
+from app.services.hedging import Hedger
+from app.services.langchain_matcher import MatchTrace, amatch_string_with_langchain, match_string_with_langchain
+from app.services.mock_langchain_model import MockResponse
+
+CANDIDATES = ["Home Office", "HMRC", "Cabinet Office"]
+
+
+class SlowFirstModel:
+    """Answers `answer`; the first call takes `first_latency`, later calls `latency`."""
+
+    def __init__(self, answer="Home Office", first_latency=0.0, latency=0.0, first_error=None, cache_id="slow"):
+        self.answer = answer
+        self.first_latency = first_latency
+        self.latency = latency
+        self.first_error = first_error
+        self.cache_id = cache_id
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _next(self):
+        with self._lock:
+            self.calls += 1
+            first = self.calls == 1
+        return (self.first_latency, self.first_error) if first else (self.latency, None)
+
+    def invoke(self, messages):
+        latency, error = self._next()
+        time.sleep(latency)
+        if error is not None:
+            raise error
+        return MockResponse(self.answer)
+
+    async def ainvoke(self, messages):
+        latency, error = self._next()
+        await asyncio.sleep(latency)
+        if error is not None:
+            raise error
+        return MockResponse(self.answer)
+
+
+def _warm(hedger, model, seconds=0.01, n=20):
+    for _ in range(n):
+        hedger.observe(model, seconds)
+
+
+class TestHedger:
+    def test_delay_needs_enough_samples(self):
+        hedger = Hedger(quantile=0.95, min_samples=20)
+        model = SlowFirstModel()
+
+        _warm(hedger, model, n=18)
+        hedger.observe(model, 0.5)
+        assert hedger.delay(model) is None
+        hedger.observe(model, 0.5)
+        # p95 of 18 fast and 2 slow calls
+        assert hedger.delay(model) == 0.5
+        assert Hedger(delay_seconds=0.2).delay(model) == 0.2
+
+    def test_async_hedge_wins(self):
+        hedger = Hedger(min_samples=20)
+        model = SlowFirstModel(first_latency=1.0)
+        _warm(hedger, model)
+
+        start = time.perf_counter()
+        response = asyncio.run(hedger.ainvoke(model, lambda: model.ainvoke([])))
+
+        assert response.content == "Home Office"
+        assert time.perf_counter() - start < 0.5
+        assert model.calls == 2
+        assert (hedger.hedged, hedger.hedge_wins) == (1, 1)
+
+    def test_cancelled_first_call_is_still_timed(self):
+        hedger = Hedger(min_samples=20)
+        model = SlowFirstModel(first_latency=1.0)
+        _warm(hedger, model)
+
+        asyncio.run(hedger.ainvoke(model, lambda: model.ainvoke([])))
+
+        # The losing first call counts with the time it had taken; the late hedge isn't timed
+        histogram = hedger._latencies[hedger._key(model)]
+        assert histogram.count == 21
+        assert histogram.quantiles((1.0,))[1.0] > 0.01
+
+    def test_sync_calls_are_not_hedged(self):
+        hedger = Hedger(delay_seconds=0.05)
+        model = SlowFirstModel(first_latency=0.1)
+        threads = []
+        real_invoke = model.invoke
+        model.invoke = lambda messages: threads.append(threading.current_thread()) or real_invoke(messages)
+
+        response = hedger.invoke(model, [])
+
+        assert response.content == "Home Office"
+        assert threads == [threading.current_thread()]
+        assert hedger.stats()["calls"] == 1
+        assert (hedger.hedged, hedger.hedge_wins) == (0, 0)
+
+    def test_fast_calls_are_not_hedged(self):
+        hedger = Hedger(delay_seconds=0.5)
+        model = SlowFirstModel()
+
+        asyncio.run(hedger.ainvoke(model, lambda: model.ainvoke([])))
+
+        assert model.calls == 1
+        assert hedger.hedged == 0
+
+    def test_failed_call_waits_for_the_other(self):
+        hedger = Hedger(delay_seconds=0.05)
+        # The first call fails after the hedge has been sent; the hedge answers
+        model = SlowFirstModel(first_latency=0.1, latency=0.2, first_error=RuntimeError("boom"))
+
+        response = asyncio.run(hedger.ainvoke(model, lambda: model.ainvoke([])))
+
+        assert response.content == "Home Office"
+
+    def test_hedge_goes_to_another_deployment(self):
+        slow, fast = SlowFirstModel("slow", first_latency=1.0), SlowFirstModel("fast")
+        pool = DeploymentPool([("slow", slow), ("fast", fast)])
+        hedger = Hedger(delay_seconds=0.05)
+
+        response = asyncio.run(hedger.ainvoke(pool, lambda: pool.ainvoke([])))
+
+        assert response.content == "fast"
+        assert (slow.calls, fast.calls) == (1, 1)
+
+
+@pytest.fixture
+def deadline_settings(monkeypatch):
+    settings = Settings(
+        match_deadline_seconds=0.1, hedge_enabled=True, hedge_delay_seconds=0.05, prematch_enabled=False,
+        singleflight_enabled=False, prompt_path="",
+    )
+    for module in (langchain_matcher, match_cache, hedging):
+        monkeypatch.setattr(module, "get_settings", lambda: settings)
+    match_cache.get_match_cache.cache_clear()
+    hedging.get_hedger.cache_clear()
+    yield settings
+    match_cache.get_match_cache.cache_clear()
+    hedging.get_hedger.cache_clear()
+
+
+class TestDeadline:
+    def test_hedged_match_beats_the_deadline(self, deadline_settings):
+        model = SlowFirstModel("HMRC", first_latency=1.0, cache_id="hedged-match")
+        trace = MatchTrace()
+
+        raw = asyncio.run(amatch_string_with_langchain("H.M.R.C.", CANDIDATES, model, trace=trace))
+
+        assert raw == "HMRC"
+        assert trace.tier == "model"
+        assert not trace.degraded
+
+    @pytest.mark.parametrize("mode", ["sync", "async"])
+    def test_fallback_after_the_deadline(self, deadline_settings, mode):
+        model = SlowFirstModel("HMRC", first_latency=1.0, latency=1.0, cache_id=f"too-slow-{mode}")
+        trace = MatchTrace()
+
+        start = time.perf_counter()
+        if mode == "sync":
+            raw = match_string_with_langchain("Home Ofice", CANDIDATES, model, trace=trace)
+        else:
+            raw = asyncio.run(amatch_string_with_langchain("Home Ofice", CANDIDATES, model, trace=trace))
+
+        assert time.perf_counter() - start < 0.5
+        # The local fuzzy match, not the (slow) model's answer
+        assert raw == "Home Office"
+        assert (trace.tier, trace.degraded) == ("fallback", True)
+        assert _build_response("Home Ofice", raw, trace).degraded is True
+
+        # Not cached: the next request asks the model again
+        model.latency = 0.0
+        trace = MatchTrace()
+        assert asyncio.run(amatch_string_with_langchain("Home Ofice", CANDIDATES, model, trace=trace)) == "HMRC"
+        assert (trace.tier, trace.degraded) == ("model", False)
+
+
+    def test_fallback_reuses_its_model(self, deadline_settings):
+        model = SlowFirstModel("HMRC", first_latency=1.0, latency=1.0, cache_id="reused-fallback")
+        langchain_matcher._fallback_model.cache_clear()
+
+        async def run():
+            return [await amatch_string_with_langchain(s, CANDIDATES, model) for s in ("Home Ofice", "Cabinet Ofice")]
+
+        assert asyncio.run(run()) == ["Home Office", "Cabinet Office"]
+        info = langchain_matcher._fallback_model.cache_info()
+        assert (info.misses, info.hits) == (1, 1)
+
+    @pytest.mark.parametrize("mode", ["sync", "async"])
+    def test_time_queued_for_a_model_slot_counts(self, deadline_settings, monkeypatch, mode):
+        monkeypatch.setattr(deadline_settings, "max_inflight_llm_calls", 1)
+        monkeypatch.setattr(deadline_settings, "hedge_enabled", False)
+        langchain_matcher._deadline_executor.cache_clear()
+        # Each call is inside the deadline, but the second waits for the first's slot and runs out of time
+        model = SlowFirstModel("HMRC", first_latency=0.07, latency=0.07, cache_id=f"queued-{mode}")
+        traces = [MatchTrace(), MatchTrace()]
+        inputs = ("H.M.R.C.", "H M R C")
+
+        try:
+            if mode == "sync":
+                threads = [
+                    threading.Thread(target=match_string_with_langchain, args=(s, CANDIDATES, model), kwargs={"trace": t})
+                    for s, t in zip(inputs, traces)
+                ]
+                for t in threads:
+                    t.start()
+                for t in threads:
+                    t.join()
+            else:
+
+                async def run():
+                    await asyncio.gather(
+                        *(amatch_string_with_langchain(s, CANDIDATES, model, trace=t) for s, t in zip(inputs, traces))
+                    )
+
+                asyncio.run(run())
+        finally:
+            langchain_matcher._deadline_executor.cache_clear()
+
+        assert sorted(t.tier for t in traces) == ["fallback", "model"]
+
+
+def test_api_responses_are_not_degraded_by_default(client):
+    response = client.post("/match", json={"input_string": "Home Ofice", "candidates": CANDIDATES})
+
+    assert response.json()["degraded"] is False
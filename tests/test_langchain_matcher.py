@@ -1,4 +1,20 @@
-from app.services.langchain_matcher import _remove_input_from_candidates
+import asyncio
+import random
+import threading
+
+from langchain_openai import AzureChatOpenAI
+
+from app.config import Settings
+from app.services import langchain_matcher
+from app.services.langchain_matcher import (
+    _remove_input_from_candidates,
+    amatch_string_with_langchain,
+    match_string_with_langchain,
+)
+from app.services.metrics import get_metrics
+from app.services.mock_langchain_model import MockChatModelWithCandidates, MockResponse
+from benchmarks.fake_azure_openai import FakeAzureOpenAIServer
+from benchmarks.names import generate_candidates
 
 def test_removes_exact_match():
     input_name = "DWP"
@@ -28,3 +44,174 @@ def test_noop_when_not_present_and_does_not_mutate_original():
     assert candidates == original  # original list unchanged
     assert out == original  # output has same values
     assert out is not candidates  # but it's a new list
+
+
+class SlowAsyncModel:
+    """Fake async chat model that records how many calls overlap."""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def ainvoke(self, messages):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        return MockResponse(messages[-1].content)
+
+
+class SyncOnlyModel:
+    def invoke(self, messages):
+        return MockResponse("HMRC")
+
+
+def test_async_matches_sync_result():
+    candidates = ["Home Office", "HMRC", "Cabinet Office"]
+    model = MockChatModelWithCandidates(candidates=candidates)
+
+    sync_raw = match_string_with_langchain("Home Ofice", candidates, model)
+    async_raw = asyncio.run(amatch_string_with_langchain("Home Ofice", candidates, model))
+
+    assert sync_raw == async_raw == "Home Office"
+
+
+def test_async_falls_back_to_invoke_in_thread():
+    raw = asyncio.run(amatch_string_with_langchain("HMRC", ["HMRC"], SyncOnlyModel()))
+
+    assert raw == "HMRC"
+
+
+def test_async_in_flight_calls_are_bounded(monkeypatch):
+    monkeypatch.setattr(langchain_matcher, "get_settings", lambda: Settings(max_inflight_llm_calls=3))
+    model = SlowAsyncModel()
+
+    async def run():
+        return await asyncio.gather(
+            *(amatch_string_with_langchain(f"Org {i}", ["HMRC"], model) for i in range(20))
+        )
+
+    results = asyncio.run(run())
+
+    assert results == [f"Org {i}" for i in range(20)]
+    assert model.max_in_flight == 3
+
+
+class RecordingModel:
+    """Fake chat model that records the messages it is sent and reports fixed token usage."""
+
+    def __init__(self, usage=None):
+        self.messages = []
+        self.usage = usage
+
+    def invoke(self, messages):
+        self.messages.append(messages)
+        response = MockResponse("None")
+        response.usage_metadata = self.usage
+        return response
+
+
+def _prompt_settings(monkeypatch, **overrides):
+    settings = Settings(
+        prompt_path="prompts/buyer_match_v4.txt", prematch_enabled=False, match_cache_enabled=False,
+        singleflight_enabled=False, **overrides,
+    )
+    monkeypatch.setattr(langchain_matcher, "get_settings", lambda: settings)
+    return settings
+
+
+def test_prompt_prefix_is_the_same_for_every_input(monkeypatch):
+    _prompt_settings(monkeypatch)
+    candidates = ["Home Office", "HMRC", "Cabinet Office", "Department for Education"]
+    model = RecordingModel()
+
+    match_string_with_langchain("Home Ofice", candidates, model)
+    match_string_with_langchain("DfE", list(reversed(candidates)), model)
+
+    (system_1, human_1), (system_2, human_2) = model.messages
+    # Instructions and sorted candidates first, the input only in the last message
+    assert system_1.content == system_2.content
+    assert "Home Ofice" not in system_1.content
+    assert system_1.content.rstrip().endswith('["Cabinet Office", "Department for Education", "HMRC", "Home Office"]')
+    assert (human_1.content, human_2.content) == ("Home Ofice", "DfE")
+
+
+def test_request_order_is_kept_when_sorting_is_off(monkeypatch):
+    _prompt_settings(monkeypatch, prompt_sort_candidates=False)
+    model = RecordingModel()
+
+    match_string_with_langchain("Home Ofice", ["Home Office", "HMRC"], model)
+
+    assert model.messages[0][0].content.rstrip().endswith('["Home Office", "HMRC"]')
+
+
+def test_prompt_token_usage_is_reported(monkeypatch):
+    _prompt_settings(monkeypatch)
+    model = RecordingModel(usage={"input_tokens": 1500, "output_tokens": 3, "input_token_details": {"cache_read": 1280}})
+    metrics = get_metrics()
+    before = (
+        metrics.counter("name_matcher_prompt_tokens_total", cached="true"),
+        metrics.counter("name_matcher_prompt_tokens_total", cached="false"),
+    )
+    trace = langchain_matcher.MatchTrace()
+
+    match_string_with_langchain("Home Ofice", ["Home Office", "HMRC"], model, trace=trace)
+
+    assert (trace.prompt_tokens, trace.cached_prompt_tokens) == (1500, 1280)
+    assert metrics.counter("name_matcher_prompt_tokens_total", cached="true") == before[0] + 1280
+    assert metrics.counter("name_matcher_prompt_tokens_total", cached="false") == before[1] + 220
+
+
+def test_repeated_prefix_is_served_from_the_provider_cache(monkeypatch):
+    settings = _prompt_settings(monkeypatch)
+    # Default settings: over shortlist_top_k candidates, but within the prompt cache budget
+    candidates = generate_candidates(300)
+    assert len(candidates) > settings.shortlist_top_k
+    shuffled = random.Random(1).sample(candidates, len(candidates))
+
+    with FakeAzureOpenAIServer(prefix_cache=True) as server:
+        model = AzureChatOpenAI(
+            azure_endpoint=server.url, api_key="test-key", azure_deployment="test", api_version="2024-02-15-preview"
+        )
+        first, second = langchain_matcher.MatchTrace(), langchain_matcher.MatchTrace()
+        match_string_with_langchain("Leeds City Council", candidates, model, trace=first)
+        match_string_with_langchain("Home Office", shuffled, model, trace=second)
+
+    assert first.cached_prompt_tokens == 0
+    # Everything but the last (partial) block, which holds the input
+    assert second.prompt_tokens - 128 < second.cached_prompt_tokens < second.prompt_tokens
+
+
+def test_list_over_the_prompt_cache_budget_is_shortlisted_per_input(monkeypatch):
+    _prompt_settings(monkeypatch, prompt_cache_max_tokens=100)
+    model = RecordingModel()
+    trace = langchain_matcher.MatchTrace()
+
+    match_string_with_langchain("Leeds City Council", generate_candidates(300), model, trace=trace)
+
+    assert len(trace.shortlist) == 50
+
+
+def test_async_match_does_blocking_work_off_the_event_loop(monkeypatch):
+    threads = {}
+    real_index = langchain_matcher.get_prematch_index
+
+    def prematch_index(*args):
+        threads["prepare"] = threading.get_ident()
+        return real_index(*args)
+
+    class RecordingMock(MockChatModelWithCandidates):
+        def invoke(self, messages):
+            threads["model"] = threading.get_ident()
+            return super().invoke(messages)
+
+    monkeypatch.setattr(langchain_matcher, "get_prematch_index", prematch_index)
+    # Not used by other tests, so the answer can't come from the result cache
+    candidates = ["Home Office", "HMRC", "Cabinet Office", "Off The Loop Agency"]
+
+    async def run():
+        threads["loop"] = threading.get_ident()
+        return await amatch_string_with_langchain("Home Ofice", candidates, RecordingMock(candidates=candidates))
+
+    assert asyncio.run(run()) == "Home Office"
+    assert threads["loop"] not in (threads["prepare"], threads["model"])
@@ -0,0 +1,151 @@
+"""Tests for the match result cache."""
+
+import asyncio
+import time
+
+from app.config import Settings
+from app.services import langchain_matcher
+from app.services.langchain_matcher import MatchTrace, match_string_with_langchain
+from app.services.match_cache import MatchCache, make_cache_key, model_cache_id
+from app.services.mock_langchain_model import MockChatModelWithCandidates, MockResponse
+
+
+class CountingModel:
+    """Fake chat model with a cache identity that counts invocations."""
+
+    def __init__(self, cache_id, answer="Home Office"):
+        self.cache_id = cache_id
+        self.answer = answer
+        self.calls = 0
+
+    def invoke(self, messages):
+        self.calls += 1
+        return MockResponse(self.answer)
+
+
+class TestMatchCache:
+    """Tests for MatchCache eviction and persistence."""
+
+    def test_lru_eviction(self):
+        cache = MatchCache(max_entries=2)
+        cache.set("a", {"raw": "A"})
+        cache.set("b", {"raw": "B"})
+        cache.get("a")  # "a" is now most recently used
+        cache.set("c", {"raw": "C"})
+
+        assert cache.get("b") is None
+        assert cache.get("a") == {"raw": "A"}
+        assert cache.get("c") == {"raw": "C"}
+
+    def test_ttl_expiry(self):
+        cache = MatchCache(ttl_seconds=0.01)
+        cache.set("a", {"raw": "A"})
+        time.sleep(0.02)
+
+        assert cache.get("a") is None
+
+    def test_sqlite_tier_survives_new_instance(self, tmp_path):
+        path = str(tmp_path / "cache.sqlite3")
+        MatchCache(sqlite_path=path).set("a", {"raw": "A"})
+
+        cache = MatchCache(sqlite_path=path)
+
+        assert cache.get("a") == {"raw": "A"}
+        assert cache.stats()["disk_hits"] == 1
+
+    def test_stats_count_hits_and_misses(self):
+        cache = MatchCache()
+        cache.get("a")
+        cache.set("a", {"raw": "A"})
+        cache.get("a")
+
+        stats = cache.stats()
+        assert (stats["hits"], stats["misses"]) == (1, 1)
+
+
+def test_async_access_to_the_sqlite_tier(tmp_path):
+    cache = MatchCache(sqlite_path=str(tmp_path / "cache.db"))
+
+    async def roundtrip():
+        await cache.aset("k", {"raw": "A"})
+        cache._entries.clear()
+        return await cache.aget("k")
+
+    assert asyncio.run(roundtrip()) == {"raw": "A"}
+    assert cache.stats()["disk_hits"] == 1
+
+
+class TestCacheKey:
+    """Tests for cache key construction."""
+
+    def test_input_is_normalized(self):
+        key1 = make_cache_key("Home  Ofice", "fp", "prompt", "m")
+        key2 = make_cache_key("home ofice", "fp", "prompt", "m")
+        assert key1 == key2
+
+    def test_exact_input_is_not_normalized(self):
+        assert make_cache_key("HMRC", "fp", "prompt", "m", exact_input=True) != make_cache_key(
+            "hmrc", "fp", "prompt", "m", exact_input=True
+        )
+        assert make_cache_key("HMRC", "fp", "prompt", "m", exact_input=True) != make_cache_key(
+            "HMRC", "fp", "prompt", "m"
+        )
+
+    def test_candidates_prompt_and_model_change_key(self):
+        base = make_cache_key("x", "fp-ab", "prompt", "m")
+        assert base != make_cache_key("x", "fp-ac", "prompt", "m")
+        assert base != make_cache_key("x", "fp-ab", "prompt v2", "m")
+        assert base != make_cache_key("x", "fp-ab", "prompt", "m2")
+
+    def test_model_identity(self):
+        assert model_cache_id(object()) is None
+        assert model_cache_id(MockChatModelWithCandidates(["a"])).startswith("mock:")
+
+
+class TestCacheInMatcher:
+    """Tests for the cache in front of match_string_with_langchain."""
+
+    def test_second_call_is_a_hit(self):
+        model = CountingModel("counting-model:hit")
+        candidates = ["Home Office", "HMRC"]
+        first, second = MatchTrace(), MatchTrace()
+
+        raw1 = match_string_with_langchain("Home Ofice", candidates, model, trace=first)
+        raw2 = match_string_with_langchain("home ofice", candidates, model, trace=second)
+
+        assert raw1 == raw2 == "Home Office"
+        assert model.calls == 1
+        assert (first.cache, second.cache) == ("miss", "hit")
+
+    def test_input_that_is_a_candidate_has_its_own_entry(self, monkeypatch):
+        monkeypatch.setattr(langchain_matcher, "get_settings", lambda: Settings(prematch_enabled=False))
+        # "HMRC" is removed from its own candidate list, "hmrc" isn't: different prompts
+        candidates = ["HMRC", "HM Revenue and Customs"]
+        model = CountingModel("counting-model:exact")
+
+        match_string_with_langchain("HMRC", candidates, model)
+        match_string_with_langchain("hmrc", candidates, model)
+
+        assert model.calls == 2
+
+    def test_model_without_identity_is_not_cached(self):
+        model = CountingModel(None)
+        trace = MatchTrace()
+
+        match_string_with_langchain("Home Ofice", ["Home Office"], model)
+        match_string_with_langchain("Home Ofice", ["Home Office"], model, trace=trace)
+
+        assert model.calls == 2
+        assert trace.cache is None
+
+
+def test_api_reports_cache_status(client):
+    payload = {"input_string": "Cabinet Ofice", "candidates": ["Cabinet Office", "HMRC", "Home Office"]}
+
+    first = client.post("/match", json=payload).json()
+    second = client.post("/match", json=payload).json()
+
+    assert first["cache"] == "miss"
+    assert second["cache"] == "hit"
+    assert second["match"] == first["match"] == "Cabinet Office"
+    assert client.get("/stats").json()["cache"]["hits"] >= 1
@@ -0,0 +1,86 @@
+"""Tests for per-stage latency metrics and the /metrics endpoint."""
+
+import math
+
+from app.services.langchain_matcher import MatchTrace, match_string_with_langchain
+from app.services.metrics import LatencyHistogram, Metrics, get_metrics
+from app.services.mock_langchain_model import MockChatModelWithCandidates
+
+
+class TestLatencyHistogram:
+    """Tests for quantiles over the sample window."""
+
+    def test_quantiles(self):
+        histogram = LatencyHistogram()
+        for ms in range(1, 101):
+            histogram.observe(ms / 1000)
+
+        q = histogram.quantiles()
+        assert q[0.5] == 0.05
+        assert q[0.95] == 0.095
+        assert q[0.99] == 0.099
+        assert histogram.count == 100
+
+    def test_window_keeps_recent_samples(self):
+        histogram = LatencyHistogram(window=10)
+        for _ in range(100):
+            histogram.observe(5.0)
+        for _ in range(10):
+            histogram.observe(0.1)
+
+        assert histogram.quantiles()[0.99] == 0.1
+        assert histogram.count == 110
+
+    def test_empty(self):
+        assert all(math.isnan(v) for v in LatencyHistogram().quantiles().values())
+
+
+def test_render_prometheus_text():
+    metrics = Metrics()
+    metrics.observe_stage("model", 0.25)
+    metrics.inc("name_matcher_results_total", tier="model")
+    metrics.inc("name_matcher_results_total", tier="model")
+    metrics.inc("name_matcher_errors_total", stage="model")
+
+    text = metrics.render()
+
+    assert "# TYPE name_matcher_stage_seconds summary" in text
+    assert 'name_matcher_stage_seconds{stage="model",quantile="0.95"} 0.25' in text
+    assert 'name_matcher_stage_seconds_count{stage="model"} 1' in text
+    assert 'name_matcher_results_total{tier="model"} 2' in text
+    assert 'name_matcher_errors_total{stage="model"} 1' in text
+
+
+def test_match_records_stage_timings():
+    candidates = ["Home Office", "HMRC", "Cabinet Office"]
+    trace = MatchTrace()
+    before = get_metrics().counter("name_matcher_none_results_total")
+
+    raw = match_string_with_langchain(
+        "Totally Unrelated Metrics Org", candidates, MockChatModelWithCandidates(candidates=candidates), trace=trace
+    )
+
+    assert raw == "None"
+    assert {"prompt", "prematch", "shortlist", "format", "model", "normalize", "total"} <= set(trace.timings)
+    assert trace.timings["total"] >= trace.timings["model"]
+    assert get_metrics().counter("name_matcher_none_results_total") == before + 1
+
+
+def test_metrics_endpoint(client, sample_candidates):
+    client.post("/match", json={"input_string": "Home Ofice", "candidates": sample_candidates})
+
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'name_matcher_stage_seconds_count{stage="total"}' in response.text
+    assert "name_matcher_results_total{" in response.text
+
+
+def test_match_response_has_server_timing(client, sample_candidates):
+    response = client.post("/match", json={"input_string": "Cabinet Ofice", "candidates": sample_candidates})
+
+    assert response.status_code == 200
+    stages = dict(part.strip().split(";dur=") for part in response.headers["server-timing"].split(","))
+    assert "total" in stages
+    assert all(float(ms) >= 0 for ms in stages.values())
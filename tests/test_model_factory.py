@@ -0,0 +1,47 @@
+"""Tests for the lazily loaded model backend registry."""
+
+import pytest
+
+from app.services import model_factory
+from benchmarks.startup import check, measure_once
+
+
+@pytest.fixture
+def restore_backends(monkeypatch):
+    monkeypatch.setattr(model_factory, "_BACKENDS", dict(model_factory._BACKENDS))
+    yield
+    model_factory.load_backend.cache_clear()
+
+
+def test_mock_mode_never_imports_the_azure_libraries():
+    # A fresh interpreter: this test process has imported langchain_openai for other tests
+    sample = measure_once(first_model=True)
+
+    assert sample["backend"] == "mock"
+    assert sample["loaded"]["langchain_openai"] is False
+    assert sample["loaded"]["openai"] is False
+    assert sample["first_model_ms"] is not None
+
+
+def test_unknown_backend(restore_backends):
+    with pytest.raises(ValueError, match="Unknown model backend"):
+        model_factory.load_backend("nope")
+
+
+def test_register_backend(restore_backends):
+    model_factory.register_backend("mock", "tests.test_model_factory")
+
+    assert model_factory.get_chat_model(["Home Office"]) == ("custom", ["Home Office"])
+
+
+def build_chat_model(candidates):
+    """Backend entry point for test_register_backend."""
+    return "custom", candidates
+
+
+def test_startup_thresholds():
+    report = {"import_ms": {"median": 900.0, "max": 950.0}, "max_rss_mb": {"median": 70.0, "max": 71.0}}
+
+    assert check(report, max_import_ms=1000, max_rss_mb=80) == []
+    assert len(check(report, max_import_ms=800, max_rss_mb=60)) == 2
+    assert check(report, max_import_ms=None, max_rss_mb=None) == []
@@ -0,0 +1,234 @@
+"""Tests for packed matching (several inputs per model call)."""
+
+import asyncio
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app import main
+from app.config import Settings
+from app.services import langchain_matcher, packed_matcher
+from app.services.match_cache import get_match_cache
+from app.services.mock_langchain_model import MockChatModelWithCandidates, MockResponse
+from app.services.packed_matcher import amatch_many_with_langchain, parse_packed_output
+
+
+@pytest.fixture
+def pack_size_3(monkeypatch):
+    settings = Settings(pack_size=3)
+    for module in (main, langchain_matcher, packed_matcher):
+        monkeypatch.setattr(module, "get_settings", lambda: settings)
+    return settings
+
+
+class CountingModel(MockChatModelWithCandidates):
+    """A fake LLM: the mock's fuzzy match, which also answers packed requests with a JSON object."""
+
+    supports_packed_prompts = True
+
+    def __post_init__(self):
+        super().__post_init__()
+        self.packed_calls = 0
+        self.single_calls = 0
+
+    def invoke(self, messages):
+        content = messages[-1].content
+        if content.startswith("{"):
+            self.packed_calls += 1
+            answers = {k: self._best(v) for k, v in json.loads(content).items()}
+            return MockResponse(json.dumps(answers))
+        self.single_calls += 1
+        return super().invoke(messages)
+
+
+class GarbledPackModel(CountingModel):
+    """Answers packed requests with an unusable answer for input 2 and nothing for input 3."""
+
+    def invoke(self, messages):
+        response = super().invoke(messages)
+        if messages[-1].content.startswith("{"):
+            answers = json.loads(response.content)
+            answers["2"] = "Ministry of Magic"
+            answers.pop("3", None)
+            return MockResponse(json.dumps(answers))
+        return response
+
+
+class UsageReportingModel(GarbledPackModel):
+    """Reports 1000 prompt tokens (800 cached) for a packed call and 100 (none cached) for a single one."""
+
+    def invoke(self, messages):
+        response = super().invoke(messages)
+        tokens, cached = (1000, 800) if messages[-1].content.startswith("{") else (100, 0)
+        usage = {"input_tokens": tokens, "input_token_details": {"cache_read": cached}}
+        return SimpleNamespace(content=response.content, usage_metadata=usage)
+
+
+class TestParsePackedOutput:
+    """Tests for mapping a packed answer back to its inputs."""
+
+    def test_valid_answers(self):
+        raw = '{"1": "Home Office", "2": "None", "3": null}'
+        assert parse_packed_output(raw, 3, {"Home Office"}) == {0: "Home Office", 1: "None", 2: "None"}
+
+    def test_code_fence_is_tolerated(self):
+        raw = '```json\n{"1": "HMRC"}\n```'
+        assert parse_packed_output(raw, 1, {"HMRC"}) == {0: "HMRC"}
+
+    def test_unknown_candidates_and_missing_keys_are_left_out(self):
+        raw = '{"1": "Home Ofice", "3": "HMRC"}'
+        assert parse_packed_output(raw, 3, {"Home Office", "HMRC"}) == {2: "HMRC"}
+
+    def test_malformed_output(self):
+        assert parse_packed_output("Home Office", 2, {"Home Office"}) == {}
+        assert parse_packed_output('["Home Office"]', 1, {"Home Office"}) == {}
+
+
+def test_inputs_are_packed_into_fewer_calls(pack_size_3):
+    candidates = ["Home Office", "HMRC", "Cabinet Office", "Ministry of Defence"]
+    model = CountingModel(candidates=candidates)
+    inputs = ["Home Ofice", "Cabinet Ofice", "Ministry of Defense", "Random Organization XYZ"]
+
+    results = asyncio.run(amatch_many_with_langchain(inputs, candidates, model))
+
+    assert results == ["Home Office", "Cabinet Office", "Ministry of Defence", "None"]
+    assert model.packed_calls == 2
+    assert model.single_calls == 0
+
+
+def test_unusable_answers_fall_back_to_single_calls(pack_size_3):
+    candidates = ["Home Office", "Cabinet Office", "Ministry of Defence"]
+    model = GarbledPackModel(candidates=candidates)
+    inputs = ["Home Ofice", "Cabinet Ofice", "Ministry of Defense"]
+
+    results = asyncio.run(amatch_many_with_langchain(inputs, candidates, model))
+
+    assert results == ["Home Office", "Cabinet Office", "Ministry of Defence"]
+    assert model.packed_calls == 1
+    assert model.single_calls == 2
+
+
+def test_input_that_is_a_candidate_is_matched_alone(pack_size_3):
+    candidates = ["Home Office", "Cabinet Office", "Home Office HQ"]
+    model = CountingModel(candidates=candidates)
+
+    results = asyncio.run(amatch_many_with_langchain(["Home Office", "Cabinet Ofice"], candidates, model))
+
+    assert results[1] == "Cabinet Office"
+    assert model.single_calls == 1
+
+
+def test_mock_model_is_not_sent_packed_prompts(pack_size_3):
+    candidates = ["Home Office", "Cabinet Office", "Ministry of Defence", "Unpacked Agency"]
+    model = MockChatModelWithCandidates(candidates=candidates)
+    calls = []
+    real_invoke = model.invoke
+    model.invoke = lambda messages: calls.append(messages[-1].content) or real_invoke(messages)
+
+    results = asyncio.run(amatch_many_with_langchain(["Home Ofice", "Cabinet Ofice"], candidates, model))
+
+    assert results == ["Home Office", "Cabinet Office"]
+    assert calls == ["Home Ofice", "Cabinet Ofice"]
+
+
+def test_packed_inputs_are_looked_up_in_the_cache_once(pack_size_3):
+    candidates = ["Home Office", "Cabinet Office", "Ministry of Defence", "Once Only Agency"]
+    model = CountingModel(candidates=candidates)
+    cache = get_match_cache()
+    misses = cache.stats()["misses"]
+
+    asyncio.run(amatch_many_with_langchain(["Home Ofice", "Cabinet Ofice", "Once Only Agncy"], candidates, model))
+
+    assert cache.stats()["misses"] - misses == 3
+    assert model.packed_calls == 1
+
+
+def test_packed_usage_is_reported_for_each_input(pack_size_3):
+    candidates = ["Home Office", "Cabinet Office", "Ministry of Defence", "Usage Reporting Agency"]
+    model = UsageReportingModel(candidates=candidates)
+    traces = [langchain_matcher.MatchTrace() for _ in range(3)]
+
+    asyncio.run(amatch_many_with_langchain(["Home Ofice", "Cabinet Ofice", "Usage Reportng Agency"], candidates, model,
+                                           traces=traces))
+
+    assert (traces[0].prompt_tokens, traces[0].cached_prompt_tokens) == (1000, 800)
+    # The fallbacks report the pack's call and their own
+    assert [(t.prompt_tokens, t.cached_prompt_tokens) for t in traces[1:]] == [(1100, 800)] * 2
+
+
+def test_individual_fallbacks_respect_the_batch_limit(monkeypatch):
+    settings = Settings(pack_size=4, batch_max_concurrency=1)
+    for module in (langchain_matcher, packed_matcher):
+        monkeypatch.setattr(module, "get_settings", lambda: settings)
+
+    class UnusablePackModel(CountingModel):
+        in_flight = peak = 0
+        lock = threading.Lock()
+
+        def invoke(self, messages):
+            if messages[-1].content.startswith("{"):
+                return MockResponse("I can't answer that")
+            with self.lock:
+                UnusablePackModel.in_flight += 1
+                UnusablePackModel.peak = max(UnusablePackModel.peak, UnusablePackModel.in_flight)
+            time.sleep(0.02)
+            with self.lock:
+                UnusablePackModel.in_flight -= 1
+            return super().invoke(messages)
+
+    candidates = ["Home Office", "Cabinet Office", "Ministry of Defence", "Bounded Agency"]
+    model = UnusablePackModel(candidates=candidates)
+    inputs = ["Home Ofice", "Cabinet Ofice", "Ministry of Defense", "Bounded Agncy"]
+
+    results = asyncio.run(amatch_many_with_langchain(inputs, candidates, model))
+
+    assert results == ["Home Office", "Cabinet Office", "Ministry of Defence", "Bounded Agency"]
+    assert model.single_calls == 4
+    assert UnusablePackModel.peak == 1
+
+
+def test_batch_endpoint_uses_packing(client, pack_size_3, sample_candidates, monkeypatch):
+    model = CountingModel(candidates=sample_candidates)
+    monkeypatch.setattr(main, "get_chat_model", lambda candidates=None: model)
+
+    response = client.post(
+        "/match/batch",
+        json={"input_strings": ["Home Ofice", "Cabinet Ofice", "Random Organization XYZ"], "candidates": sample_candidates},
+    )
+
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [r["match"] for r in results] == ["Home Office", "Cabinet Office", None]
+    assert model.packed_calls == 1
+
+
+def test_packed_calls_respect_the_batch_limit(monkeypatch):
+    settings = Settings(pack_size=2, batch_max_concurrency=1)
+    for module in (langchain_matcher, packed_matcher):
+        monkeypatch.setattr(module, "get_settings", lambda: settings)
+
+    class SlowPackModel(CountingModel):
+        in_flight = peak = 0
+        lock = threading.Lock()
+
+        def invoke(self, messages):
+            with self.lock:
+                SlowPackModel.in_flight += 1
+                SlowPackModel.peak = max(SlowPackModel.peak, SlowPackModel.in_flight)
+            time.sleep(0.02)
+            with self.lock:
+                SlowPackModel.in_flight -= 1
+            return super().invoke(messages)
+
+    candidates = ["Home Office", "Cabinet Office", "Ministry of Defence", "Packed Bounded Agency"]
+    model = SlowPackModel(candidates=candidates)
+    inputs = ["Home Ofice", "Cabinet Ofice", "Ministry of Defense", "Packed Bounded Agncy"]
+
+    results = asyncio.run(amatch_many_with_langchain(inputs, candidates, model))
+
+    assert results == ["Home Office", "Cabinet Office", "Ministry of Defence", "Packed Bounded Agency"]
+    assert model.packed_calls == 2
+    assert SlowPackModel.peak == 1
@@ -0,0 +1,114 @@
+"""Tests for process-pool scoring over shared-memory candidates."""
+
+import asyncio
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+
+import pytest
+from langchain_core.messages import HumanMessage
+
+from app.config import Settings
+from app.services import mock_backend
+from app.services.parallel_scoring import ParallelScorer, get_parallel_scorer, get_scoring_pool
+from app.services.scoring import SequenceScorer, TrigramScorer
+from benchmarks.names import generate_candidates, generate_queries
+
+
+@pytest.fixture(scope="module", autouse=True)
+def scoring_pool():
+    yield
+    get_scoring_pool(2).shutdown()
+    get_scoring_pool.cache_clear()
+
+
+@pytest.mark.parametrize("scorer_cls", [SequenceScorer, TrigramScorer])
+def test_same_results_as_in_process_scoring(scorer_cls):
+    candidates = generate_candidates(300, seed=5)
+    queries = [q for q, _, _ in generate_queries(candidates, 30, seed=5)]
+    expected = scorer_cls(candidates)
+    scorer = ParallelScorer(scorer_cls.name, candidates, workers=2)
+
+    try:
+        for threshold in (0.0, 0.85):
+            for query in queries:
+                assert scorer.best(query, threshold) == expected.best(query, threshold), query
+    finally:
+        scorer.close()
+
+
+def test_ties_go_to_the_earliest_candidate_across_slices():
+    candidates = ["Home Office A", "Cabinet Office", "HMRC", "Home Office B"]
+    scorer = ParallelScorer("sequence", candidates, workers=2)
+
+    try:
+        assert scorer.best("Home Office") == SequenceScorer(candidates).best("Home Office")
+        assert scorer.best("Home Office")[0] == 0
+    finally:
+        scorer.close()
+
+
+def test_close_frees_the_shared_block():
+    scorer = ParallelScorer("trigram", ["Home Office", "HMRC"], workers=2)
+    name = scorer._shm.name
+
+    scorer.close()
+
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=name)
+
+
+def test_repeated_lists_reuse_the_shared_block():
+    candidates = ["Home Office", "HMRC", "Cabinet Office"]
+
+    assert get_parallel_scorer("sequence", candidates, 2) is get_parallel_scorer("sequence", list(candidates), 2)
+
+
+def test_small_lists_bypass_the_pool(monkeypatch):
+    settings = Settings(mock_scoring_workers=2, mock_scoring_parallel_min_candidates=3)
+    monkeypatch.setattr(mock_backend, "get_settings", lambda: settings)
+
+    small = mock_backend.build_chat_model(candidates=["Home Office", "HMRC"])
+    large = mock_backend.build_chat_model(candidates=["Home Office", "HMRC", "Cabinet Office"])
+
+    assert isinstance(small._scorer, SequenceScorer)
+    assert isinstance(large._scorer, ParallelScorer)
+    assert large._best("Cabinet Ofice") == "Cabinet Office"
+
+
+
+def test_large_async_request_does_not_hold_up_small_ones(monkeypatch):
+    settings = Settings(mock_scoring_workers=2, mock_scoring_parallel_min_candidates=3)
+    monkeypatch.setattr(mock_backend, "get_settings", lambda: settings)
+    large = mock_backend.build_chat_model(
+        candidates=[f"Regional Office Number {i} of the Agency" for i in range(10_000)]
+    )
+    small = mock_backend.build_chat_model(candidates=["Home Office", "HMRC"])
+
+    # The large request is scored in the pool as usual, but its slices only report back when released
+    scored, held = [], []
+    real_submit = ParallelScorer._submit
+
+    def held_submit(self, query, threshold):
+        scored.extend(real_submit(self, query, threshold))
+        held.extend(Future() for _ in self._slices)
+        return list(held)
+
+    monkeypatch.setattr(ParallelScorer, "_submit", held_submit)
+    finished = []
+
+    async def match(name, model, query):
+        response = await model.ainvoke([HumanMessage(content=query)])
+        finished.append(name)
+        return response.content
+
+    async def run():
+        large_match = asyncio.create_task(match("large", large, "Regional Ofice Number 9999 of the Agency"))
+        await asyncio.sleep(0.05)
+        small_answer = await match("small", small, "Home Ofice")
+        assert not large_match.done()
+        for real, future in zip(scored, held):
+            future.set_result(await asyncio.wrap_future(real))
+        return small_answer, await large_match
+
+    assert asyncio.run(run()) == ("Home Office", "Regional Office Number 9999 of the Agency")
+    assert finished == ["small", "large"]
@@ -0,0 +1,90 @@
+"""Tests for the deterministic pre-match tier."""
+
+import pytest
+
+from app.services.langchain_matcher import MatchTrace, match_string_with_langchain
+from app.services.prematch import PrematchIndex, normalise_name
+
+SUFFIXES = frozenset({"ltd", "limited", "plc", "llp", "alb"})
+
+
+class NeverCalledModel:
+    def invoke(self, messages):
+        raise AssertionError("the model should not be called")
+
+
+@pytest.fixture
+def index():
+    return PrematchIndex(
+        [
+            "Department for Work and Pensions",
+            "Department for Education",
+            "Transport for London (TfL)",
+            "Homes England",
+            "Acme Widgets Limited",
+            "Ministry of Defence",
+            "HMRC",
+        ],
+        SUFFIXES,
+    )
+
+
+class TestNormaliseName:
+    """Tests for name normalisation."""
+
+    def test_casefold_punctuation_and_suffixes(self):
+        assert normalise_name("ACME Widgets, Ltd.", SUFFIXES) == "acme widgets"
+
+    def test_brackets_and_ampersand(self):
+        assert normalise_name("HM Revenue & Customs (HMRC)", SUFFIXES) == "hm revenue and customs"
+
+    def test_suffix_alone_is_kept(self):
+        assert normalise_name("Limited", SUFFIXES) == "limited"
+
+
+class TestPrematchIndex:
+    """Tests for PrematchIndex.lookup."""
+
+    def test_normalized_match(self, index):
+        assert index.lookup("ACME WIDGETS LTD") == ("Acme Widgets Limited", "normalized")
+        assert index.lookup("Homes England ALB") == ("Homes England", "normalized")
+
+    def test_acronym_from_initials(self, index):
+        assert index.lookup("DWP") == ("Department for Work and Pensions", "acronym")
+        assert index.lookup("MoD") == ("Ministry of Defence", "acronym")
+
+    def test_acronym_from_brackets(self, index):
+        assert index.lookup("TfL") == ("Transport for London (TfL)", "acronym")
+
+    def test_input_never_matches_itself(self, index):
+        assert index.lookup("HMRC") is None
+
+    def test_ambiguous_is_left_to_model(self):
+        index = PrematchIndex(["Department for Education", "Department of Energy"], SUFFIXES)
+        assert index.lookup("DE") is None
+
+    def test_lowercase_words_are_not_acronyms(self, index):
+        assert index.lookup("dwp") is None
+
+    def test_fuzzy_cases_are_left_to_model(self, index):
+        assert index.lookup("Homes Englnd") is None
+
+
+def test_matcher_skips_model_for_prematch():
+    trace = MatchTrace()
+
+    raw = match_string_with_langchain(
+        "DWP", ["Department for Work and Pensions", "HMRC"], NeverCalledModel(), trace=trace
+    )
+
+    assert raw == "Department for Work and Pensions"
+    assert trace.tier == "acronym"
+
+
+def test_api_reports_tier(client, sample_candidates):
+    prematched = client.post("/match", json={"input_string": "home office", "candidates": sample_candidates})
+    fuzzy = client.post("/match", json={"input_string": "Ministry of Defense", "candidates": sample_candidates})
+
+    assert prematched.json()["tier"] == "normalized"
+    assert fuzzy.json()["tier"] in {"model", "cache"}
+    assert fuzzy.json()["match"] == "Ministry of Defence"
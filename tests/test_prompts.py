@@ -4,6 +4,13 @@ import pytest
 from pathlib import Path
 
 from app.services.langchain_matcher import _load_prompt_text
+from app.services.prompt_registry import (
+    PromptRegistry,
+    UnknownPromptError,
+    compile_prompt,
+    get_packed_prompt_registry,
+    get_prompt_registry,
+)
 
 
 class TestPromptLoading:
@@ -14,8 +21,8 @@ class TestPromptLoading:
         prompt = _load_prompt_text("prompts/buyer_match_v1.txt")
         
         assert "entity name matching system" in prompt
-        assert "{input_name}" in prompt
-        assert "{candidates}" in prompt
+        assert "{input_name}" not in prompt
+        assert prompt.rstrip().endswith("{candidates}")
 
     def test_load_buyer_match_v2(self):
         """Test loading buyer_match_v2.txt prompt."""
@@ -23,7 +30,7 @@ class TestPromptLoading:
         
         assert "UK public-sector" in prompt
         assert "DWP" in prompt
-        assert "{input_name}" in prompt
+        assert prompt.rstrip().endswith("{candidates}")
 
     def test_load_buyer_match_v3(self):
         """Test loading buyer_match_v3.txt prompt."""
@@ -31,7 +38,7 @@ class TestPromptLoading:
         
         assert "UK procurement data" in prompt
         assert "Addenbrookes Hospital" in prompt
-        assert "{input_name}" in prompt
+        assert prompt.rstrip().endswith("{candidates}")
 
     def test_load_buyer_match_v4(self):
         """Test loading buyer_match_v4.txt prompt."""
@@ -39,7 +46,7 @@ class TestPromptLoading:
         
         assert "cautious but capable" in prompt
         assert "Rutland County Council" in prompt
-        assert "{input_name}" in prompt
+        assert prompt.rstrip().endswith("{candidates}")
 
     def test_nonexistent_prompt_raises_error(self):
         """Test that loading nonexistent file raises error."""
@@ -47,3 +54,74 @@ class TestPromptLoading:
             _load_prompt_text("prompts/nonexistent.txt")
         
         assert "Prompt file not found" in str(exc.value)
+
+
+class TestPromptRegistry:
+    """Tests for the compiled prompt registry."""
+
+    def _registry(self, tmp_path, **kwargs):
+        (tmp_path / "buyer_match_v1.txt").write_text("Input: {input_name}\nCandidates: {candidates}\n")
+        return PromptRegistry(prompt_dir=str(tmp_path), **kwargs)
+
+    def test_render_matches_str_format(self):
+        template = "A {{literal}} {input_name} then {candidates}."
+        compiled = compile_prompt("x.txt", template)
+
+        assert compiled.render(input_name="HMRC", candidates="[]") == template.format(
+            input_name="HMRC", candidates="[]"
+        )
+
+    def test_lookup_by_path_and_version(self, tmp_path):
+        registry = self._registry(tmp_path)
+
+        by_path = registry.get(str(tmp_path / "buyer_match_v1.txt"))
+        by_version = registry.get("buyer_match_v1")
+
+        assert by_path is by_version
+        assert by_path.version == "buyer_match_v1"
+
+    def test_file_is_read_once(self, tmp_path, monkeypatch):
+        registry = self._registry(tmp_path, reload_interval_seconds=0)
+        registry.get("buyer_match_v1")
+
+        def fail(*args, **kwargs):
+            raise AssertionError("prompt file should not be re-read")
+
+        monkeypatch.setattr(Path, "read_text", fail)
+        registry.get("buyer_match_v1")
+
+    def test_changed_file_is_reloaded(self, tmp_path):
+        registry = self._registry(tmp_path, reload_interval_seconds=0)
+        before = registry.get("buyer_match_v1")
+
+        (tmp_path / "buyer_match_v1.txt").write_text("Changed {input_name} {candidates} and longer\n")
+        after = registry.get("buyer_match_v1")
+
+        assert after.sha256 != before.sha256
+        assert after.text.startswith("Changed")
+
+    def test_unknown_path_rejected_without_filesystem_access(self, tmp_path):
+        registry = self._registry(tmp_path)
+        outside = tmp_path.parent / "secret.txt"
+        outside.write_text("not a prompt")
+
+        with pytest.raises(UnknownPromptError):
+            registry.get(str(outside))
+
+
+def test_api_rejects_unknown_prompt_path(client, sample_candidates):
+    payload = {"input_string": "HMRC", "candidates": sample_candidates, "prompt_path": "/etc/passwd"}
+
+    response = client.post("/match", json=payload)
+
+    assert response.status_code == 400
+    assert "Prompt file not found" in response.json()["detail"]
+
+
+def test_packed_prompt_is_not_client_selectable(client, sample_candidates):
+    assert "buyer_match_packed_v1" not in get_prompt_registry().known_prompts()
+    assert get_packed_prompt_registry().get("prompts/buyer_match_packed_v1.txt").version == "buyer_match_packed_v1"
+
+    for prompt_path in ("buyer_match_packed_v1", "prompts/buyer_match_packed_v1.txt"):
+        payload = {"input_string": "HMRC", "candidates": sample_candidates, "prompt_path": prompt_path}
+        assert client.post("/match", json=payload).status_code == 400
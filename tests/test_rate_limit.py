@@ -0,0 +1,163 @@
+"""Tests for client-side rate limiting and adaptive concurrency of the Azure backend."""
+
+import asyncio
+import threading
+import time
+
+import pytest
+from langchain_core.messages import HumanMessage
+from langchain_openai import AzureChatOpenAI
+
+from app.services.rate_limit import AdaptiveConcurrency, RateLimitedChatModel, TokenBucket
+from benchmarks.fake_azure_openai import FakeAzureOpenAIServer
+
+
+def _azure_model(server):
+    return AzureChatOpenAI(
+        azure_endpoint=server.url,
+        openai_api_key="test-key",
+        azure_deployment="test-deployment",
+        openai_api_version="2024-02-15-preview",
+        max_retries=0,
+    )
+
+
+class TestTokenBucket:
+    """Tests for the quota token bucket."""
+
+    def test_burst_is_free_then_waits(self):
+        """A full bucket lets a burst through, then callers wait for the refill."""
+        bucket = TokenBucket(per_minute=600, burst=2)  # 10 per second
+
+        assert bucket.acquire() == 0
+        assert bucket.acquire() == 0
+        start = time.perf_counter()
+        waited = bucket.acquire()
+
+        assert waited == pytest.approx(0.1, abs=0.03)
+        assert time.perf_counter() - start >= 0.08
+
+    def test_oversized_request_does_not_block_forever(self):
+        bucket = TokenBucket(per_minute=6000, burst=10)
+        assert bucket.acquire(1000) == 0
+
+
+class TestAdaptiveConcurrency:
+    """Tests for the AIMD concurrency limit."""
+
+    def test_fast_successes_raise_the_limit(self):
+        limiter = AdaptiveConcurrency(initial=2, maximum=4, latency_target_seconds=1.0)
+        for _ in range(20):
+            limiter.acquire()
+            limiter.release(latency=0.01)
+        assert limiter.limit == 4
+
+    def test_overload_halves_the_limit(self):
+        limiter = AdaptiveConcurrency(initial=8, minimum=1)
+        limiter.release(overloaded=True, started=limiter.acquire())
+        assert limiter.limit == 4
+        for _ in range(5):
+            limiter.release(overloaded=True, started=limiter.acquire())
+        assert limiter.limit == 1
+
+    def test_burst_of_429s_cuts_the_limit_once(self):
+        limiter = AdaptiveConcurrency(initial=8, minimum=1)
+        starts = [limiter.acquire() for _ in range(8)]
+        for started in starts:
+            limiter.release(overloaded=True, started=started)
+        assert (limiter.limit, limiter.decreases) == (4, 1)
+
+        # A call started after the cut is a new round trip and can cut again
+        limiter.release(overloaded=True, started=limiter.acquire())
+        assert limiter.limit == 2
+
+    def test_slow_call_counts_as_overload(self):
+        limiter = AdaptiveConcurrency(initial=8, latency_target_seconds=0.5)
+        limiter.acquire()
+        limiter.release(latency=2.0)
+        assert limiter.limit == 4
+
+    def test_limit_caps_threads_in_flight(self):
+        limiter = AdaptiveConcurrency(initial=2, maximum=2)
+        peak = []
+        lock = threading.Lock()
+
+        def work():
+            limiter.acquire()
+            with lock:
+                peak.append(limiter.in_flight)
+            time.sleep(0.02)
+            limiter.release(latency=0.02)
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert max(peak) == 2
+        assert limiter.in_flight == 0
+
+    def test_limit_caps_async_tasks_in_flight(self):
+        limiter = AdaptiveConcurrency(initial=3, maximum=3)
+        peak = []
+
+        async def work():
+            await limiter.aacquire()
+            peak.append(limiter.in_flight)
+            await asyncio.sleep(0.01)
+            limiter.release(latency=0.01)
+
+        async def run():
+            await asyncio.gather(*(work() for _ in range(12)))
+
+        asyncio.run(run())
+
+        assert max(peak) == 3
+        assert limiter.in_flight == 0
+
+
+class TestRateLimitedChatModel:
+    """Tests for the wrapped Azure model against a local fake deployment."""
+
+    def test_passes_through_answers_and_attributes(self):
+        with FakeAzureOpenAIServer() as server:
+            model = RateLimitedChatModel(_azure_model(server))
+            response = model.invoke([HumanMessage(content="Home Office")])
+
+        assert response.content == "Home Office"
+        assert model.deployment_name == "test-deployment"
+
+    def test_429_is_retried_after_retry_after_and_backs_off(self):
+        with FakeAzureOpenAIServer(rate_429=1.0, retry_after_seconds=0.05) as server:
+            concurrency = AdaptiveConcurrency(initial=8)
+            model = RateLimitedChatModel(_azure_model(server), concurrency=concurrency, max_retries=2)
+
+            start = time.perf_counter()
+            with pytest.raises(Exception) as exc_info:
+                model.invoke([HumanMessage(content="Home Office")])
+            elapsed = time.perf_counter() - start
+
+            assert getattr(exc_info.value, "status_code", None) == 429
+            assert server.stats()["requests"] == 3
+        assert elapsed >= 0.1
+        assert model.stats()["throttled"] == 2
+        assert concurrency.limit == 1
+
+    def test_async_calls_recover_from_occasional_429s(self):
+        with FakeAzureOpenAIServer(latency_seconds=0.01, rate_429=0.3, retry_after_seconds=0.01, seed=7) as server:
+            model = RateLimitedChatModel(
+                _azure_model(server), concurrency=AdaptiveConcurrency(initial=4, maximum=4), max_retries=10
+            )
+
+            async def run():
+                return await asyncio.gather(
+                    *(model.ainvoke([HumanMessage(content=f"Buyer {i}")]) for i in range(20))
+                )
+
+            responses = asyncio.run(run())
+            stats = server.stats()
+
+        assert [r.content for r in responses] == [f"Buyer {i}" for i in range(20)]
+        assert stats["throttled"] > 0
+        assert stats["max_in_flight"] <= 4
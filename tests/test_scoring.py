@@ -0,0 +1,92 @@
+"""Tests for the mock model scoring engines."""
+
+import random
+from difflib import SequenceMatcher
+
+import pytest
+from unittest.mock import Mock
+
+from app.services.mock_langchain_model import MockChatModelWithCandidates
+from app.services.scoring import SequenceScorer, TrigramScorer, build_scorer
+
+
+def _brute_force_best(query, candidates):
+    """The original MockChatModelWithCandidates loop."""
+    best, best_score = -1, 0.0
+    for i, c in enumerate(candidates):
+        score = SequenceMatcher(None, query.lower(), str(c).lower()).ratio()
+        if score > best_score:
+            best, best_score = i, score
+    return best, best_score
+
+
+def _random_names(rng, n):
+    words = ["Home", "Office", "Council", "NHS", "Trust", "Borough", "City", "Department", "for", "of"]
+    return [" ".join(rng.choice(words) for _ in range(rng.randint(1, 4))) for _ in range(n)]
+
+
+class TestSequenceScorer:
+    """SequenceScorer must give exactly the same answers as the original loop."""
+
+    def test_matches_brute_force(self):
+        rng = random.Random(7)
+        candidates = _random_names(rng, 300)
+        scorer = SequenceScorer(candidates)
+
+        for query in _random_names(rng, 50) + ["Home Ofice", "", "zzz"]:
+            assert scorer.best(query) == _brute_force_best(query, candidates)
+
+    def test_duplicate_candidates_pick_first(self):
+        scorer = SequenceScorer(["HMRC", "Home Office", "home office"])
+
+        assert scorer.best("Home Office") == (1, 1.0)
+
+    def test_threshold_skips_unacceptable_candidates(self):
+        scorer = SequenceScorer(["Home Office", "HMRC"])
+
+        idx, _ = scorer.best("Completely Different Organization", threshold=0.85)
+
+        assert idx == -1
+
+    def test_empty_candidates(self):
+        assert SequenceScorer([]).best("Home Office") == (-1, 0.0)
+
+
+class TestTrigramScorer:
+    """Tests for the vectorized trigram engine."""
+
+    def test_typo_match(self):
+        scorer = TrigramScorer(["Cabinet Office", "Home Office", "HMRC"])
+
+        idx, score = scorer.best("home ofice")
+
+        assert idx == 1
+        assert 0 < score < 1
+
+    def test_exact_match_scores_one(self):
+        scorer = TrigramScorer(["Cabinet Office", "Home Office"])
+
+        assert scorer.best("Home Office") == (1, 1.0)
+
+    def test_no_shared_trigrams(self):
+        assert TrigramScorer(["HMRC"]).best("zzz") == (-1, 0.0)
+
+    def test_scores_every_candidate(self):
+        scorer = TrigramScorer(["Leeds City Council", "Birmingham City Council"])
+
+        assert scorer.scores("Birmingham Council").shape == (2,)
+
+
+def test_unknown_engine_raises():
+    with pytest.raises(ValueError):
+        build_scorer("nope", ["HMRC"])
+
+
+def test_mock_model_with_trigram_engine():
+    model = MockChatModelWithCandidates(
+        candidates=["Home Office", "HMRC"], similarity_threshold=0.5, scoring_engine="trigram"
+    )
+    message = Mock()
+    message.content = "Home Ofice"
+
+    assert model.invoke([message]).content == "Home Office"
@@ -0,0 +1,106 @@
+"""Tests for single-flight coalescing of identical model calls."""
+
+import asyncio
+import threading
+import time
+
+from app.services.langchain_matcher import amatch_string_with_langchain
+from app.services.mock_langchain_model import MockResponse
+from app.services.singleflight import SingleFlight
+
+
+class SlowCountingModel:
+    def __init__(self, cache_id):
+        self.cache_id = cache_id
+        self.calls = 0
+
+    async def ainvoke(self, messages):
+        self.calls += 1
+        await asyncio.sleep(0.02)
+        return MockResponse("Home Office")
+
+
+def test_async_identical_calls_share_one_call():
+    flight = SingleFlight()
+    calls = []
+
+    async def fn():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "result"
+
+    async def run():
+        return await asyncio.gather(*(flight.ado("key", fn) for _ in range(10)))
+
+    results = asyncio.run(run())
+
+    assert len(calls) == 1
+    assert [r for r, _ in results] == ["result"] * 10
+    assert sum(shared for _, shared in results) == 9
+    assert flight.stats()["coalesced"] == 9
+
+
+def test_async_different_keys_are_not_coalesced():
+    flight = SingleFlight()
+
+    async def fn():
+        await asyncio.sleep(0)
+        return "x"
+
+    async def run():
+        return await asyncio.gather(flight.ado("a", fn), flight.ado("b", fn))
+
+    asyncio.run(run())
+
+    assert flight.stats()["model_calls"] == 2
+
+
+def test_async_errors_are_shared():
+    flight = SingleFlight()
+
+    async def fn():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("azure down")
+
+    async def run():
+        return await asyncio.gather(*(flight.ado("key", fn) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(run())
+
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert flight.stats()["model_calls"] == 1
+
+
+def test_sync_threads_share_one_call():
+    flight = SingleFlight()
+    calls = []
+    results = []
+
+    def fn():
+        calls.append(1)
+        time.sleep(0.05)
+        return "result"
+
+    threads = [threading.Thread(target=lambda: results.append(flight.do("key", fn))) for _ in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1
+    assert [r for r, _ in results] == ["result"] * 5
+
+
+def test_matcher_coalesces_concurrent_identical_requests():
+    model = SlowCountingModel("slow-counting-model:singleflight")
+    candidates = ["Home Office", "HMRC"]
+
+    async def run():
+        return await asyncio.gather(
+            *(amatch_string_with_langchain("Home Ofice", candidates, model) for _ in range(20))
+        )
+
+    results = asyncio.run(run())
+
+    assert results == ["Home Office"] * 20
+    assert model.calls == 1
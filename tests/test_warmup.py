@@ -0,0 +1,106 @@
+"""Tests for startup warm-up and the /ready endpoint."""
+
+import asyncio
+import time
+
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+
+from app.config import Settings
+from app import main
+from app.main import app
+from app.services import azure_backend, langchain_matcher, model_factory, warmup
+from app.services.warmup import FAILED, READY, WarmupState, run_warmup
+from benchmarks.fake_azure_openai import FakeAzureOpenAIServer
+
+
+def _use_settings(monkeypatch, settings):
+    for module in (warmup, model_factory, azure_backend, langchain_matcher):
+        monkeypatch.setattr(module, "get_settings", lambda: settings)
+    azure_backend.get_azure_model.cache_clear()
+
+
+@pytest.fixture(autouse=True)
+def clear_azure_model():
+    yield
+    azure_backend.get_azure_model.cache_clear()
+
+
+def _azure_settings(url, **overrides):
+    return Settings(
+        use_mock_llm=False,
+        azure_openai_endpoint=url,
+        azure_openai_key="test-key",
+        azure_openai_deployment_name="test-deployment",
+        azure_openai_api_version="2024-02-15-preview",
+        match_cache_enabled=False,
+        **overrides,
+    )
+
+
+def test_ready_after_warmup():
+    with TestClient(app) as client:
+        for _ in range(100):
+            response = client.get("/ready")
+            if response.status_code == status.HTTP_200_OK:
+                break
+            time.sleep(0.02)
+
+        assert response.status_code == status.HTTP_200_OK
+        steps = [step["name"] for step in response.json()["warmup"]["steps"]]
+        assert steps == ["settings", "prompts", "candidate_sets", "model", "connections", "synthetic_match"]
+        assert client.get("/health").json() == {"status": "ok"}
+
+
+def test_not_ready_before_warmup(client, monkeypatch):
+    monkeypatch.setattr(main, "get_warmup_state", lambda: WarmupState())
+
+    response = client.get("/ready")
+
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert response.json()["warmup"]["status"] == "pending"
+
+
+def test_warmup_primes_azure_connections(monkeypatch):
+    with FakeAzureOpenAIServer() as server:
+        _use_settings(monkeypatch, _azure_settings(server.url))
+
+        state = asyncio.run(run_warmup(WarmupState()))
+        requests = server.stats()["requests"]
+
+    assert state.status == READY
+    assert all(step.ok for step in state.steps)
+    # One priming call and one synthetic match
+    assert requests == 2
+
+
+def test_unreachable_model_does_not_block_readiness(monkeypatch):
+    with FakeAzureOpenAIServer(rate_500=1.0) as server:
+        _use_settings(monkeypatch, _azure_settings(server.url, azure_max_retries=0))
+
+        state = asyncio.run(run_warmup(WarmupState()))
+
+    assert state.status == READY
+    failed = {step.name for step in state.steps if not step.ok}
+    assert failed == {"connections", "synthetic_match"}
+
+
+def test_ready_when_warmup_disabled(client, monkeypatch):
+    monkeypatch.setattr(main, "get_settings", lambda: Settings(warmup_enabled=False))
+    monkeypatch.setattr(main, "get_warmup_state", lambda: WarmupState())
+
+    response = client.get("/ready")
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {"status": "ready", "warmup": None}
+
+
+def test_configuration_errors_fail_warmup(monkeypatch):
+    _use_settings(monkeypatch, Settings(use_mock_llm=False, azure_openai_endpoint=""))
+
+    state = asyncio.run(run_warmup(WarmupState()))
+
+    assert state.status == FAILED
+    assert state.steps[-1].name == "model"
+    assert "Missing required env vars" in state.steps[-1].error
@@ -0,0 +1,114 @@
+"""Tests for JSON / MessagePack content negotiation on the match endpoints."""
+
+import msgpack
+import pytest
+from fastapi import status
+
+from app.main import MatchRequest
+from app.services.wire_format import accepts_msgpack, is_msgpack
+from benchmarks.wire import run
+
+MSGPACK = "application/msgpack"
+
+
+def _post_msgpack(client, path, payload, accept=MSGPACK):
+    return client.post(path, content=msgpack.packb(payload), headers={"content-type": MSGPACK, "accept": accept})
+
+
+@pytest.mark.parametrize(
+    "accept, expected",
+    [
+        (None, False),
+        ("*/*", False),
+        ("application/json", False),
+        ("application/msgpack", True),
+        ("application/x-msgpack", True),
+        ("application/msgpack, */*", True),
+        ("application/json, application/msgpack", False),
+        ("application/json;q=0.5, application/msgpack", True),
+        ("application/msgpack;q=0", False),
+    ],
+)
+def test_accepts_msgpack(accept, expected):
+    assert accepts_msgpack(accept) is expected
+
+
+def test_is_msgpack():
+    assert is_msgpack("application/vnd.msgpack; charset=binary")
+    assert not is_msgpack("application/json")
+    assert not is_msgpack(None)
+
+
+class TestMsgpackEndpoints:
+    def test_match(self, client, sample_candidates):
+        response = _post_msgpack(client, "/match", {"input_string": "Home Ofice", "candidates": sample_candidates})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["content-type"] == MSGPACK
+        assert "total;dur=" in response.headers["server-timing"]
+        data = msgpack.unpackb(response.content)
+        assert data["match"] == "Home Office"
+
+    def test_batch(self, client, sample_candidates):
+        payload = {"input_strings": ["HMRC", "Cabinet Offce", "Acme Ltd"], "candidates": sample_candidates}
+
+        response = _post_msgpack(client, "/match/batch", payload)
+
+        assert response.headers["content-type"] == MSGPACK
+        results = msgpack.unpackb(response.content)["results"]
+        assert [r["match"] for r in results] == ["HMRC", "Cabinet Office", None]
+
+    def test_msgpack_request_json_response(self, client, sample_candidates):
+        response = _post_msgpack(
+            client, "/match", {"input_string": "HMRC", "candidates": sample_candidates}, accept="application/json"
+        )
+
+        assert response.headers["content-type"] == "application/json"
+        assert response.json()["match"] == "HMRC"
+
+    def test_get_match(self, client):
+        response = client.get(
+            "/match", params={"input_string": "HMRC", "candidates": ["HMRC", "Home Office"]}, headers={"accept": MSGPACK}
+        )
+
+        assert msgpack.unpackb(response.content)["match"] == "HMRC"
+
+    @pytest.mark.parametrize(
+        "body",
+        [b"\xc1", msgpack.packb(["not", "an", "object"]), msgpack.packb({"input_string": "", "candidates": ["a"]})],
+    )
+    def test_invalid_bodies(self, client, body):
+        response = client.post("/match", content=body, headers={"content-type": MSGPACK})
+
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+        assert response.json()["detail"][0]["loc"][0] == "body"
+
+    def test_invalid_json_body(self, client):
+        response = client.post("/match", content=b"{", headers={"content-type": "application/json"})
+
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+        assert response.json()["detail"][0]["type"] == "body_invalid"
+
+    def test_json_body_is_validated_from_bytes(self, client, monkeypatch):
+        def from_dict(cls, *args, **kwargs):
+            pytest.fail("JSON body decoded to a dict first")
+
+        monkeypatch.setattr(MatchRequest, "model_validate", classmethod(from_dict))
+        payload = b'{"input_string": "", "candidates": ["a"]}'
+
+        response = client.post("/match", content=payload, headers={"content-type": "application/json"})
+
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+        assert response.json()["detail"][0]["loc"] == ["body", "input_string"]
+
+    def test_openapi_documents_both_encodings(self, client):
+        body = client.get("/openapi.json").json()["paths"]["/match/batch"]["post"]["requestBody"]
+
+        assert set(body["content"]) == {"application/json", MSGPACK}
+
+
+def test_wire_benchmark():
+    result = run(sizes=[50], repeat=1)["results"][0]
+
+    assert result["request"]["msgpack"]["bytes"] < result["request"]["json"]["bytes"]
+    assert result["response"]["json"]["bytes"] == result["response"]["fastapi_json"]["bytes"]